@@ -0,0 +1,59 @@
+from django.db import ProgrammingError, migrations
+
+# Индексы по началу строки: lower(поле) LIKE 'запрос%'
+PREFIX_FIELDS = ('username', 'first_name', 'last_name', 'email')
+
+# SQLSTATE insufficient_privilege: нет прав на установку расширения
+INSUFFICIENT_PRIVILEGE = '42501'
+
+# Выражение совпадает с UserSearchText (accounts/services.py)
+SEARCH_TEXT = "lower(username || ' ' || first_name || ' ' || last_name || ' ' || email)"
+
+
+def create_trigram_index(apps, schema_editor):
+    """
+    Триграммный индекс создается, только если расширение pg_trgm
+    доступно на сервере и его удалось установить. Без него поиск
+    работает только по началу строк
+    """
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+        try:
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        except ProgrammingError as e:
+            # Недостаточно прав на установку расширения; остальные ошибки - настоящие
+            if getattr(e.__cause__, 'pgcode', None) != INSUFFICIENT_PRIVILEGE:
+                raise
+            return
+        cursor.execute(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS user_search_trgm '
+            f'ON auth_user USING gin (({SEARCH_TEXT}) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_index(apps, schema_editor):
+    schema_editor.execute('DROP INDEX CONCURRENTLY IF EXISTS user_search_trgm')
+
+
+class Migration(migrations.Migration):
+    # Индексы создаются без блокировки записи в таблицу пользователей
+    atomic = False
+
+    dependencies = [
+        ("accounts", "0001_initial"),
+        ("auth", "0012_alter_user_first_name_max_length"),
+    ]
+
+    operations = [
+        *(
+            migrations.RunSQL(
+                f'CREATE INDEX CONCURRENTLY IF NOT EXISTS user_{field}_prefix '
+                f'ON auth_user (lower({field}) text_pattern_ops)',
+                f'DROP INDEX CONCURRENTLY IF EXISTS user_{field}_prefix',
+            )
+            for field in PREFIX_FIELDS
+        ),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
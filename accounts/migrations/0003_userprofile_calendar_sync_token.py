@@ -0,0 +1,18 @@
+# Generated by Django 5.0.4 on 2026-10-18 20:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0002_user_search_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="userprofile",
+            name="google_calendar_sync_token",
+            field=models.TextField(blank=True, null=True),
+        ),
+    ]
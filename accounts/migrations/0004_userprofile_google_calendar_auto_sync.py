@@ -0,0 +1,18 @@
+# Generated by Django 5.0.4 on 2026-10-18 20:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0003_userprofile_calendar_sync_token"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="userprofile",
+            name="google_calendar_auto_sync",
+            field=models.BooleanField(default=False),
+        ),
+    ]
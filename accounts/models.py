@@ -1,7 +1,9 @@
 from django.db import models
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete, m2m_changed
 from django.dispatch import receiver
+from projects.models import Project
+from .services import SEARCH_FIELDS, UserDirectoryService
 
 
 class UserProfile(models.Model):
@@ -15,6 +17,10 @@ class UserProfile(models.Model):
     google_calendar_token = models.TextField(null=True, blank=True)
     google_calendar_refresh_token = models.TextField(null=True, blank=True)
     google_calendar_token_expiry = models.DateTimeField(null=True, blank=True)
+    # nextSyncToken Calendar API: с него начинается следующая загрузка изменений календаря
+    google_calendar_sync_token = models.TextField(null=True, blank=True)
+    # Автоматическая выгрузка изменений задач в календарь (calendar_integration)
+    google_calendar_auto_sync = models.BooleanField(default=False)
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -32,4 +38,37 @@ def create_user_profile(sender, instance, created, **kwargs):
 
 @receiver(post_save, sender=User)
 def save_user_profile(sender, instance, **kwargs):
-    instance.profile.save()
\ No newline at end of file
+    instance.profile.save()
+
+
+# Сигналы версии справочника пользователей (кэш поиска, accounts/services.py)
+@receiver(post_save, sender=User)
+def bump_directory_on_user_save(sender, instance, update_fields=None, **kwargs):
+    # Вход пользователя обновляет только last_login - поиск это не затрагивает
+    if update_fields is not None and not set(update_fields) & {*SEARCH_FIELDS, 'is_active'}:
+        return
+    UserDirectoryService.bump_directory_version()
+
+
+@receiver(post_delete, sender=User)
+def bump_directory_on_user_delete(sender, instance, **kwargs):
+    UserDirectoryService.bump_directory_version()
+
+
+@receiver(post_delete, sender=Project)
+def bump_directory_on_project_delete(sender, instance, **kwargs):
+    UserDirectoryService.bump_project_versions([instance.id])
+
+
+@receiver(m2m_changed, sender=Project.members.through)
+def bump_directory_on_member_change(sender, instance, action, reverse, pk_set, **kwargs):
+    # Состав проектов влияет на фильтры shared и exclude_project
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        UserDirectoryService.bump_project_versions([instance.id])
+    elif action == 'post_clear':
+        # Список проектов сохранен обработчиком pre_clear в projects/models.py
+        UserDirectoryService.bump_project_versions(instance._cleared_project_ids)
+    else:
+        UserDirectoryService.bump_project_versions(pk_set or [])
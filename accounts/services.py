@@ -0,0 +1,171 @@
+import functools
+import hashlib
+import uuid
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import Case, Exists, F, Func, IntegerField, OuterRef, Q, TextField, Value, When
+from django.db.models.functions import Lower
+from projects.models import Project
+from projects.membership import get_member_project_ids
+from newprojectflowapp.caches import get_shared_cache
+
+DIRECTORY_VERSION_KEY = 'users:directory:version'
+PROJECT_VERSION_KEY = 'users:project:version:{}'
+SEARCH_ENTRY_KEY = 'users:search:{}:{}'
+
+# Поля пользователя, по которым выполняется поиск
+SEARCH_FIELDS = ('username', 'first_name', 'last_name', 'email')
+
+
+class UserSearchText(Func):
+    """
+    Строка поиска пользователя. Выражение совпадает с выражением
+    триграммного индекса user_search_trgm (accounts/migrations/0002)
+    """
+    template = 'lower(%(expressions)s)'
+    arg_joiner = " || ' ' || "
+    output_field = TextField()
+
+
+@functools.cache
+def has_trigram_support():
+    """Установлено ли в базе расширение pg_trgm (проверяется один раз на процесс)"""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        return cursor.fetchone() is not None
+
+
+class UserDirectoryService:
+    """
+    Сервис поиска по справочнику пользователей
+    """
+    # Триграммы строятся по трем символам: короче - только поиск по началу
+    MIN_TRIGRAM_QUERY_LENGTH = 3
+
+    # Ранги совпадений: начало логина, начало имени/фамилии/email, нечеткое
+    RANK_USERNAME_PREFIX = 0
+    RANK_FIELD_PREFIX = 1
+    RANK_FUZZY = 2
+
+    @classmethod
+    def search(cls, user, query='', shared=False, exclude_project_id=None, request=None):
+        """
+        Возвращает queryset активных пользователей с рангом совпадения match_rank.
+        Поиск по началу логина, имени, фамилии и email использует индексы
+        lower(...) text_pattern_ops; при наличии pg_trgm добавляются
+        совпадения по подстроке и с опечатками (GIN-индекс триграмм).
+        shared - только пользователи из общих с user проектов,
+        exclude_project_id - без участников этого проекта
+        """
+        users = User.objects.filter(is_active=True)
+        query = query.strip().lower()
+
+        if query:
+            users = users.alias(**{f'{field}_lower': Lower(field) for field in SEARCH_FIELDS})
+            username_prefix = Q(username_lower__startswith=query)
+            field_prefix = Q()
+            for field in SEARCH_FIELDS[1:]:
+                field_prefix |= Q(**{f'{field}_lower__startswith': query})
+
+            condition = username_prefix | field_prefix
+            if len(query) >= cls.MIN_TRIGRAM_QUERY_LENGTH and has_trigram_support():
+                users = users.alias(search_text=UserSearchText(*(F(field) for field in SEARCH_FIELDS)))
+                condition |= Q(search_text__contains=query) | Q(search_text__trigram_word_similar=query)
+
+            users = users.filter(condition).annotate(
+                match_rank=Case(
+                    When(username_prefix, then=Value(cls.RANK_USERNAME_PREFIX)),
+                    When(field_prefix, then=Value(cls.RANK_FIELD_PREFIX)),
+                    default=Value(cls.RANK_FUZZY),
+                    output_field=IntegerField()
+                )
+            )
+        else:
+            users = users.annotate(match_rank=Value(cls.RANK_USERNAME_PREFIX, output_field=IntegerField()))
+
+        Membership = Project.members.through
+        if shared:
+            users = users.filter(Exists(Membership.objects.filter(
+                user_id=OuterRef('pk'),
+                project_id__in=get_member_project_ids(user, request)
+            )))
+        if exclude_project_id is not None:
+            users = users.exclude(Exists(Membership.objects.filter(
+                user_id=OuterRef('pk'),
+                project_id=exclude_project_id
+            )))
+
+        return users.only(*SEARCH_FIELDS)
+
+    @staticmethod
+    def get_cache():
+        """Кэш страниц поиска или None, если кэширование отключено"""
+        return get_shared_cache('USER_SEARCH_CACHE_ALIAS')
+
+    @staticmethod
+    def get_versions(keys):
+        """Текущие версии по ключам; отсутствующие создаются случайным токеном"""
+        cache = UserDirectoryService.get_cache()
+        versions = cache.get_many(keys)
+        missing = [key for key in keys if key not in versions]
+        if missing:
+            for key in missing:
+                cache.add(key, uuid.uuid4().hex, timeout=None)
+            versions.update(cache.get_many(missing))
+        return [versions.get(key) for key in keys]
+
+    @staticmethod
+    def get_cached_page(user, params, compute, project_ids=()):
+        """
+        Кэширует страницу результатов поиска отдельно для каждого
+        пользователя. Записи устаревают со сменой версии справочника
+        (поля пользователей) и версий проектов project_ids, от состава
+        которых зависит страница (фильтры shared и exclude_project):
+        изменение участников одного проекта не сбрасывает остальной поиск.
+        Без общего кэша (USER_SEARCH_CACHE_ALIAS) страница вычисляется заново
+        """
+        cache = UserDirectoryService.get_cache()
+        if cache is None:
+            return compute()
+
+        project_ids = sorted(project_ids)
+        versions = UserDirectoryService.get_versions(
+            [DIRECTORY_VERSION_KEY, *(PROJECT_VERSION_KEY.format(project_id) for project_id in project_ids)]
+        )
+
+        raw = repr((versions, project_ids, sorted(params.items())))
+        key = SEARCH_ENTRY_KEY.format(user.id, hashlib.md5(raw.encode('utf-8')).hexdigest())
+        result = cache.get(key)
+        if result is None:
+            result = compute()
+            cache.set(key, result, timeout=settings.USER_SEARCH_CACHE_TIMEOUT)
+        return result
+
+    @staticmethod
+    def bump_versions(keys):
+        """
+        Меняет версии сразу и еще раз после фиксации транзакции
+        (как кэш наборов участия, см. projects/membership.py)
+        """
+        cache = UserDirectoryService.get_cache()
+        if cache is None:
+            return
+
+        def bump():
+            cache.set_many({key: uuid.uuid4().hex for key in keys}, timeout=None)
+
+        bump()
+        transaction.on_commit(bump)
+
+    @staticmethod
+    def bump_directory_version():
+        """Сбрасывает кэш поиска всех пользователей (изменились сами пользователи)"""
+        UserDirectoryService.bump_versions([DIRECTORY_VERSION_KEY])
+
+    @staticmethod
+    def bump_project_versions(project_ids):
+        """Сбрасывает страницы поиска, зависящие от состава участников проектов"""
+        keys = [PROJECT_VERSION_KEY.format(project_id) for project_id in set(project_ids) if project_id is not None]
+        if keys:
+            UserDirectoryService.bump_versions(keys)
@@ -1,3 +1,149 @@
-from django.test import TestCase
+import os
+import tempfile
+from unittest import skipUnless
+from django.contrib.auth.models import User
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from projects.models import Project
+from .services import DIRECTORY_VERSION_KEY, UserDirectoryService, has_trigram_support
 
-# Create your tests here.
+
+SEARCH_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'projectflow-user-search-tests'),
+    },
+}
+
+
+@override_settings(CACHES=SEARCH_CACHES, USER_SEARCH_CACHE_ALIAS='shared')
+class UserSearchTest(TestCase):
+    """Поиск по справочнику пользователей (/api/auth/users/) с общим кэшем страниц"""
+
+    url = '/api/auth/users/'
+
+    def setUp(self):
+        UserDirectoryService.get_cache().clear()
+        self.user = User.objects.create_user(username='owner', password='password')
+        self.anna = User.objects.create_user(username='anna', first_name='Анна', last_name='Смирнова',
+                                             email='anna@example.com')
+        self.ivan = User.objects.create_user(username='ivan', first_name='Иван', last_name='Anisimov',
+                                             email='ivan@example.com')
+        self.petr = User.objects.create_user(username='petr', first_name='Петр', last_name='Иванов',
+                                             email='petr@example.com')
+        User.objects.create_user(username='annette', is_active=False)
+
+        self.project = Project.objects.create(name='Проект', created_by=self.user)
+        self.project.members.add(self.user, self.anna)
+
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def search(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return [item['username'] for item in response.json()['results']]
+
+    def test_prefix_search_ranks_username_first(self):
+        # Начало логина, затем начало имени/фамилии; неактивные не попадают
+        self.assertEqual(self.search(search='an'), ['anna', 'ivan'])
+        self.assertEqual(self.search(search='ИВАН'), ['ivan', 'petr'])
+        self.assertEqual(self.search(search='petr@'), ['petr'])
+
+    def test_short_query_is_prefix_only(self):
+        self.assertEqual(self.search(search='va'), [])
+
+    @skipUnless(has_trigram_support(), 'pg_trgm не установлен')
+    def test_trigram_search(self):
+        # Подстрока и опечатка
+        self.assertEqual(self.search(search='mirnov'), ['anna'])
+        self.assertIn('petr', self.search(search='иваноф'))
+
+    def test_pagination(self):
+        first = self.client.get(self.url, {'page_size': 2}).json()
+        self.assertEqual([item['username'] for item in first['results']], ['anna', 'ivan'])
+        second = self.client.get(first['next']).json()
+        self.assertEqual([item['username'] for item in second['results']], ['owner', 'petr'])
+        self.assertIsNone(second['next'])
+
+    def test_shared_and_exclude_project_filters(self):
+        self.assertEqual(self.search(shared='true'), ['anna', 'owner'])
+        self.assertEqual(self.search(exclude_project=self.project.id), ['ivan', 'petr'])
+
+        other = Project.objects.create(name='Чужой', created_by=self.ivan)
+        response = self.client.get(self.url, {'exclude_project': other.id})
+        self.assertEqual(response.status_code, 404)
+
+    def test_all_users_endpoint_removed(self):
+        response = self.client.get('/api/projects/all_users/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_page_is_cached(self):
+        self.search(search='an')
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self.search(search='an'), ['anna', 'ivan'])
+        self.assertFalse(any('auth_user' in query['sql'] and 'LIKE' in query['sql']
+                             for query in context.captured_queries))
+
+    def test_user_change_invalidates_pages(self):
+        self.assertEqual(self.search(search='an'), ['anna', 'ivan'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.petr.first_name = 'Anton'
+            self.petr.save()
+        self.assertEqual(self.search(search='an'), ['anna', 'ivan', 'petr'])
+
+    def test_member_change_invalidates_dependent_pages_only(self):
+        self.search(search='an')
+        self.assertEqual(self.search(shared='true'), ['anna', 'owner'])
+        self.assertEqual(self.search(exclude_project=self.project.id), ['ivan', 'petr'])
+
+        directory_key = UserDirectoryService.get_versions([DIRECTORY_VERSION_KEY])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.project.members.add(self.ivan)
+        # Версия справочника не меняется: обычный поиск остается в кэше
+        self.assertEqual(UserDirectoryService.get_versions([DIRECTORY_VERSION_KEY]), directory_key)
+
+        self.assertEqual(self.search(shared='true'), ['anna', 'ivan', 'owner'])
+        self.assertEqual(self.search(exclude_project=self.project.id), ['petr'])
+
+        # Изменение со стороны пользователя
+        with self.captureOnCommitCallbacks(execute=True):
+            self.petr.projects.add(self.project)
+        self.assertEqual(self.search(exclude_project=self.project.id), [])
+
+    def test_joining_project_changes_shared_page(self):
+        self.assertEqual(self.search(shared='true'), ['anna', 'owner'])
+        other = Project.objects.create(name='Другой', created_by=self.petr)
+        other.members.add(self.petr, self.user)
+        self.assertEqual(self.search(shared='true'), ['anna', 'owner', 'petr'])
+
+
+class UserSearchWithoutCacheTest(TestCase):
+    """По умолчанию страницы поиска не кэшируются"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='owner', password='password')
+        self.project = Project.objects.create(name='Проект', created_by=self.user)
+        self.project.members.add(self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_member_change_is_visible_immediately(self):
+        other = User.objects.create_user(username='other', password='password')
+        self.project.members.add(other)
+        response = self.client.get('/api/auth/users/', {'shared': 'true'})
+        self.assertEqual([item['username'] for item in response.json()['results']], ['other', 'owner'])
+
+        # Без сброса кэша и on_commit: другой процесс увидел бы то же самое
+        self.project.members.remove(other)
+        response = self.client.get('/api/auth/users/', {'shared': 'true'})
+        self.assertEqual([item['username'] for item in response.json()['results']], ['owner'])
+
+    def test_process_local_cache_is_refused(self):
+        with override_settings(USER_SEARCH_CACHE_ALIAS='default'):
+            with self.assertRaises(ImproperlyConfigured):
+                UserDirectoryService.get_cache()
@@ -1,6 +1,6 @@
 from django.urls import path
 from rest_framework_simplejwt.views import TokenRefreshView
-from .views import RegisterView, CustomTokenObtainPairView, UserInfoView, LogoutView,UserStatisticsView
+from .views import RegisterView, CustomTokenObtainPairView, UserInfoView, LogoutView,UserStatisticsView, UserSearchView
 
 urlpatterns = [
     # Регистрация нового пользователя
@@ -18,4 +18,7 @@ urlpatterns = [
 
     # Новый URL для получения статистики пользователя
     path('statistics/', UserStatisticsView.as_view(), name='user_statistics'),
+
+    # Поиск по справочнику пользователей (выбор участников проекта)
+    path('users/', UserSearchView.as_view(), name='user_search'),
 ]
\ No newline at end of file
@@ -4,10 +4,16 @@ from rest_framework.views import APIView
 from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth.models import User
-from django.db.models import Count, Q
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from rest_framework.exceptions import NotFound
+from projects.membership import get_member_project_ids, is_project_member
 from projects.models import Project
+from projects.serializers import ProjectMemberSerializer
 from tasks.models import Task
+from newprojectflowapp.pagination import UserSearchPagination
 from .serializers import UserSerializer, RegisterSerializer
+from .services import UserDirectoryService
 
 class RegisterView(generics.CreateAPIView):
     """
@@ -87,6 +93,14 @@ class LogoutView(APIView):
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+def count_subquery(queryset, group_field):
+    """Количество строк queryset (связанного через OuterRef) как подзапрос"""
+    return Coalesce(
+        Subquery(queryset.order_by().values(group_field).annotate(count=Count('*')).values('count')),
+        0
+    )
+
+
 class UserStatisticsView(APIView):
         """
         Представление для получения статистики пользователя
@@ -96,20 +110,63 @@ class UserStatisticsView(APIView):
         def get(self, request):
             user = request.user
 
-            # Количество проектов пользователя
-            projects_count = Project.objects.filter(members=user).count()
+            # Количество проектов и задач пользователя одним запросом.
+            # Счетчики ProjectStats ведутся по проектам, а не по исполнителям,
+            # поэтому задачи считаем по индексу assignee
+            memberships = Project.members.through.objects.filter(user_id=OuterRef('pk'))
+            assigned = Task.objects.filter(assignee_id=OuterRef('pk'))
+            counts = User.objects.filter(pk=user.pk).values(
+                projects_count=count_subquery(memberships, 'user_id'),
+                tasks_count=count_subquery(assigned, 'assignee_id'),
+                completed_tasks_count=count_subquery(assigned.filter(status='Завершена'), 'assignee_id')
+            ).get()
 
-            # Количество задач, где пользователь является исполнителем
-            tasks_count = Task.objects.filter(assignee=user).count()
+            return Response({
+                'projects_count': counts['projects_count'],
+                'tasks_count': counts['tasks_count'],
+                'completed_tasks_count': counts['completed_tasks_count']
+            })
 
-            # Количество завершенных задач пользователя
-            completed_tasks_count = Task.objects.filter(
-                assignee=user,
-                status='Завершена'
-            ).count()
 
-            return Response({
-                'projects_count': projects_count,
-                'tasks_count': tasks_count,
-                'completed_tasks_count': completed_tasks_count
-            })
\ No newline at end of file
+class UserSearchView(APIView):
+    """
+    Поиск по справочнику пользователей для выбора участников проекта.
+    Параметры: ?search= (начало или часть логина, имени, фамилии, email),
+    ?shared=true (только пользователи из общих проектов),
+    ?exclude_project=<id> (без участников проекта), ?cursor=, ?page_size=
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        query = request.query_params.get('search', '').strip().lower()
+        shared = request.query_params.get('shared', '').lower() == 'true'
+
+        exclude_project_id = request.query_params.get('exclude_project') or None
+        if exclude_project_id is not None:
+            if not is_project_member(request.user, exclude_project_id, request):
+                raise NotFound("Проект не найден")
+            exclude_project_id = int(exclude_project_id)
+
+        paginator = UserSearchPagination()
+
+        def compute():
+            users = UserDirectoryService.search(
+                request.user, query, shared=shared, exclude_project_id=exclude_project_id, request=request
+            )
+            page = paginator.paginate_queryset(users, request, view=self)
+            serializer = ProjectMemberSerializer(page, many=True)
+            return paginator.get_paginated_response(serializer.data).data
+
+        params = {
+            'search': query,
+            'shared': shared,
+            'exclude_project': exclude_project_id,
+            'cursor': request.query_params.get(paginator.cursor_query_param, ''),
+            'page_size': paginator.get_page_size(request),
+        }
+        # Проекты, от состава участников которых зависит страница
+        project_ids = set(get_member_project_ids(request.user, request)) if shared else set()
+        if exclude_project_id is not None:
+            project_ids.add(exclude_project_id)
+
+        return Response(UserDirectoryService.get_cached_page(request.user, params, compute, project_ids))
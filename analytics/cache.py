@@ -0,0 +1,121 @@
+"""
+Версионированный кэш результатов AnalyticsService.
+
+Ключ записи строится из имени отчета, его параметров и пар
+(ID проекта, версия данных проекта) для всех проектов, на которые
+опирается отчет. Запись задач, комментариев и участников меняет версию
+проекта, поэтому устаревшие записи просто перестают находиться и
+вытесняются бэкендом кэша; таймаут нужен только для уборки мусора.
+
+Кэш включается настройкой ANALYTICS_CACHE_ALIAS и только на общем для
+процессов бэкенде: новая версия в локальной памяти одного процесса не
+дошла бы до остальных. Без кэша отчеты вычисляются при каждом запросе.
+"""
+import hashlib
+import uuid
+from django.conf import settings
+from django.db import transaction
+from newprojectflowapp.caches import get_shared_cache
+
+VERSION_KEY = 'analytics:version:{}'
+ENTRY_KEY = 'analytics:entry:{}:{}'
+HITS_KEY = 'analytics:stats:hits'
+MISSES_KEY = 'analytics:stats:misses'
+
+
+def get_cache():
+    """Кэш аналитики или None, если кэширование отключено"""
+    return get_shared_cache('ANALYTICS_CACHE_ALIAS')
+
+
+def get_project_versions(project_ids):
+    """
+    Возвращает {project_id: версия}. Версия - случайный токен: если ключ
+    версии вытеснен из кэша, новая версия не совпадет ни с одной старой
+    """
+    cache = get_cache()
+    keys = {VERSION_KEY.format(project_id): project_id for project_id in project_ids}
+    versions = cache.get_many(keys)
+
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        for key in missing:
+            cache.add(key, uuid.uuid4().hex, timeout=None)
+        versions.update(cache.get_many(missing))
+
+    return {keys[key]: version for key, version in versions.items()}
+
+
+def bump_project_versions(project_ids):
+    """
+    Меняет версии проектов после фиксации транзакции: читатель,
+    успевший до фиксации, закэширует старые данные под старой версией
+    """
+    project_ids = {project_id for project_id in project_ids if project_id is not None}
+    if not project_ids or get_cache() is None:
+        return
+
+    def bump():
+        get_cache().set_many(
+            {VERSION_KEY.format(project_id): uuid.uuid4().hex for project_id in project_ids},
+            timeout=None
+        )
+
+    transaction.on_commit(bump)
+
+
+def _increment(key):
+    cache = get_cache()
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Счетчик вытеснен между add и incr - потеря одного события некритична
+        pass
+
+
+def get_or_compute(report, project_ids, params, compute):
+    """
+    Возвращает результат отчета из кэша или вычисляет и сохраняет его.
+    project_ids - проекты, данные которых использует отчет (для отчетов
+    по всем проектам пользователя это и есть его набор участия)
+    """
+    if get_cache() is None:
+        return compute()
+
+    versions = get_project_versions(project_ids)
+    raw = repr((sorted(versions.items()), params))
+    key = ENTRY_KEY.format(report, hashlib.md5(raw.encode('utf-8')).hexdigest())
+
+    cache = get_cache()
+    result = cache.get(key)
+    if result is not None:
+        _increment(HITS_KEY)
+        return result
+
+    _increment(MISSES_KEY)
+    result = compute()
+    cache.set(key, result, timeout=settings.ANALYTICS_CACHE_TIMEOUT)
+    return result
+
+
+def get_stats():
+    """Счетчики попаданий и промахов кэша аналитики (None, если кэш отключен)"""
+    cache = get_cache()
+    if cache is None:
+        return None
+    counters = cache.get_many([HITS_KEY, MISSES_KEY])
+    hits = counters.get(HITS_KEY, 0)
+    misses = counters.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / total * 100, 1) if total else 0,
+    }
+
+
+def reset_stats():
+    cache = get_cache()
+    if cache is not None:
+        cache.delete_many([HITS_KEY, MISSES_KEY])
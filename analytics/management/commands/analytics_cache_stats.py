@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from analytics import cache as analytics_cache
+
+
+class Command(BaseCommand):
+    """
+    Выводит счетчики попаданий и промахов кэша аналитики
+    (общие для всех процессов)
+    """
+    help = 'Показывает статистику кэша аналитики'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Сбросить счетчики после вывода'
+        )
+
+    def handle(self, *args, **options):
+        stats = analytics_cache.get_stats()
+        if stats is None:
+            self.stdout.write('Кэш аналитики отключен (ANALYTICS_CACHE_ALIAS)')
+            return
+        self.stdout.write(f"Попаданий: {stats['hits']}")
+        self.stdout.write(f"Промахов: {stats['misses']}")
+        self.stdout.write(f"Доля попаданий: {stats['hit_rate']}%")
+
+        if options['reset']:
+            analytics_cache.reset_stats()
+            self.stdout.write(self.style.SUCCESS('Счетчики сброшены'))
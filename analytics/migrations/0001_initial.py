@@ -0,0 +1,112 @@
+# Generated by Django 5.0.4 on 2026-10-18 19:39
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ("projects", "0003_projectchange"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProjectDailyActivity",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField(verbose_name="Дата")),
+                (
+                    "created_count",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Создано задач"
+                    ),
+                ),
+                (
+                    "completed_count",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Завершено задач"
+                    ),
+                ),
+                (
+                    "project",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_activity",
+                        to="projects.project",
+                        verbose_name="Проект",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Активность проекта за день",
+                "verbose_name_plural": "Активность проектов по дням",
+                "unique_together": {("project", "date")},
+            },
+        ),
+        migrations.CreateModel(
+            name="TaskStatusSnapshot",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField(verbose_name="Дата")),
+                ("status", models.CharField(max_length=20, verbose_name="Статус")),
+                (
+                    "task_count",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Количество задач"
+                    ),
+                ),
+                (
+                    "assignee",
+                    models.ForeignKey(
+                        blank=True,
+                        db_constraint=False,
+                        null=True,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Исполнитель",
+                    ),
+                ),
+                (
+                    "project",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="status_snapshots",
+                        to="projects.project",
+                        verbose_name="Проект",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Срез задач по статусам",
+                "verbose_name_plural": "Срезы задач по статусам",
+                "indexes": [
+                    models.Index(
+                        fields=["project", "date"], name="status_snapshot_project_date"
+                    ),
+                    models.Index(fields=["date"], name="status_snapshot_date"),
+                ],
+            },
+        ),
+    ]
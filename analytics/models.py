@@ -1,3 +1,200 @@
-from django.db import models
+from datetime import datetime, time, timedelta
+from django.db import models, transaction
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from django.contrib.auth.models import User
+from django.utils import timezone
+from projects.models import Project
+from tasks.models import Task, Comment, TaskStatusTransition, get_comment_project_id
+from .cache import bump_project_versions
+
+
+def get_day_bounds(start_date, end_date):
+    """Границы периода [start_date, end_date] в текущем часовом поясе"""
+    tz = timezone.get_current_timezone()
+    return (
+        datetime.combine(start_date, time.min, tzinfo=tz),
+        datetime.combine(end_date + timedelta(days=1), time.min, tzinfo=tz),
+    )
+
+
+class TaskStatusSnapshot(models.Model):
+    """
+    Дневной срез количества задач по (проект, статус, исполнитель).
+    Записывается командой snapshot_analytics; графики читают
+    O(дней) строк вместо агрегации всей таблицы задач
+    """
+    date = models.DateField(verbose_name="Дата")
+    project = models.ForeignKey(
+        Project,
+        on_delete=models.CASCADE,
+        related_name='status_snapshots',
+        verbose_name="Проект"
+    )
+    status = models.CharField(max_length=20, verbose_name="Статус")
+    # Без внешнего ключа: удаление пользователя не должно менять историю
+    assignee = models.ForeignKey(
+        User,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name="Исполнитель"
+    )
+    task_count = models.PositiveIntegerField(default=0, verbose_name="Количество задач")
+
+    class Meta:
+        verbose_name = "Срез задач по статусам"
+        verbose_name_plural = "Срезы задач по статусам"
+        indexes = [
+            models.Index(fields=['project', 'date'], name='status_snapshot_project_date'),
+            models.Index(fields=['date'], name='status_snapshot_date'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.project_id}: {self.status} = {self.task_count}"
+
+    @classmethod
+    def take(cls, date=None, project_ids=None):
+        """
+        Записывает срез текущего состояния задач за дату (по умолчанию сегодня).
+        Повторный запуск за ту же дату заменяет срез.
+        Возвращает количество записанных строк
+        """
+        date = date or timezone.localdate()
+        tasks = Task.objects.all()
+        snapshots = cls.objects.filter(date=date)
+        if project_ids:
+            tasks = tasks.filter(project_id__in=project_ids)
+            snapshots = snapshots.filter(project_id__in=project_ids)
+
+        # Один GROUP BY по таблице задач в день
+        rows = [
+            cls(
+                date=date,
+                project_id=item['project_id'],
+                status=item['status'],
+                assignee_id=item['assignee_id'],
+                task_count=item['count']
+            )
+            for item in tasks.order_by().values('project_id', 'status', 'assignee_id').annotate(count=Count('id'))
+        ]
+
+        with transaction.atomic():
+            snapshots.delete()
+            cls.objects.bulk_create(rows, batch_size=1000)
+        return len(rows)
+
+
+class ProjectDailyActivity(models.Model):
+    """
+    Количество созданных и завершенных задач проекта за день
+    (для графика "создано / завершено")
+    """
+    date = models.DateField(verbose_name="Дата")
+    project = models.ForeignKey(
+        Project,
+        on_delete=models.CASCADE,
+        related_name='daily_activity',
+        verbose_name="Проект"
+    )
+    created_count = models.PositiveIntegerField(default=0, verbose_name="Создано задач")
+    completed_count = models.PositiveIntegerField(default=0, verbose_name="Завершено задач")
+
+    class Meta:
+        verbose_name = "Активность проекта за день"
+        verbose_name_plural = "Активность проектов по дням"
+        unique_together = ('project', 'date')
+
+    def __str__(self):
+        return f"{self.date} {self.project_id}: +{self.created_count} / {self.completed_count}"
+
+    @classmethod
+    def collect(cls, start_date, end_date=None, project_ids=None):
+        """
+        Пересчитывает активность за период [start_date, end_date].
+        Завершенными в день D считаются задачи, перешедшие в статус
+        "Завершена" в день D (по журналу смен статусов).
+        Возвращает количество записанных строк
+        """
+        end_date = end_date or start_date
+        start, end = get_day_bounds(start_date, end_date)
+        tz = timezone.get_current_timezone()
+
+        tasks = Task.objects.all()
+        activity = cls.objects.filter(date__range=(start_date, end_date))
+        if project_ids:
+            tasks = tasks.filter(project_id__in=project_ids)
+            activity = activity.filter(project_id__in=project_ids)
+
+        counts = {}
+        created = tasks.filter(
+            created_at__gte=start, created_at__lt=end
+        ).annotate(
+            day=TruncDate('created_at', tzinfo=tz)
+        ).order_by().values('project_id', 'day').annotate(count=Count('id'))
+        for item in created:
+            counts.setdefault((item['project_id'], item['day']), [0, 0])[0] = item['count']
+
+        transitions = TaskStatusTransition.objects.filter(
+            to_status='Завершена', changed_at__gte=start, changed_at__lt=end
+        )
+        if project_ids:
+            transitions = transitions.filter(project_id__in=project_ids)
+        completed = transitions.annotate(
+            day=TruncDate('changed_at', tzinfo=tz)
+        ).order_by().values('project_id', 'day').annotate(count=Count('task_id', distinct=True))
+        for item in completed:
+            counts.setdefault((item['project_id'], item['day']), [0, 0])[1] = item['count']
+
+        rows = [
+            cls(project_id=project_id, date=day, created_count=created_count, completed_count=completed_count)
+            for (project_id, day), (created_count, completed_count) in counts.items()
+        ]
+
+        with transaction.atomic():
+            activity.delete()
+            cls.objects.bulk_create(rows, batch_size=1000)
+        return len(rows)
+
+
+# Сигналы версий проектов для кэша аналитики (analytics/cache.py)
+@receiver(post_save, sender=Task)
+def bump_version_on_task_save(sender, instance, **kwargs):
+    # При переносе задачи меняются данные и старого проекта
+    bump_project_versions([instance.project_id, instance._original_project_id])
+
+
+@receiver(post_delete, sender=Task)
+def bump_version_on_task_delete(sender, instance, **kwargs):
+    bump_project_versions([instance.project_id])
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def bump_version_on_comment_change(sender, instance, origin=None, **kwargs):
+    # Каскадное удаление вместе с задачей покрывается сигналом задачи
+    if isinstance(origin, Task) or getattr(origin, 'model', None) is Task:
+        return
+    bump_project_versions([get_comment_project_id(instance)])
+
+
+@receiver(post_save, sender=Project)
+def bump_version_on_project_save(sender, instance, **kwargs):
+    bump_project_versions([instance.id])
+
+
+@receiver(m2m_changed, sender=Project.members.through)
+def bump_version_on_member_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    # Набор участия пользователя входит в ключ отчетов по всем его проектам,
+    # поэтому для изменений со стороны пользователя достаточно известных проектов
+    if reverse:
+        bump_project_versions(pk_set or [])
+    else:
+        bump_project_versions([instance.id])
 
-# Create your models here.
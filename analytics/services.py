@@ -1,9 +1,119 @@
-from django.db.models import Count, Q
-from tasks.models import Task
-from projects.models import Project
+import random
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import Q, Sum
+from tasks.models import Task, TaskStatusTransition
+from projects.models import Project, ProjectStats
+from projects.membership import get_member_project_ids, is_project_member
+from .models import TaskStatusSnapshot, ProjectDailyActivity
+from . import cache as analytics_cache
 from django.utils import timezone
 from datetime import timedelta
 
+# Цвета статусов задач для графиков
+STATUS_COLORS = {
+    'Новая': 'rgba(54, 162, 235, 0.6)',
+    'В работе': 'rgba(255, 206, 86, 0.6)',
+    'На проверке': 'rgba(75, 192, 192, 0.6)',
+    'Завершена': 'rgba(153, 102, 255, 0.6)'
+}
+DEFAULT_COLOR = 'rgba(201, 203, 207, 0.6)'
+
+# Ключ сводки для всех проектов пользователя
+ALL_PROJECTS = 'all'
+EMPTY_CHART = {'labels': [], 'data': [], 'backgroundColor': []}
+
+# Значения GROUPING(p.id, t.status, t.assignee_id) для наборов группировки
+GROUPING_PROJECT = 0b011
+GROUPING_PROJECT_STATUS = 0b001
+GROUPING_PROJECT_ASSIGNEE = 0b010
+GROUPING_STATUS = 0b101
+GROUPING_ASSIGNEE = 0b110
+
+# Сводка аналитики по всем проектам пользователя одним проходом по задачам.
+# LEFT JOIN оставляет в итогах проекты без задач
+DASHBOARD_SQL = """
+SELECT
+    GROUPING(p.id, t.status, t.assignee_id),
+    p.id, MAX(p.name),
+    t.status,
+    t.assignee_id, MAX(u.username), MAX(u.first_name), MAX(u.last_name),
+    COUNT(t.id),
+    COUNT(t.id) FILTER (WHERE t.status = %(done)s)
+FROM {projects} p
+JOIN {members} m ON m.project_id = p.id AND m.user_id = %(user_id)s
+LEFT JOIN {tasks} t ON t.project_id = p.id
+LEFT JOIN {users} u ON u.id = t.assignee_id
+GROUP BY GROUPING SETS (
+    (p.id),
+    (p.id, t.status),
+    (p.id, t.assignee_id),
+    (t.status),
+    (t.assignee_id)
+)
+"""
+
+# Время цикла (от первого перехода "В работе") и время выполнения
+# (от появления задачи в проекте) для задач, завершенных за период.
+# Текущий статус задачи - последняя запись журнала (position = 1)
+CYCLE_TIME_SQL = """
+WITH task_times AS (
+    SELECT
+        task_id,
+        to_status,
+        changed_at,
+        MIN(changed_at) FILTER (WHERE from_status IS NULL) OVER task_window AS created_at,
+        MIN(changed_at) FILTER (WHERE to_status = %(started)s) OVER task_window AS started_at,
+        ROW_NUMBER() OVER (PARTITION BY task_id ORDER BY changed_at DESC, id DESC) AS position
+    FROM {table}
+    WHERE project_id = %(project_id)s
+      AND task_id IN (
+          SELECT task_id FROM {table}
+          WHERE project_id = %(project_id)s AND to_status = %(done)s AND changed_at >= %(since)s
+      )
+    WINDOW task_window AS (PARTITION BY task_id)
+)
+SELECT
+    COUNT(*),
+    percentile_cont(ARRAY[0.5, 0.85, 0.95]) WITHIN GROUP (
+        ORDER BY EXTRACT(EPOCH FROM changed_at - started_at)
+    ) FILTER (WHERE started_at IS NOT NULL),
+    AVG(EXTRACT(EPOCH FROM changed_at - started_at)),
+    percentile_cont(ARRAY[0.5, 0.85, 0.95]) WITHIN GROUP (
+        ORDER BY EXTRACT(EPOCH FROM changed_at - created_at)
+    ) FILTER (WHERE created_at IS NOT NULL),
+    AVG(EXTRACT(EPOCH FROM changed_at - created_at))
+FROM task_times
+WHERE position = 1 AND to_status = %(done)s AND changed_at >= %(since)s
+"""
+
+# Накопительная диаграмма потока: сколько задач находилось в каждом
+# статусе на конец каждого дня. Интервал пребывания в статусе -
+# от записи журнала до следующей записи той же задачи (LEAD)
+CUMULATIVE_FLOW_SQL = """
+WITH days AS (
+    SELECT
+        day::date AS day,
+        (day + INTERVAL '1 day') AT TIME ZONE %(tz)s AS day_end
+    FROM generate_series(%(start)s::timestamp, %(end)s::timestamp, INTERVAL '1 day') AS day
+),
+intervals AS (
+    SELECT
+        to_status,
+        changed_at,
+        LEAD(changed_at) OVER (PARTITION BY task_id ORDER BY changed_at, id) AS next_changed_at
+    FROM {table}
+    WHERE project_id = %(project_id)s AND changed_at < %(until)s
+)
+SELECT days.day, intervals.to_status, COUNT(*)
+FROM days
+JOIN intervals
+  ON intervals.changed_at < days.day_end
+ AND (intervals.next_changed_at IS NULL OR intervals.next_changed_at >= days.day_end)
+WHERE intervals.to_status IS NOT NULL
+GROUP BY days.day, intervals.to_status
+"""
+
 
 class AnalyticsService:
     """
@@ -11,143 +121,262 @@ class AnalyticsService:
     """
 
     @staticmethod
-    def get_tasks_by_status(user, project_id=None):
+    def get_dashboard(user):
         """
-        Получает статистику задач по статусам для всех проектов пользователя
-        или для конкретного проекта
+        Вся аналитика по проектам пользователя одним запросом (GROUPING SETS):
+        список проектов с прогрессом и распределения задач по статусам
+        и исполнителям для каждого проекта и для всех проектов вместе
         """
-        # Получаем все проекты пользователя
-        projects = Project.objects.filter(members=user)
+        sql = DASHBOARD_SQL.format(
+            projects=connection.ops.quote_name(Project._meta.db_table),
+            members=connection.ops.quote_name(Project.members.through._meta.db_table),
+            tasks=connection.ops.quote_name(Task._meta.db_table),
+            users=connection.ops.quote_name(User._meta.db_table),
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, {'user_id': user.id, 'done': 'Завершена'})
+            rows = cursor.fetchall()
 
-        # Базовый запрос
-        tasks_query = Task.objects.filter(project__in=projects)
+        projects = []
+        status_counts = {ALL_PROJECTS: {}}
+        user_counts = {ALL_PROJECTS: []}
 
-        # Если указан ID проекта, фильтруем по нему
-        if project_id:
-            tasks_query = tasks_query.filter(project_id=project_id)
+        for (grouping, project_id, project_name, status, assignee_id,
+             username, first_name, last_name, count, completed) in rows:
+            key = ALL_PROJECTS if project_id is None else str(project_id)
 
-        # Получаем статистику по статусам задач
-        status_counts = tasks_query.values('status').annotate(count=Count('id'))
+            if grouping == GROUPING_PROJECT:
+                projects.append({
+                    'id': project_id,
+                    'name': project_name,
+                    'total_tasks': count,
+                    'completed_tasks': completed,
+                    'progress_percentage': round(completed / count * 100) if count else 0,
+                })
+                status_counts.setdefault(key, {})
+                user_counts.setdefault(key, [])
+            elif not count:
+                # Проект без задач: строка LEFT JOIN без данных
+                continue
+            elif grouping in (GROUPING_PROJECT_STATUS, GROUPING_STATUS):
+                status_counts.setdefault(key, {})[status] = count
+            elif assignee_id is not None:
+                # Задачи без исполнителя в распределение не попадают
+                name = f"{first_name or ''} {last_name or ''}".strip() or username
+                user_counts.setdefault(key, []).append((name, count))
 
-        # Преобразуем в словарь для удобства
-        result = {
-            'labels': [],
-            'data': [],
-            'backgroundColor': []
-        }
+        # Статусы - в порядке колонок канбан-доски
+        order = [status for status, _ in Task.STATUS_CHOICES]
+
+        def status_chart(counts):
+            statuses = sorted(counts, key=lambda status: order.index(status) if status in order else len(order))
+            return {
+                'labels': statuses,
+                'data': [counts[status] for status in statuses],
+                'backgroundColor': [STATUS_COLORS.get(status, DEFAULT_COLOR) for status in statuses],
+            }
+
+        def user_chart(counts):
+            counts = sorted(counts, key=lambda item: (-item[1], item[0]))
+            return {
+                'labels': [name for name, _ in counts],
+                'data': [count for _, count in counts],
+                'backgroundColor': [
+                    f"rgba({random.randint(0, 255)}, {random.randint(0, 255)}, {random.randint(0, 255)}, 0.6)"
+                    for _ in counts
+                ],
+            }
 
-        # Цвета для графиков
-        colors = {
-            'Новая': 'rgba(54, 162, 235, 0.6)',
-            'В работе': 'rgba(255, 206, 86, 0.6)',
-            'На проверке': 'rgba(75, 192, 192, 0.6)',
-            'Завершена': 'rgba(153, 102, 255, 0.6)'
+        return {
+            'projects': sorted(projects, key=lambda project: project['name']),
+            'tasks_by_status': {key: status_chart(counts) for key, counts in status_counts.items()},
+            'tasks_by_user': {key: user_chart(counts) for key, counts in user_counts.items()},
         }
 
-        # Заполняем результат
-        for status_item in status_counts:
-            status = status_item['status']
-            count = status_item['count']
+    @classmethod
+    def get_tasks_by_status(cls, user, project_id=None):
+        """
+        Получает статистику задач по статусам для всех проектов пользователя
+        или для конкретного проекта
+        """
+        charts = cls.get_dashboard(user)['tasks_by_status']
+        return charts.get(str(project_id) if project_id else ALL_PROJECTS, dict(EMPTY_CHART))
+
+    @classmethod
+    def get_tasks_by_user(cls, user, project_id=None):
+        """
+        Получает статистику задач по пользователям для проекта или всех проектов
+        """
+        charts = cls.get_dashboard(user)['tasks_by_user']
+        return charts.get(str(project_id) if project_id else ALL_PROJECTS, dict(EMPTY_CHART))
 
-            result['labels'].append(status)
-            result['data'].append(count)
-            result['backgroundColor'].append(colors.get(status, 'rgba(201, 203, 207, 0.6)'))
+    @staticmethod
+    def get_project_progress(user, project_id, request=None):
+        """
+        Получает данные о прогрессе проекта из денормализованных
+        счетчиков (ProjectStats) - без построения всей сводки
+        """
+        counts = {}
+        if is_project_member(user, project_id, request):
+            counts = dict(
+                ProjectStats.objects.filter(project_id=project_id).values_list('status', 'task_count')
+            )
 
-        return result
+        total = sum(counts.values())
+        completed = counts.get('Завершена', 0)
+        return {
+            'total_tasks': total,
+            'completed_tasks': completed,
+            'progress_percentage': round(completed / total * 100) if total else 0,
+        }
 
     @staticmethod
-    def get_tasks_by_user(project_id=None, user=None):
+    def get_date_range(days):
+        """Последние days дней, включая сегодня"""
+        end_date = timezone.localdate()
+        return [end_date - timedelta(days=offset) for offset in range(days - 1, -1, -1)]
+
+    @staticmethod
+    def get_burndown(project_id, days=30):
         """
-        Получает статистику задач по пользователям для проекта или всех проектов
+        Диаграмма сгорания по дневным срезам: сколько задач
+        оставалось открытыми на конец каждого дня
         """
-        # Базовый запрос
-        query = Task.objects
-
-        # Фильтрация по проекту, если указан
-        if project_id:
-            query = query.filter(project_id=project_id)
-        elif user:
-            # Если проект не указан, но указан пользователь,
-            # фильтруем по проектам, где пользователь является участником
-            query = query.filter(project__members=user)
-
-        # Получаем статистику по исполнителям
-        user_counts = query.values(
-            'assignee__id',
-            'assignee__username',
-            'assignee__first_name',
-            'assignee__last_name'
-        ).annotate(count=Count('id'))
-
-        # Преобразуем в формат для графика
+        dates = AnalyticsService.get_date_range(days)
+
+        totals = TaskStatusSnapshot.objects.filter(
+            project_id=project_id,
+            date__gte=dates[0]
+        ).values('date').annotate(
+            remaining=Sum('task_count', filter=~Q(status='Завершена')),
+            total=Sum('task_count')
+        ).order_by('date')
+
+        # Дни без среза (команда не запускалась) на графике пропускаются
         result = {
             'labels': [],
-            'data': [],
-            'backgroundColor': []
+            'datasets': [
+                {'label': 'Осталось задач', 'data': [], 'borderColor': 'rgba(255, 99, 132, 0.8)'},
+                {'label': 'Всего задач', 'data': [], 'borderColor': 'rgba(54, 162, 235, 0.8)'},
+            ]
         }
+        for item in totals:
+            result['labels'].append(item['date'].isoformat())
+            result['datasets'][0]['data'].append(item['remaining'] or 0)
+            result['datasets'][1]['data'].append(item['total'] or 0)
 
-        # Генерируем цвета для каждого пользователя
-        import random
-
-        for user_item in user_counts:
-            # Пропускаем записи с None в assignee__id (задачи без исполнителя)
-            if user_item['assignee__id'] is None:
-                continue
-
-            # Формируем имя пользователя
-            first_name = user_item['assignee__first_name'] or ''
-            last_name = user_item['assignee__last_name'] or ''
-            username = user_item['assignee__username'] or ''
+        return result
 
-            if first_name or last_name:
-                name = f"{first_name} {last_name}".strip()
-            else:
-                name = username
+    @staticmethod
+    def get_created_vs_completed(project_id, days=30):
+        """Количество созданных и завершенных задач проекта по дням"""
+        dates = AnalyticsService.get_date_range(days)
 
-            result['labels'].append(name)
-            result['data'].append(user_item['count'])
+        activity = {
+            item.date: item
+            for item in ProjectDailyActivity.objects.filter(
+                project_id=project_id,
+                date__gte=dates[0]
+            )
+        }
 
-            # Генерируем случайный цвет
-            color = f"rgba({random.randint(0, 255)}, {random.randint(0, 255)}, {random.randint(0, 255)}, 0.6)"
-            result['backgroundColor'].append(color)
+        result = {
+            'labels': [date.isoformat() for date in dates],
+            'datasets': [
+                {'label': 'Создано', 'data': [], 'backgroundColor': 'rgba(54, 162, 235, 0.6)'},
+                {'label': 'Завершено', 'data': [], 'backgroundColor': 'rgba(75, 192, 192, 0.6)'},
+            ]
+        }
+        for date in dates:
+            item = activity.get(date)
+            result['datasets'][0]['data'].append(item.created_count if item else 0)
+            result['datasets'][1]['data'].append(item.completed_count if item else 0)
 
         return result
 
+
     @staticmethod
-    def get_project_progress(project_id):
+    def get_cycle_time(project_id, days=90):
         """
-        Получает данные о прогрессе проекта
+        Перцентили времени цикла и времени выполнения (в часах)
+        для задач проекта, завершенных за последние days дней.
+        Вычисляется одним SQL-запросом по журналу смен статусов
         """
-        try:
-            project = Project.objects.get(id=project_id)
-
-            # Получаем количество задач по статусам
-            status_counts = Task.objects.filter(
-                project=project
-            ).values('status').annotate(count=Count('id'))
-
-            # Преобразуем в словарь
-            counts = {}
-            total = 0
-
-            for item in status_counts:
-                counts[item['status']] = item['count']
-                total += item['count']
-
-            # Вычисляем проценты
-            result = {
-                'total_tasks': total,
-                'completed_tasks': counts.get('Завершена', 0),
-                'progress_percentage': 0
-            }
+        sql = CYCLE_TIME_SQL.format(table=connection.ops.quote_name(TaskStatusTransition._meta.db_table))
+        with connection.cursor() as cursor:
+            cursor.execute(sql, {
+                'project_id': project_id,
+                'since': timezone.now() - timedelta(days=days),
+                'started': 'В работе',
+                'done': 'Завершена',
+            })
+            count, cycle_percentiles, cycle_average, lead_percentiles, lead_average = cursor.fetchone()
 
-            if total > 0:
-                result['progress_percentage'] = round((counts.get('Завершена', 0) / total) * 100)
+        def hours(seconds):
+            return round(seconds / 3600, 1) if seconds is not None else None
 
-            return result
-        except Project.DoesNotExist:
+        def summary(percentiles, average):
+            percentiles = percentiles or [None, None, None]
             return {
-                'total_tasks': 0,
-                'completed_tasks': 0,
-                'progress_percentage': 0
-            }
\ No newline at end of file
+                'p50': hours(percentiles[0]),
+                'p85': hours(percentiles[1]),
+                'p95': hours(percentiles[2]),
+                'average': hours(average),
+            }
+
+        return {
+            'completed_tasks': count,
+            'cycle_time_hours': summary(cycle_percentiles, cycle_average),
+            'lead_time_hours': summary(lead_percentiles, lead_average),
+        }
+
+    @staticmethod
+    def get_cumulative_flow(project_id, days=30):
+        """
+        Накопительная диаграмма потока (CFD) за последние days дней
+        по журналу смен статусов
+        """
+        dates = AnalyticsService.get_date_range(days)
+        sql = CUMULATIVE_FLOW_SQL.format(table=connection.ops.quote_name(TaskStatusTransition._meta.db_table))
+        with connection.cursor() as cursor:
+            cursor.execute(sql, {
+                'project_id': project_id,
+                'start': dates[0],
+                'end': dates[-1],
+                'until': timezone.now(),
+                'tz': timezone.get_current_timezone_name(),
+            })
+            counts = {(day, status): count for day, status, count in cursor.fetchall()}
+
+        # Завершенные задачи - нижний слой диаграммы
+        statuses = [status for status, _ in reversed(Task.STATUS_CHOICES)]
+        return {
+            'labels': [date.isoformat() for date in dates],
+            'datasets': [
+                {
+                    'label': status,
+                    'data': [counts.get((date, status), 0) for date in dates],
+                    'backgroundColor': STATUS_COLORS.get(status, DEFAULT_COLOR),
+                }
+                for status in statuses
+            ]
+        }
+
+
+class CachedAnalyticsService(AnalyticsService):
+    """
+    Кэширующая обертка над AnalyticsService (см. analytics/cache.py).
+    Кэшируется сводка пользователя; ключ включает версии всех его проектов
+    """
+
+    @staticmethod
+    def get_user_project_ids(user):
+        """Набор участия пользователя - ID его проектов"""
+        return sorted(get_member_project_ids(user))
+
+    @staticmethod
+    def get_dashboard(user):
+        return analytics_cache.get_or_compute(
+            'dashboard', CachedAnalyticsService.get_user_project_ids(user), None,
+            lambda: AnalyticsService.get_dashboard(user)
+        )
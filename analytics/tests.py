@@ -1,3 +1,347 @@
-from django.test import TestCase
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from django.contrib.auth.models import User
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models import Count
+from django.test import override_settings
+from django.utils import timezone
+from projects.models import Project
+from tasks.models import Task, Comment, TaskStatusTransition
+from tasks.testing import TaskAPITestCase
+from . import cache as analytics_cache
+from .models import TaskStatusSnapshot, ProjectDailyActivity, get_day_bounds
+from .services import AnalyticsService
 
-# Create your tests here.
+
+class AnalyticsTestCase(TaskAPITestCase):
+    """Проект с участником и запрос графиков аналитики проекта"""
+
+    def get_series(self, name, **params):
+        response = self.client.get(f'/api/analytics/{name}/{self.project.id}/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+
+class SnapshotSeriesTest(AnalyticsTestCase):
+    """Команда snapshot_analytics и графики по дневным срезам"""
+
+    def test_snapshot_command(self):
+        self.create_task(status='Новая', assignee=self.user)
+        self.create_task(status='Новая', assignee=self.user)
+        self.create_task(status='Завершена')
+
+        out = StringIO()
+        call_command('snapshot_analytics', stdout=out)
+        self.assertIn('Срезы аналитики записаны', out.getvalue())
+
+        today = timezone.localdate()
+        self.assertEqual(
+            set(TaskStatusSnapshot.objects.filter(date=today).values_list('status', 'assignee_id', 'task_count')),
+            {('Новая', self.user.id, 2), ('Завершена', None, 1)}
+        )
+        activity = ProjectDailyActivity.objects.get(project=self.project, date=today)
+        self.assertEqual((activity.created_count, activity.completed_count), (3, 1))
+
+        # Повторный запуск за тот же день заменяет срез
+        Task.objects.filter(status='Новая').delete()
+        call_command('snapshot_analytics', stdout=StringIO())
+        self.assertEqual(
+            list(TaskStatusSnapshot.objects.filter(date=today).values_list('status', 'task_count')),
+            [('Завершена', 1)]
+        )
+
+    def test_snapshot_command_for_past_date(self):
+        task = self.create_task()
+        yesterday = timezone.localdate() - timedelta(days=1)
+        Task.objects.filter(pk=task.pk).update(created_at=timezone.now() - timedelta(days=1))
+
+        out = StringIO()
+        call_command('snapshot_analytics', '--date', yesterday.isoformat(), stdout=out)
+        self.assertFalse(TaskStatusSnapshot.objects.exists())
+        self.assertEqual(ProjectDailyActivity.objects.get(project=self.project).date, yesterday)
+
+        with self.assertRaises(CommandError):
+            call_command('snapshot_analytics', '--date', 'вчера', stdout=StringIO())
+
+    def test_burndown(self):
+        today = timezone.localdate()
+        TaskStatusSnapshot.objects.bulk_create([
+            TaskStatusSnapshot(date=today - timedelta(days=2), project=self.project, status='Новая', task_count=4),
+            TaskStatusSnapshot(date=today - timedelta(days=1), project=self.project, status='Новая', task_count=2),
+            TaskStatusSnapshot(date=today - timedelta(days=1), project=self.project, status='Завершена', task_count=2),
+            # Срез за пределами периода
+            TaskStatusSnapshot(date=today - timedelta(days=10), project=self.project, status='Новая', task_count=9),
+        ])
+
+        data = self.get_series('burndown', days=7)
+        self.assertEqual(data['labels'], [(today - timedelta(days=2)).isoformat(), (today - timedelta(days=1)).isoformat()])
+        self.assertEqual(data['datasets'][0]['data'], [4, 2])
+        self.assertEqual(data['datasets'][1]['data'], [4, 4])
+
+    def test_created_vs_completed(self):
+        first = self.create_task()
+        self.create_task()
+        first.status = 'Завершена'
+        first.save()
+        # Задача, созданная вчера
+        old = self.create_task()
+        Task.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=1))
+        call_command('snapshot_analytics', '--backfill-days', '1', stdout=StringIO())
+
+        data = self.get_series('created-vs-completed', days=3)
+        today = timezone.localdate()
+        self.assertEqual(data['labels'], [(today - timedelta(days=offset)).isoformat() for offset in (2, 1, 0)])
+        self.assertEqual(data['datasets'][0]['data'], [0, 1, 2])
+        self.assertEqual(data['datasets'][1]['data'], [0, 0, 1])
+
+    def test_days_parameter_is_clamped(self):
+        self.assertEqual(len(self.get_series('created-vs-completed', days=1000)['labels']), 365)
+        self.assertEqual(len(self.get_series('created-vs-completed', days=0)['labels']), 1)
+        self.assertEqual(len(self.get_series('created-vs-completed', days='x')['labels']), 30)
+
+    def test_requires_membership(self):
+        stranger = User.objects.create_user(username='stranger', password='password')
+        self.client.force_authenticate(user=stranger)
+        response = self.client.get(f'/api/analytics/burndown/{self.project.id}/')
+        self.assertEqual(response.status_code, 403)
+
+
+ANALYTICS_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'projectflow-analytics-tests'),
+    },
+}
+
+
+class AnalyticsCacheDisabledTest(AnalyticsTestCase):
+    """Без общего кэша отчеты вычисляются при каждом запросе"""
+
+    def test_reports_are_not_cached_by_default(self):
+        url = '/api/analytics/tasks-by-status/'
+        self.create_task()
+        self.assertEqual(self.client.get(url).json()['data'], [1])
+        self.create_task()
+        self.assertEqual(self.client.get(url).json()['data'], [2])
+        self.assertIsNone(analytics_cache.get_stats())
+
+        out = StringIO()
+        call_command('analytics_cache_stats', stdout=out)
+        self.assertIn('отключен', out.getvalue())
+
+    def test_process_local_cache_is_refused(self):
+        with override_settings(ANALYTICS_CACHE_ALIAS='default'):
+            with self.assertRaises(ImproperlyConfigured):
+                analytics_cache.get_cache()
+
+
+@override_settings(CACHES=ANALYTICS_CACHES, ANALYTICS_CACHE_ALIAS='shared')
+class AnalyticsCacheTest(AnalyticsTestCase):
+    """Запись задач, комментариев и участников меняет версию проекта в кэше аналитики"""
+
+    def setUp(self):
+        super().setUp()
+        analytics_cache.get_cache().clear()
+
+    def assert_bumps_version(self, write):
+        before = analytics_cache.get_project_versions([self.project.id])
+        with self.captureOnCommitCallbacks(execute=True):
+            write()
+        after = analytics_cache.get_project_versions([self.project.id])
+        self.assertNotEqual(before, after)
+
+    def test_writes_bump_project_version(self):
+        task = self.create_task()
+        self.assert_bumps_version(lambda: self.create_task())
+        self.assert_bumps_version(lambda: Task.objects.filter(pk=task.pk).first().save())
+        comment = Comment.objects.create(task=task, author=self.user, text='Комментарий')
+        self.assert_bumps_version(lambda: Comment.objects.create(task=task, author=self.user, text='Еще'))
+        self.assert_bumps_version(comment.delete)
+        self.assert_bumps_version(lambda: self.project.members.add(User.objects.create_user(username='new')))
+        # Массовое изменение выполняется UPDATE без сигналов
+        self.assert_bumps_version(lambda: self.client.post(
+            '/api/tasks/bulk/', {'ids': [task.id], 'priority': 'Высокий'}, format='json'
+        ))
+        self.assert_bumps_version(task.delete)
+
+    def test_version_bumped_only_after_commit(self):
+        before = analytics_cache.get_project_versions([self.project.id])
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.create_task()
+            self.assertEqual(analytics_cache.get_project_versions([self.project.id]), before)
+        self.assertTrue(callbacks)
+
+    def test_cached_report_is_invalidated(self):
+        url = '/api/analytics/tasks-by-status/'
+        self.create_task()
+        analytics_cache.reset_stats()
+
+        self.assertEqual(self.client.get(url).json()['data'], [1])
+        self.assertEqual(self.client.get(url).json()['data'], [1])
+        self.assertEqual(analytics_cache.get_stats()['hits'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_task()
+        self.assertEqual(self.client.get(url).json()['data'], [2])
+        self.assertEqual(analytics_cache.get_stats()['misses'], 2)
+
+
+class TransitionSeriesTest(AnalyticsTestCase):
+    """Время цикла и накопительная диаграмма потока по известному журналу переходов"""
+
+    def record(self, task, transitions):
+        """Заменяет журнал задачи переходами (from_status, to_status, changed_at)"""
+        TaskStatusTransition.objects.filter(task_id=task.id).delete()
+        TaskStatusTransition.objects.bulk_create([
+            TaskStatusTransition(task_id=task.id, project_id=self.project.id,
+                                 from_status=from_status, to_status=to_status, changed_at=changed_at)
+            for from_status, to_status, changed_at in transitions
+        ])
+
+    def test_cycle_time(self):
+        now = timezone.now()
+
+        def hours_ago(hours):
+            return now - timedelta(hours=hours)
+
+        # Время цикла 6 и 10 часов, время выполнения 8 и 16 часов
+        self.record(self.create_task(), [
+            (None, 'Новая', hours_ago(10)),
+            ('Новая', 'В работе', hours_ago(8)),
+            ('В работе', 'Завершена', hours_ago(2)),
+        ])
+        self.record(self.create_task(), [
+            (None, 'Новая', hours_ago(20)),
+            ('Новая', 'В работе', hours_ago(14)),
+            ('В работе', 'Завершена', hours_ago(4)),
+        ])
+        # Переоткрытая задача не считается завершенной
+        self.record(self.create_task(), [
+            (None, 'Новая', hours_ago(5)),
+            ('Новая', 'Завершена', hours_ago(3)),
+            ('Завершена', 'В работе', hours_ago(1)),
+        ])
+        # Завершена за пределами периода
+        self.record(self.create_task(), [
+            (None, 'Новая', now - timedelta(days=100)),
+            ('Новая', 'Завершена', now - timedelta(days=99)),
+        ])
+
+        data = self.get_series('cycle-time', days=30)
+        self.assertEqual(data['completed_tasks'], 2)
+        self.assertEqual(data['cycle_time_hours'], {'p50': 8.0, 'p85': 9.4, 'p95': 9.8, 'average': 8.0})
+        self.assertEqual(data['lead_time_hours'], {'p50': 12.0, 'p85': 14.8, 'p95': 15.6, 'average': 12.0})
+
+    def test_cycle_time_without_tasks(self):
+        data = self.get_series('cycle-time')
+        self.assertEqual(data['completed_tasks'], 0)
+        self.assertEqual(data['cycle_time_hours'], {'p50': None, 'p85': None, 'p95': None, 'average': None})
+
+    def test_cumulative_flow(self):
+        today = timezone.localdate()
+        first_day, second_day = today - timedelta(days=2), today - timedelta(days=1)
+
+        def at(day, hour):
+            return get_day_bounds(day, day)[0] + timedelta(hours=hour)
+
+        self.record(self.create_task(), [
+            (None, 'Новая', at(first_day, 12)),
+            ('Новая', 'В работе', at(second_day, 12)),
+        ])
+        self.record(self.create_task(), [
+            (None, 'Новая', at(first_day, 12)),
+            ('Новая', 'Завершена', at(first_day, 13)),
+        ])
+        # Удаленная задача пропадает из диаграммы
+        self.record(self.create_task(), [
+            (None, 'Новая', at(second_day, 12)),
+            ('Новая', None, at(second_day, 13)),
+        ])
+
+        data = self.get_series('cumulative-flow', days=3)
+        self.assertEqual(data['labels'], [first_day.isoformat(), second_day.isoformat(), today.isoformat()])
+        self.assertEqual(
+            {dataset['label']: dataset['data'] for dataset in data['datasets']},
+            {
+                'Завершена': [1, 1, 1],
+                'На проверке': [0, 0, 0],
+                'В работе': [0, 1, 1],
+                'Новая': [1, 0, 0],
+            }
+        )
+
+
+class DashboardProjectionTest(AnalyticsTestCase):
+    """Проекции сводки и прогресс из счетчиков совпадают с отдельными запросами к задачам"""
+
+    def setUp(self):
+        super().setUp()
+        self.assignee = User.objects.create_user(username='assignee', first_name='Иван', last_name='Петров')
+        self.other_project = Project.objects.create(name='Другой', created_by=self.user)
+        self.other_project.members.add(self.user, self.assignee)
+        self.empty_project = Project.objects.create(name='Пустой', created_by=self.user)
+        self.empty_project.members.add(self.user)
+
+        statuses = [status for status, _ in Task.STATUS_CHOICES]
+        for index in range(11):
+            self.create_task(
+                project=self.project if index % 3 else self.other_project,
+                status=statuses[index % len(statuses)],
+                assignee=[None, self.user, self.assignee][index % 3]
+            )
+
+    def expected_status_counts(self, tasks):
+        return dict(tasks.order_by().values_list('status').annotate(count=Count('id')))
+
+    def expected_user_counts(self, tasks):
+        counts = tasks.exclude(assignee=None).order_by().values_list('assignee').annotate(count=Count('id'))
+        names = {user.id: user.get_full_name() or user.username for user in User.objects.all()}
+        return {names[assignee_id]: count for assignee_id, count in counts}
+
+    def test_project_progress_matches_task_counts(self):
+        for project in (self.project, self.other_project, self.empty_project):
+            tasks = Task.objects.filter(project=project)
+            total = tasks.count()
+            completed = tasks.filter(status='Завершена').count()
+            expected = {
+                'total_tasks': total,
+                'completed_tasks': completed,
+                'progress_percentage': round(completed / total * 100) if total else 0,
+            }
+            self.assertEqual(AnalyticsService.get_project_progress(self.user, project.id), expected)
+
+            response = self.client.get(f'/api/analytics/project-progress/{project.id}/')
+            self.assertEqual(response.json(), expected)
+
+            dashboard_entry = next(
+                item for item in AnalyticsService.get_dashboard(self.user)['projects'] if item['id'] == project.id
+            )
+            self.assertEqual({key: dashboard_entry[key] for key in expected}, expected)
+
+    def test_project_progress_reads_counters(self):
+        with self.assertNumQueries(2):
+            # Набор участия и счетчики проекта
+            AnalyticsService.get_project_progress(self.user, self.project.id)
+
+        stranger = User.objects.create_user(username='stranger')
+        self.assertEqual(AnalyticsService.get_project_progress(stranger, self.project.id)['total_tasks'], 0)
+
+    def test_status_and_user_projections(self):
+        projects = {str(self.project.id): self.project, str(self.other_project.id): self.other_project}
+        for key in (None, *projects):
+            tasks = Task.objects.filter(project__in=projects.values())
+            if key:
+                tasks = tasks.filter(project=projects[key])
+
+            chart = AnalyticsService.get_tasks_by_status(self.user, key)
+            self.assertEqual(dict(zip(chart['labels'], chart['data'])), self.expected_status_counts(tasks))
+
+            chart = AnalyticsService.get_tasks_by_user(self.user, key)
+            self.assertEqual(dict(zip(chart['labels'], chart['data'])), self.expected_user_counts(tasks))
+
+        self.assertEqual(AnalyticsService.get_tasks_by_status(self.user, self.empty_project.id)['data'], [])
@@ -1,11 +1,19 @@
 from django.urls import path
 from .views import (
+    DashboardView,
     TasksByStatusView,
     TasksByUserView,
-    ProjectProgressView
+    ProjectProgressView,
+    BurndownView,
+    CreatedVsCompletedView,
+    CycleTimeView,
+    CumulativeFlowView
 )
 
 urlpatterns = [
+    # URL для сводки аналитики по всем проектам пользователя
+    path('dashboard/', DashboardView.as_view(), name='dashboard'),
+
     # URL для получения статистики задач по статусам
     path('tasks-by-status/', TasksByStatusView.as_view(), name='tasks_by_status'),
 
@@ -14,4 +22,16 @@ urlpatterns = [
 
     # URL для получения прогресса по проекту
     path('project-progress/<int:project_id>/', ProjectProgressView.as_view(), name='project_progress'),
-]
\ No newline at end of file
+
+    # URL для диаграммы сгорания проекта (по дневным срезам)
+    path('burndown/<int:project_id>/', BurndownView.as_view(), name='burndown'),
+
+    # URL для графика созданных и завершенных задач по дням
+    path('created-vs-completed/<int:project_id>/', CreatedVsCompletedView.as_view(), name='created_vs_completed'),
+
+    # URL для перцентилей времени цикла (по журналу смен статусов)
+    path('cycle-time/<int:project_id>/', CycleTimeView.as_view(), name='cycle_time'),
+
+    # URL для накопительной диаграммы потока
+    path('cumulative-flow/<int:project_id>/', CumulativeFlowView.as_view(), name='cumulative_flow'),
+]
@@ -1,73 +1,153 @@
-from rest_framework import views, status, permissions
+from rest_framework import views, permissions
 from rest_framework.response import Response
-from django.shortcuts import get_object_or_404
 from projects.models import Project
-from .services import AnalyticsService
+from projects.membership import filter_by_membership
+from projects.permissions import IsProjectMember
+from projects.services import ProjectVersionService
+from newprojectflowapp.conditional import make_etag, get_not_modified_response, set_validators
+from .services import AnalyticsService, CachedAnalyticsService
+
+
+def get_analytics_etag(request, view_name, stamp):
+    """ETag ответа аналитики: представление, пользователь, параметры и версии проектов"""
+    return make_etag(view_name, request.user.id, request.get_full_path(), *stamp['parts'])
+
+
+class DashboardView(views.APIView):
+    """
+    Представление для сводки аналитики по всем проектам пользователя
+    (проекты с прогрессом, распределения по статусам и исполнителям)
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        projects = filter_by_membership(Project.objects.all(), request.user, request)
+        stamp = ProjectVersionService.get_projects_stamp(projects)
+        etag = get_analytics_etag(request, 'dashboard', stamp)
+        not_modified = get_not_modified_response(request, etag)
+        if not_modified is not None:
+            return not_modified
+
+        data = CachedAnalyticsService.get_dashboard(request.user)
+        return set_validators(Response(data), etag)
 
 
 class TasksByStatusView(views.APIView):
     """
     Представление для получения статистики задач по статусам
     """
-    permission_classes = [permissions.IsAuthenticated]
+    permission_classes = [IsProjectMember]
 
     def get(self, request):
         # Получаем ID проекта из запроса, если он есть
         project_id = request.query_params.get('project_id')
 
+        # Штамп версий проектов пользователя: при совпадении ETag отвечаем 304
+        projects = filter_by_membership(Project.objects.all(), request.user, request)
+        if project_id:
+            projects = projects.filter(id=project_id)
+        stamp = ProjectVersionService.get_projects_stamp(projects)
+        etag = get_analytics_etag(request, 'tasks_by_status', stamp)
+        not_modified = get_not_modified_response(request, etag)
+        if not_modified is not None:
+            return not_modified
+
         # Получаем статистику задач по статусам
-        data = AnalyticsService.get_tasks_by_status(request.user, project_id)
-        return Response(data)
+        data = CachedAnalyticsService.get_tasks_by_status(request.user, project_id)
+        return set_validators(Response(data), etag)
 
 
 class TasksByUserView(views.APIView):
     """
     Представление для получения статистики задач по пользователям
     """
-    permission_classes = [permissions.IsAuthenticated]
+    # Доступ к проекту из ?project_id= проверяет IsProjectMember
+    permission_classes = [IsProjectMember]
 
     def get(self, request):
         # Получаем ID проекта из запроса, если он есть
         project_id = request.query_params.get('project_id')
 
-        # Если указан ID проекта, проверяем права доступа
+        projects = filter_by_membership(Project.objects.all(), request.user, request)
         if project_id:
-            try:
-                project = Project.objects.get(id=project_id)
-                if not project.members.filter(id=request.user.id).exists():
-                    return Response(
-                        {'error': 'У вас нет доступа к этому проекту'},
-                        status=status.HTTP_403_FORBIDDEN
-                    )
-            except Project.DoesNotExist:
-                return Response(
-                    {'error': 'Проект не найден'},
-                    status=status.HTTP_404_NOT_FOUND
-                )
-
-            # Получаем статистику задач по пользователям для проекта
-            data = AnalyticsService.get_tasks_by_user(project_id=project_id)
-        else:
-            # Получаем статистику задач по пользователям для всех проектов
-            data = AnalyticsService.get_tasks_by_user(user=request.user)
-
-        return Response(data)
+            projects = projects.filter(id=project_id)
+
+        stamp = ProjectVersionService.get_projects_stamp(projects)
+        etag = get_analytics_etag(request, 'tasks_by_user', stamp)
+        not_modified = get_not_modified_response(request, etag)
+        if not_modified is not None:
+            return not_modified
+
+        # Получаем статистику задач по пользователям для проекта или всех проектов
+        data = CachedAnalyticsService.get_tasks_by_user(request.user, project_id)
+
+        return set_validators(Response(data), etag)
+
 
 class ProjectProgressView(views.APIView):
     """
     Представление для получения прогресса по проекту
     """
-    permission_classes = [permissions.IsAuthenticated]
+    # Доступ к проекту проверяет IsProjectMember
+    permission_classes = [IsProjectMember]
 
     def get(self, request, project_id):
-        # Проверяем права доступа к проекту
-        project = get_object_or_404(Project, id=project_id)
-        if not project.members.filter(id=request.user.id).exists():
-            return Response(
-                {'error': 'У вас нет доступа к этому проекту'},
-                status=status.HTTP_403_FORBIDDEN
-            )
+        stamp = ProjectVersionService.get_projects_stamp(Project.objects.filter(id=project_id))
+        etag = get_analytics_etag(request, 'project_progress', stamp)
+        not_modified = get_not_modified_response(request, etag)
+        if not_modified is not None:
+            return not_modified
 
         # Получаем данные о прогрессе проекта
-        data = AnalyticsService.get_project_progress(project_id)
-        return Response(data)
\ No newline at end of file
+        data = CachedAnalyticsService.get_project_progress(request.user, project_id, request)
+        return set_validators(Response(data), etag)
+
+
+class ProjectTimeSeriesView(views.APIView):
+    """
+    Базовое представление для графиков по дневным срезам проекта.
+    Период задается параметром ?days= (по умолчанию 30, не более 365).
+    Подклассы задают get_series - метод AnalyticsService (project_id, days)
+    """
+    # Доступ к проекту проверяет IsProjectMember
+    permission_classes = [IsProjectMember]
+    default_days = 30
+    max_days = 365
+
+    def get(self, request, project_id):
+        try:
+            days = int(request.query_params.get('days', self.default_days))
+        except ValueError:
+            days = self.default_days
+        days = max(1, min(days, self.max_days))
+
+        return Response(self.get_series(project_id, days))
+
+
+class BurndownView(ProjectTimeSeriesView):
+    """
+    Представление для диаграммы сгорания задач проекта
+    """
+    get_series = staticmethod(AnalyticsService.get_burndown)
+
+
+class CreatedVsCompletedView(ProjectTimeSeriesView):
+    """
+    Представление для графика созданных и завершенных задач по дням
+    """
+    get_series = staticmethod(AnalyticsService.get_created_vs_completed)
+
+
+class CycleTimeView(ProjectTimeSeriesView):
+    """
+    Представление для перцентилей времени цикла задач проекта
+    """
+    default_days = 90
+    get_series = staticmethod(AnalyticsService.get_cycle_time)
+
+
+class CumulativeFlowView(ProjectTimeSeriesView):
+    """
+    Представление для накопительной диаграммы потока (CFD)
+    """
+    get_series = staticmethod(AnalyticsService.get_cumulative_flow)
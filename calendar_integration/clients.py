@@ -0,0 +1,207 @@
+"""
+Клиенты Google Calendar API для пользователей.
+
+Описание API берется из документа, поставляемого с googleapiclient,
+и разбирается один раз на процесс. Готовые клиенты (учетные данные
+и сервис) хранятся в LRU-кэше на CALENDAR_CLIENT_CACHE_SIZE
+пользователей; кэш отдельный для каждого потока, так как httplib2 не
+потокобезопасен. Обновленный google-auth токен доступа сразу
+записывается в профиль пользователя, а команда refresh_calendar_tokens
+обновляет истекающие токены заранее, чтобы синхронизация не ждала
+обновления токена.
+"""
+import datetime
+import functools
+import json
+import logging
+import threading
+from collections import OrderedDict
+import google_auth_httplib2
+import httplib2
+from google.auth.exceptions import RefreshError, TransportError
+from google.oauth2.credentials import Credentials
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from accounts.models import UserProfile
+
+logger = logging.getLogger(__name__)
+
+# Области доступа (scopes), которые нам нужны
+SCOPES = ['https://www.googleapis.com/auth/calendar']
+
+
+class CalendarNotConnected(Exception):
+    """У пользователя нет токенов Google Calendar"""
+
+
+@functools.cache
+def get_discovery_document():
+    """Описание Calendar API v3 (разбирается один раз на процесс)"""
+    return json.loads(get_static_doc('calendar', 'v3'))
+
+
+def to_google_expiry(value):
+    # google-auth сравнивает expiry с наивным временем UTC
+    return timezone.make_naive(value, datetime.timezone.utc) if value else None
+
+
+def from_google_expiry(value):
+    return timezone.make_aware(value, datetime.timezone.utc) if value else None
+
+
+class ProfileCredentials(Credentials):
+    """
+    Учетные данные пользователя, которые после обновления токена
+    сохраняют его в профиль
+    """
+
+    def __init__(self, *args, profile_id, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.profile_id = profile_id
+
+    def refresh(self, request):
+        super().refresh(request)
+        fields = {
+            'google_calendar_token': self.token,
+            'google_calendar_token_expiry': from_google_expiry(self.expiry),
+            'updated_at': timezone.now(),
+        }
+        if self.refresh_token:
+            fields['google_calendar_refresh_token'] = self.refresh_token
+        UserProfile.objects.filter(pk=self.profile_id).update(**fields)
+
+
+def get_credentials(profile):
+    """Учетные данные OAuth2 из профиля пользователя"""
+    if not profile.google_calendar_token:
+        raise CalendarNotConnected('Google Calendar не подключен')
+    return ProfileCredentials(
+        token=profile.google_calendar_token,
+        refresh_token=profile.google_calendar_refresh_token,
+        token_uri=settings.GOOGLE_TOKEN_URI,
+        client_id=settings.GOOGLE_CLIENT_ID,
+        client_secret=settings.GOOGLE_CLIENT_SECRET,
+        scopes=SCOPES,
+        expiry=to_google_expiry(profile.google_calendar_token_expiry),
+        profile_id=profile.pk
+    )
+
+
+def build_client(credentials):
+    """
+    Сервис Calendar API без запроса discovery.
+    GOOGLE_CALENDAR_API_ENDPOINT переопределяет адрес API
+    """
+    client_options = None
+    if settings.GOOGLE_CALENDAR_API_ENDPOINT:
+        client_options = {'api_endpoint': settings.GOOGLE_CALENDAR_API_ENDPOINT}
+    return build_from_document(
+        get_discovery_document(),
+        credentials=credentials,
+        client_options=client_options
+    )
+
+
+class CalendarClientCache:
+    """
+    LRU-кэш клиентов Calendar API по ID пользователя (свой в каждом потоке)
+    """
+
+    def __init__(self):
+        self.local = threading.local()
+
+    def get_clients(self):
+        clients = getattr(self.local, 'clients', None)
+        if clients is None:
+            clients = self.local.clients = OrderedDict()
+        return clients
+
+    def get(self, profile):
+        """Клиент пользователя с учетными данными из профиля profile"""
+        clients = self.get_clients()
+        entry = clients.get(profile.user_id)
+        endpoint = settings.GOOGLE_CALENDAR_API_ENDPOINT
+
+        if (
+            entry is None
+            or entry['endpoint'] != endpoint
+            or entry['credentials'].refresh_token != profile.google_calendar_refresh_token
+        ):
+            # Новый пользователь или повторная авторизация
+            credentials = get_credentials(profile)
+            entry = {'credentials': credentials, 'service': build_client(credentials), 'endpoint': endpoint}
+            clients[profile.user_id] = entry
+            while len(clients) > settings.CALENDAR_CLIENT_CACHE_SIZE:
+                clients.popitem(last=False)
+        else:
+            clients.move_to_end(profile.user_id)
+            self.adopt_profile_token(entry['credentials'], profile)
+
+        return entry['service']
+
+    @staticmethod
+    def adopt_profile_token(credentials, profile):
+        """
+        Берет токен из профиля, если он новее токена клиента (обновлен
+        командой refresh_calendar_tokens или другим процессом)
+        """
+        if not profile.google_calendar_token:
+            raise CalendarNotConnected('Google Calendar не подключен')
+        if profile.google_calendar_token == credentials.token:
+            return
+        expiry = to_google_expiry(profile.google_calendar_token_expiry)
+        if expiry is None or credentials.expiry is None or expiry >= credentials.expiry:
+            credentials.token = profile.google_calendar_token
+            credentials.expiry = expiry
+
+    def clear(self):
+        self.get_clients().clear()
+
+
+client_cache = CalendarClientCache()
+
+
+def get_calendar_client(profile):
+    """Клиент Calendar API пользователя из кэша"""
+    return client_cache.get(profile)
+
+
+def refresh_expiring_tokens(margin_seconds=None):
+    """
+    Обновляет токены доступа, истекающие в ближайшие margin_seconds
+    секунд (или с неизвестным сроком). Новые токены сохраняются в
+    профили. Возвращает (обновлено, ошибок)
+    """
+    if margin_seconds is None:
+        margin_seconds = settings.CALENDAR_TOKEN_REFRESH_MARGIN
+    border = timezone.now() + datetime.timedelta(seconds=margin_seconds)
+
+    profiles = UserProfile.objects.exclude(
+        Q(google_calendar_refresh_token__isnull=True) | Q(google_calendar_refresh_token='')
+    ).filter(
+        Q(google_calendar_token_expiry__isnull=True) | Q(google_calendar_token_expiry__lte=border)
+    ).only(
+        'id', 'user_id', 'google_calendar_token', 'google_calendar_refresh_token', 'google_calendar_token_expiry'
+    ).order_by('id')
+
+    request = google_auth_httplib2.Request(httplib2.Http())
+    refreshed = failed = 0
+    for profile in profiles.iterator():
+        try:
+            ProfileCredentials(
+                token=profile.google_calendar_token,
+                refresh_token=profile.google_calendar_refresh_token,
+                token_uri=settings.GOOGLE_TOKEN_URI,
+                client_id=settings.GOOGLE_CLIENT_ID,
+                client_secret=settings.GOOGLE_CLIENT_SECRET,
+                scopes=SCOPES,
+                profile_id=profile.pk
+            ).refresh(request)
+            refreshed += 1
+        except (RefreshError, TransportError, httplib2.HttpLib2Error, OSError) as e:
+            logger.warning('Не удалось обновить токен Google Calendar пользователя %s: %s', profile.user_id, e)
+            failed += 1
+    return refreshed, failed
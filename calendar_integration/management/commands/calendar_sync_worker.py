@@ -0,0 +1,46 @@
+import time
+from django.core.management.base import BaseCommand
+from calendar_integration.services import CalendarSyncWorker
+
+
+class Command(BaseCommand):
+    """
+    Воркер очереди синхронизации с Google Calendar. Несколько воркеров
+    могут работать одновременно: задания разбираются через SKIP LOCKED
+    """
+    help = 'Выполняет задания синхронизации задач с Google Calendar'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10,
+            help='Сколько заданий забирать за раз'
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=2.0,
+            help='Пауза в секундах, когда очередь пуста'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Разобрать готовые задания и завершиться'
+        )
+
+    def handle(self, *args, **options):
+        worker = CalendarSyncWorker(batch_size=options['batch_size'])
+        processed = 0
+        try:
+            while True:
+                count = worker.run_once()
+                processed += count
+                if count:
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f'Выполнено заданий: {processed}'))
@@ -0,0 +1,50 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from accounts.models import UserProfile
+from calendar_integration.services import pull_calendar_changes
+
+
+class Command(BaseCommand):
+    """
+    Загрузка изменений из Google Calendar (перенесенные и удаленные
+    события) в сроки задач. Каждый запуск запрашивает только изменения
+    с прошлой загрузки (nextSyncToken пользователя)
+    """
+    help = 'Загружает изменения событий Google Calendar в задачи'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            help='Логин пользователя (по умолчанию все подключившие календарь)'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            help='Повторять загрузку каждые N секунд (без параметра - один проход)'
+        )
+
+    def handle(self, *args, **options):
+        profiles = UserProfile.objects.exclude(
+            google_calendar_token__isnull=True
+        ).exclude(
+            google_calendar_token=''
+        ).order_by('id')
+        if options['user']:
+            profiles = profiles.filter(user__username=options['user'])
+            if not profiles.exists():
+                raise CommandError(f"Пользователь {options['user']} не найден или не подключил календарь")
+
+        try:
+            while True:
+                report, failed = pull_calendar_changes(profiles.iterator())
+                self.stdout.write(self.style.SUCCESS(
+                    f"Событий: {report['events']}, обновлено задач: {report['updated']}, "
+                    f"конфликтов: {report['conflicts']}, отвязано: {report['unlinked']}"
+                ))
+                if failed:
+                    self.stderr.write(self.style.ERROR(f'Пользователей с ошибками: {failed}'))
+                if not options['interval']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
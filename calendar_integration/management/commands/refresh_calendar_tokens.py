@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from calendar_integration.clients import refresh_expiring_tokens
+
+
+class Command(BaseCommand):
+    """
+    Заблаговременное обновление токенов доступа Google Calendar.
+    Запускается периодически (cron) чаще, чем раз в --margin секунд,
+    чтобы синхронизация не тратила время на обновление токена
+    """
+    help = 'Обновляет токены Google Calendar, срок действия которых скоро истекает'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--margin',
+            type=int,
+            default=settings.CALENDAR_TOKEN_REFRESH_MARGIN,
+            help='Обновлять токены, истекающие в ближайшие N секунд'
+        )
+
+    def handle(self, *args, **options):
+        refreshed, failed = refresh_expiring_tokens(options['margin'])
+        self.stdout.write(self.style.SUCCESS(f'Обновлено токенов: {refreshed}'))
+        if failed:
+            self.stderr.write(self.style.ERROR(f'Не удалось обновить: {failed}'))
@@ -0,0 +1,60 @@
+# Generated by Django 5.0.4 on 2026-10-18 20:01
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("calendar_integration", "0001_calendar_sync_job"),
+        ("projects", "0003_projectchange"),
+        ("tasks", "0008_taskstatustransition"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="calendarsyncjob",
+            name="kind",
+            field=models.CharField(
+                choices=[
+                    ("task", "Задача"),
+                    ("project", "Задачи проекта"),
+                    ("assigned", "Назначенные задачи"),
+                ],
+                default="task",
+                max_length=20,
+                verbose_name="Тип задания",
+            ),
+        ),
+        migrations.AddField(
+            model_name="calendarsyncjob",
+            name="project",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="calendar_sync_jobs",
+                to="projects.project",
+                verbose_name="Проект",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="calendarsyncjob",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("kind", "project"), ("status", "pending")),
+                fields=("user", "project"),
+                name="calendar_job_pending_project",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="calendarsyncjob",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("kind", "assigned"), ("status", "pending")),
+                fields=("user",),
+                name="calendar_job_pending_assigned",
+            ),
+        ),
+    ]
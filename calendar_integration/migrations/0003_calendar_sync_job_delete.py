@@ -0,0 +1,47 @@
+# Generated by Django 5.0.4 on 2026-10-18 20:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("calendar_integration", "0002_calendar_sync_job_kind"),
+        ("projects", "0003_projectchange"),
+        ("tasks", "0010_task_google_calendar_user"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="calendarsyncjob",
+            name="event_id",
+            field=models.CharField(
+                blank=True, max_length=255, null=True, verbose_name="ID события"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="calendarsyncjob",
+            name="kind",
+            field=models.CharField(
+                choices=[
+                    ("task", "Задача"),
+                    ("project", "Задачи проекта"),
+                    ("assigned", "Назначенные задачи"),
+                    ("delete", "Удаление события"),
+                ],
+                default="task",
+                max_length=20,
+                verbose_name="Тип задания",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="calendarsyncjob",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("kind", "delete"), ("status", "pending")),
+                fields=("user", "event_id"),
+                name="calendar_job_pending_delete",
+            ),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.0.4 on 2026-10-18 20:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+        ("calendar_integration", "0003_calendar_sync_job_delete"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CalendarQuota",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="calendar_quota",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Пользователь",
+                    ),
+                ),
+                ("tokens", models.FloatField(verbose_name="Доступно токенов")),
+                ("updated_at", models.DateTimeField(verbose_name="Дата пересчета")),
+            ],
+            options={
+                "verbose_name": "Квота Google Calendar",
+                "verbose_name_plural": "Квоты Google Calendar",
+            },
+        ),
+    ]
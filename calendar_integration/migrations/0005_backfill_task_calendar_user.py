@@ -0,0 +1,44 @@
+from django.db import migrations
+
+
+def backfill_event_owners(apps, schema_editor):
+    """
+    Владелец событий, выгруженных до появления Task.google_calendar_user:
+    пользователь последнего выполненного задания, создавшего событие
+    """
+    Task = apps.get_model('tasks', 'Task')
+    CalendarSyncJob = apps.get_model('calendar_integration', 'CalendarSyncJob')
+
+    owners = {}
+    jobs = CalendarSyncJob.objects.filter(status='done', result__isnull=False).order_by('updated_at')
+    for user_id, result in jobs.values_list('user_id', 'result').iterator():
+        if not isinstance(result, dict):
+            continue
+        if result.get('event_id'):
+            owners[result['event_id']] = user_id
+        for task_result in result.get('tasks') or ():
+            if task_result.get('event_id'):
+                owners[task_result['event_id']] = user_id
+
+    tasks = Task.objects.filter(
+        google_calendar_event_id__isnull=False, google_calendar_user__isnull=True
+    ).only('id', 'google_calendar_event_id')
+    changed = []
+    for task in tasks.iterator():
+        user_id = owners.get(task.google_calendar_event_id)
+        if user_id is not None:
+            task.google_calendar_user_id = user_id
+            changed.append(task)
+    Task.objects.bulk_update(changed, ['google_calendar_user'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("calendar_integration", "0004_calendar_quota"),
+        ("tasks", "0010_task_google_calendar_user"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_event_owners, migrations.RunPython.noop),
+    ]
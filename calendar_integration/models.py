@@ -1,3 +1,452 @@
-from django.db import models
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+from functools import partial
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import IntegrityError, models, transaction
+from django.db.models import Exists, F, OuterRef, Q
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+from django.urls import reverse
+from django.utils import timezone
+from accounts.models import UserProfile
+from tasks.models import Task
 
-# Create your models here.
+
+class CalendarSyncJob(models.Model):
+    """
+    Задание очереди синхронизации задачи с Google Calendar.
+    Очередь хранится в базе: воркер (manage.py calendar_sync_worker)
+    забирает задания через SELECT ... FOR UPDATE SKIP LOCKED, неудачные
+    попытки повторяются с экспоненциальной задержкой
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    # Повтор не понадобился: для задачи уже стоит в очереди более новое задание
+    STATUS_SUPERSEDED = 'superseded'
+
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'В очереди'),
+        (STATUS_RUNNING, 'Выполняется'),
+        (STATUS_DONE, 'Выполнено'),
+        (STATUS_FAILED, 'Ошибка'),
+        (STATUS_SUPERSEDED, 'Заменено новым'),
+    ]
+
+    # Что синхронизируется: одна задача, все задачи проекта,
+    # все задачи, назначенные пользователю, или удаление события
+    # удаленной задачи
+    KIND_TASK = 'task'
+    KIND_PROJECT = 'project'
+    KIND_ASSIGNED = 'assigned'
+    KIND_DELETE = 'delete'
+
+    KIND_CHOICES = [
+        (KIND_TASK, 'Задача'),
+        (KIND_PROJECT, 'Задачи проекта'),
+        (KIND_ASSIGNED, 'Назначенные задачи'),
+        (KIND_DELETE, 'Удаление события'),
+    ]
+
+    # Пользователь, в чей календарь выгружается задача
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='calendar_sync_jobs',
+        verbose_name="Пользователь"
+    )
+    task = models.ForeignKey(
+        Task,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='calendar_sync_jobs',
+        verbose_name="Задача"
+    )
+    kind = models.CharField(
+        max_length=20,
+        choices=KIND_CHOICES,
+        default=KIND_TASK,
+        verbose_name="Тип задания"
+    )
+    project = models.ForeignKey(
+        'projects.Project',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='calendar_sync_jobs',
+        verbose_name="Проект"
+    )
+    # Событие, которое нужно удалить (задача к этому моменту уже удалена)
+    event_id = models.CharField(max_length=255, null=True, blank=True, verbose_name="ID события")
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default=STATUS_PENDING,
+        verbose_name="Статус"
+    )
+    attempts = models.PositiveIntegerField(default=0, verbose_name="Попыток")
+    # Не раньше какого момента задание можно забрать
+    run_at = models.DateTimeField(default=timezone.now, verbose_name="Запуск не раньше")
+    # Когда воркер забрал задание (для возврата заданий упавших воркеров)
+    locked_at = models.DateTimeField(null=True, blank=True, verbose_name="Взято в работу")
+    last_error = models.TextField(blank=True, default='', verbose_name="Последняя ошибка")
+    result = models.JSONField(null=True, blank=True, verbose_name="Результат")
+
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
+
+    class Meta:
+        verbose_name = "Задание синхронизации с календарем"
+        verbose_name_plural = "Задания синхронизации с календарем"
+        ordering = ['-created_at']
+        constraints = [
+            # Повторные правки задачи схлопываются в одно ожидающее задание
+            models.UniqueConstraint(
+                fields=['user', 'task'],
+                condition=Q(status='pending'),
+                name='calendar_job_pending_task'
+            ),
+            models.UniqueConstraint(
+                fields=['user', 'project'],
+                condition=Q(status='pending', kind='project'),
+                name='calendar_job_pending_project'
+            ),
+            models.UniqueConstraint(
+                fields=['user'],
+                condition=Q(status='pending', kind='assigned'),
+                name='calendar_job_pending_assigned'
+            ),
+            models.UniqueConstraint(
+                fields=['user', 'event_id'],
+                condition=Q(status='pending', kind='delete'),
+                name='calendar_job_pending_delete'
+            ),
+        ]
+        indexes = [
+            # Выборка готовых к запуску заданий воркером
+            models.Index(
+                fields=['run_at'],
+                condition=Q(status='pending'),
+                name='calendar_job_pending_run_at'
+            ),
+            models.Index(
+                fields=['locked_at'],
+                condition=Q(status='running'),
+                name='calendar_job_running_locked'
+            ),
+        ]
+
+    def __str__(self):
+        if self.kind == self.KIND_PROJECT:
+            return f"Синхронизация проекта {self.project_id} ({self.get_status_display()})"
+        if self.kind == self.KIND_ASSIGNED:
+            return f"Синхронизация задач пользователя {self.user_id} ({self.get_status_display()})"
+        if self.kind == self.KIND_DELETE:
+            return f"Удаление события {self.event_id} ({self.get_status_display()})"
+        return f"Синхронизация задачи {self.task_id} ({self.get_status_display()})"
+
+    @classmethod
+    def enqueue(cls, task, user):
+        """
+        Ставит задачу в очередь синхронизации. Если для задачи уже есть
+        ожидающее задание, возвращается оно (новое не создается);
+        отложенное автосинхронизацией задание переносится на сейчас
+        """
+        job, created = cls.objects.get_or_create(
+            task=task, user=user, kind=cls.KIND_TASK, status=cls.STATUS_PENDING
+        )
+        if not created and job.run_at > timezone.now():
+            job.run_at = timezone.now()
+            cls.objects.filter(pk=job.pk, status=cls.STATUS_PENDING).update(run_at=job.run_at)
+        return job
+
+    @classmethod
+    def schedule_auto_sync(cls, pairs):
+        """
+        Отметки автосинхронизации задач [(task_id, user_id)]: задание
+        выполняется через CALENDAR_AUTO_SYNC_WINDOW секунд после первой
+        правки. Правки внутри окна не создают новых заданий (ON CONFLICT
+        DO NOTHING по ограничению calendar_job_pending_task), а воркер
+        выгружает состояние задачи на момент выполнения - один запрос
+        к Google на задачу за окно
+        """
+        run_at = timezone.now() + timedelta(seconds=settings.CALENDAR_AUTO_SYNC_WINDOW)
+        cls.objects.bulk_create([
+            cls(task_id=task_id, user_id=user_id, kind=cls.KIND_TASK, run_at=run_at)
+            for task_id, user_id in pairs
+        ], ignore_conflicts=True)
+
+    @classmethod
+    def enqueue_event_deletes(cls, pairs):
+        """Ставит в очередь удаление событий удаленных задач [(user_id, event_id)]"""
+        cls.objects.bulk_create([
+            cls(user_id=user_id, kind=cls.KIND_DELETE, event_id=event_id)
+            for user_id, event_id in pairs
+        ], ignore_conflicts=True)
+
+    @classmethod
+    def get_event_owner(cls, event_id):
+        """
+        Пользователь, в чей календарь событие выгружено выполненным
+        заданием (для событий, у задач которых не записан владелец)
+        """
+        return cls.objects.filter(
+            Q(result__event_id=event_id) | Q(result__tasks__contains=[{'event_id': event_id}]),
+            status=cls.STATUS_DONE
+        ).order_by('-updated_at').values_list('user_id', flat=True).first()
+
+    @classmethod
+    def enqueue_project(cls, project, user):
+        """Ставит в очередь синхронизацию всех задач проекта"""
+        job, _ = cls.objects.get_or_create(
+            project=project, user=user, kind=cls.KIND_PROJECT, status=cls.STATUS_PENDING
+        )
+        return job
+
+    @classmethod
+    def enqueue_assigned(cls, user):
+        """Ставит в очередь синхронизацию всех задач, назначенных пользователю"""
+        job, _ = cls.objects.get_or_create(
+            user=user, kind=cls.KIND_ASSIGNED, status=cls.STATUS_PENDING
+        )
+        return job
+
+    @classmethod
+    def claim(cls, limit=10):
+        """
+        Забирает до limit готовых заданий и помечает их выполняемыми.
+        SKIP LOCKED позволяет нескольким воркерам разбирать очередь
+        без ожидания друг друга. Задания воркеров, не отчитавшихся за
+        CALENDAR_SYNC_LOCK_TIMEOUT секунд, забираются повторно. Задание
+        задачи не выдается, пока выполняется другое задание той же задачи
+        """
+        now = timezone.now()
+        stale_before = now - timedelta(seconds=settings.CALENDAR_SYNC_LOCK_TIMEOUT)
+
+        with transaction.atomic():
+            running = cls.objects.filter(
+                task_id=OuterRef('task_id'),
+                status=cls.STATUS_RUNNING,
+                locked_at__gte=stale_before
+            )
+            job_ids = list(
+                cls.objects.select_for_update(skip_locked=True).filter(
+                    Q(status=cls.STATUS_PENDING, run_at__lte=now)
+                    | Q(status=cls.STATUS_RUNNING, locked_at__lt=stale_before)
+                ).exclude(
+                    Exists(running)
+                ).order_by('run_at').values_list('id', flat=True)[:limit]
+            )
+            if not job_ids:
+                return []
+
+            cls.objects.filter(id__in=job_ids).update(
+                status=cls.STATUS_RUNNING,
+                locked_at=now,
+                attempts=F('attempts') + 1,
+                updated_at=now
+            )
+
+        return list(
+            cls.objects.filter(id__in=job_ids).select_related('task', 'project', 'user__profile').order_by('run_at')
+        )
+
+    def get_absolute_url(self):
+        """Адрес для опроса состояния задания"""
+        return reverse('calendar_sync_job', args=[self.id])
+
+    def get_retry_delay(self):
+        """Экспоненциальная задержка перед повтором (со случайным разбросом)"""
+        delay = min(
+            settings.CALENDAR_SYNC_BACKOFF_SECONDS * 2 ** max(self.attempts - 1, 0),
+            settings.CALENDAR_SYNC_BACKOFF_MAX_SECONDS
+        )
+        return timedelta(seconds=delay * random.uniform(0.5, 1))
+
+    def mark_done(self, result):
+        self.status = self.STATUS_DONE
+        self.result = result
+        self.last_error = ''
+        self.locked_at = None
+        self.save(update_fields=['status', 'result', 'last_error', 'locked_at', 'updated_at'])
+
+    def mark_failed(self, error, retry=True, result=None):
+        """
+        Записывает ошибку попытки (и отчет result, если он есть).
+        Временная ошибка (retry) возвращает задание в очередь
+        с задержкой, пока не исчерпаны попытки
+        """
+        self.last_error = str(error)
+        self.locked_at = None
+        update_fields = ['status', 'last_error', 'locked_at', 'run_at', 'updated_at']
+        if result is not None:
+            self.result = result
+            update_fields.append('result')
+
+        if not retry or self.attempts >= settings.CALENDAR_SYNC_MAX_ATTEMPTS:
+            self.status = self.STATUS_FAILED
+            self.save(update_fields=update_fields)
+            return
+
+        self.status = self.STATUS_PENDING
+        self.run_at = timezone.now() + self.get_retry_delay()
+        try:
+            with transaction.atomic():
+                self.save(update_fields=update_fields)
+        except IntegrityError:
+            # Пока задание выполнялось, задачу снова поставили в очередь:
+            # повтор выполнит новое задание
+            self.status = self.STATUS_SUPERSEDED
+            self.save(update_fields=update_fields)
+
+
+class CalendarQuota(models.Model):
+    """
+    Ведро токенов квоты Calendar API пользователя (calendar_integration/quota.py).
+    Строка блокируется на время пересчета (SELECT ... FOR UPDATE), поэтому
+    квота общая для всех воркеров и процессов
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='calendar_quota',
+        verbose_name="Пользователь"
+    )
+    tokens = models.FloatField(verbose_name="Доступно токенов")
+    updated_at = models.DateTimeField(verbose_name="Дата пересчета")
+
+    class Meta:
+        verbose_name = "Квота Google Calendar"
+        verbose_name_plural = "Квоты Google Calendar"
+
+    def __str__(self):
+        return f"Квота пользователя {self.user_id}: {self.tokens:.1f}"
+
+
+# Сигналы автосинхронизации задач с календарем (UserProfile.google_calendar_auto_sync).
+# Выгружается в календарь владельца события, а если события еще нет - исполнителя
+CALENDAR_TASK_FIELDS = ('title', 'description', 'due_date', 'assignee_id')
+_DEFERRED = object()
+
+
+def get_calendar_state(task):
+    # Отложенные поля не загружаем: они считаются неизменными
+    return tuple(task.__dict__.get(field, _DEFERRED) for field in CALENDAR_TASK_FIELDS)
+
+
+_auto_sync_batch = ContextVar('calendar_auto_sync_batch', default=None)
+
+
+class AutoSyncBatch:
+    """
+    Обработка отметок автосинхронизации после фиксации транзакции.
+    Каждый on_commit передает свои отметки (отметки откаченной точки
+    сохранения пропадают вместе с ее on_commit), а флаги пользователей
+    запоминаются: внутри collect_auto_sync() флаг каждого пользователя
+    читается один раз
+    """
+
+    def __init__(self):
+        self.enabled = {}
+
+    def get_enabled(self, user_ids):
+        missing = set(user_ids) - self.enabled.keys()
+        if missing:
+            enabled = set(UserProfile.objects.filter(
+                user_id__in=missing,
+                google_calendar_auto_sync=True,
+                google_calendar_token__isnull=False
+            ).values_list('user_id', flat=True))
+            self.enabled.update((user_id, user_id in enabled) for user_id in missing)
+        return {user_id for user_id in user_ids if self.enabled[user_id]}
+
+    def add_and_flush(self, syncs=(), deletes=()):
+        """
+        Ставит в очередь синхронизацию задач [(task_id, user_id)]
+        и удаление событий [(user_id, event_id)]
+        """
+        resolved = []
+        for user_id, event_id in deletes:
+            # Событие выгружено до появления Task.google_calendar_user
+            user_id = user_id or CalendarSyncJob.get_event_owner(event_id)
+            if user_id is not None:
+                resolved.append((user_id, event_id))
+
+        enabled = self.get_enabled({user_id for _, user_id in syncs} | {user_id for user_id, _ in resolved})
+        syncs = [(task_id, user_id) for task_id, user_id in syncs if user_id in enabled]
+        if syncs:
+            # Задача могла быть удалена позже в той же транзакции
+            existing = set(Task.objects.filter(
+                id__in={task_id for task_id, _ in syncs}
+            ).values_list('id', flat=True))
+            CalendarSyncJob.schedule_auto_sync([pair for pair in syncs if pair[0] in existing])
+        deletes = [pair for pair in resolved if pair[0] in enabled]
+        if deletes:
+            CalendarSyncJob.enqueue_event_deletes(deletes)
+
+
+@contextmanager
+def collect_auto_sync():
+    """
+    Общие флаги автосинхронизации для отметок внутри блока (массовые
+    операции): профиль пользователя читается один раз на блок
+    """
+    if _auto_sync_batch.get() is not None:
+        yield
+        return
+
+    token = _auto_sync_batch.set(AutoSyncBatch())
+    try:
+        yield
+    finally:
+        _auto_sync_batch.reset(token)
+
+
+def schedule_auto_sync_on_commit(pairs=(), deletes=()):
+    """
+    После фиксации транзакции ставит в очередь автосинхронизацию задач
+    [(task_id, user_id)] и удаление событий [(user_id, event_id)].
+    Сигналы задач вызывают ее сами; записи в обход save() (UPDATE,
+    bulk_create) - явно
+    """
+    pairs = sorted({(task_id, user_id) for task_id, user_id in pairs if user_id is not None})
+    deletes = sorted(set(deletes), key=lambda pair: (pair[0] or 0, pair[1]))
+    if not pairs and not deletes:
+        return
+    batch = _auto_sync_batch.get() or AutoSyncBatch()
+    transaction.on_commit(partial(batch.add_and_flush, pairs, deletes))
+
+
+@receiver(post_init, sender=Task)
+def remember_calendar_state(sender, instance, **kwargs):
+    instance._original_calendar_state = get_calendar_state(instance)
+
+
+@receiver(post_save, sender=Task)
+def schedule_calendar_sync_on_save(sender, instance, created, **kwargs):
+    state = get_calendar_state(instance)
+    changed = created or any(
+        old is not _DEFERRED and new is not _DEFERRED and old != new
+        for old, new in zip(instance._original_calendar_state, state)
+    )
+    instance._original_calendar_state = state
+    if not changed:
+        return
+
+    user_id = instance.__dict__.get('google_calendar_user_id') or instance.__dict__.get('assignee_id')
+    schedule_auto_sync_on_commit([(instance.id, user_id)])
+
+
+@receiver(post_delete, sender=Task)
+def delete_calendar_event_on_delete(sender, instance, **kwargs):
+    event_id = instance.__dict__.get('google_calendar_event_id')
+    if not event_id:
+        return
+    # Владелец события без google_calendar_user определяется по журналу заданий
+    schedule_auto_sync_on_commit(deletes=[(instance.__dict__.get('google_calendar_user_id'), event_id)])
@@ -0,0 +1,55 @@
+"""
+Квота запросов к Google Calendar API на пользователя (token bucket).
+
+Google ограничивает частоту запросов от имени одного пользователя;
+каждая операция пакетного запроса считается отдельным запросом.
+Ведро пополняется со скоростью CALENDAR_QUOTA_RATE операций в секунду
+до CALENDAR_QUOTA_BURST. Токены резервируются заранее: если их не
+хватает, баланс уходит в минус, а вызывающий получает время ожидания,
+поэтому параллельные воркеры выстраиваются в очередь, а не соревнуются.
+Состояние хранится в строке CalendarQuota, которая блокируется на время
+пересчета, поэтому лимит общий для всех процессов.
+"""
+import time
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .models import CalendarQuota
+
+
+class TokenBucket:
+    """Ведро токенов пользователя user_id"""
+
+    def __init__(self, user_id, rate=None, capacity=None):
+        self.user_id = user_id
+        self.rate = rate or settings.CALENDAR_QUOTA_RATE
+        self.capacity = capacity or settings.CALENDAR_QUOTA_BURST
+
+    def reserve(self, count=1):
+        """
+        Резервирует count токенов. Возвращает, сколько секунд нужно
+        подождать, прежде чем выполнять запросы
+        """
+        now = timezone.now()
+        # Короткая транзакция: блокировка не держится во время ожидания
+        with transaction.atomic():
+            quota, created = CalendarQuota.objects.select_for_update().get_or_create(
+                user_id=self.user_id,
+                defaults={'tokens': self.capacity, 'updated_at': now}
+            )
+            tokens = quota.tokens
+            if not created:
+                elapsed = max(0.0, (now - quota.updated_at).total_seconds())
+                tokens = min(self.capacity, tokens + elapsed * self.rate)
+
+            quota.tokens = tokens - count
+            quota.updated_at = now
+            quota.save(update_fields=['tokens', 'updated_at'])
+        return max(0.0, -quota.tokens / self.rate)
+
+    def acquire(self, count=1, sleep=time.sleep):
+        """Резервирует count токенов и ждет, пока они станут доступны"""
+        wait = self.reserve(count)
+        if wait:
+            sleep(wait)
+        return wait
@@ -0,0 +1,14 @@
+from rest_framework import serializers
+from .models import CalendarSyncJob
+
+
+class CalendarSyncJobSerializer(serializers.ModelSerializer):
+    """Сериализатор задания синхронизации (для опроса его состояния)"""
+
+    class Meta:
+        model = CalendarSyncJob
+        fields = [
+            'id', 'task', 'status', 'attempts', 'run_at', 'last_error',
+            'result', 'created_at', 'updated_at'
+        ]
+        read_only_fields = fields
@@ -1,9 +1,58 @@
 import os
 import datetime
-from google.oauth2.credentials import Credentials
+import logging
+import urllib.parse
+import httplib2
+from google.auth.exceptions import RefreshError, TransportError
 from google_auth_oauthlib.flow import Flow
-from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+from googleapiclient.http import BatchHttpRequest
 from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from accounts.models import UserProfile
+from analytics.cache import bump_project_versions
+from projects.membership import get_member_project_ids, is_project_member
+from projects.models import ProjectChange
+from realtime import events as realtime_events
+from tasks.models import Task
+from .clients import SCOPES, CalendarNotConnected, from_google_expiry, get_calendar_client
+from .models import CalendarSyncJob
+from .quota import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Ответы Google Calendar API, после которых запрос имеет смысл повторить
+RETRYABLE_STATUSES = {408, 429, 500, 502, 503, 504}
+RATE_LIMIT_REASONS = (b'rateLimitExceeded', b'userRateLimitExceeded')
+
+# Пакетный endpoint Calendar API (адрес не зависит от api_endpoint клиента)
+BATCH_PATH = 'batch/calendar/v3'
+DEFAULT_BATCH_URI = f'https://www.googleapis.com/{BATCH_PATH}'
+
+# Поля задачи, нужные для события календаря
+EVENT_TASK_FIELDS = ['id', 'title', 'description', 'due_date', 'google_calendar_event_id', 'google_calendar_user']
+
+PUSHED_START_PROPERTY = 'projectflowStart'
+
+# Загрузка изменений календаря: событий на страницу и нужные поля ответа
+PULL_PAGE_SIZE = 250
+PULL_FIELDS = 'items(id,status,start,updated,extendedProperties),nextPageToken,nextSyncToken'
+
+
+def is_retryable_error(error):
+    """Временная ли ошибка (сеть, перегрузка, превышение квоты)"""
+    if isinstance(error, HttpError):
+        status = error.resp.status
+        if status == 403:
+            return any(reason in error.content for reason in RATE_LIMIT_REASONS)
+        return status in RETRYABLE_STATUSES
+    if isinstance(error, RefreshError):
+        # Отозванный или просроченный refresh_token - нужна повторная авторизация
+        return False
+    return isinstance(error, (TransportError, httplib2.HttpLib2Error, OSError))
 
 
 class GoogleCalendarService:
@@ -11,7 +60,20 @@ class GoogleCalendarService:
     Сервис для работы с Google Calendar API
     """
     # Области доступа (scopes), которые нам нужны
-    SCOPES = ['https://www.googleapis.com/auth/calendar']
+    SCOPES = SCOPES
+
+    @staticmethod
+    def get_client_config():
+        """Конфигурация OAuth2-клиента приложения"""
+        return {
+            "web": {
+                "client_id": settings.GOOGLE_CLIENT_ID,
+                "client_secret": settings.GOOGLE_CLIENT_SECRET,
+                "auth_uri": "https://accounts.google.com/o/oauth2/auth",
+                "token_uri": settings.GOOGLE_TOKEN_URI,
+                "redirect_uris": [settings.GOOGLE_REDIRECT_URI]
+            }
+        }
 
     @staticmethod
     def get_authorization_url(request):
@@ -20,15 +82,7 @@ class GoogleCalendarService:
         """
         # Создаем объект Flow для OAuth2
         flow = Flow.from_client_config(
-            {
-                "web": {
-                    "client_id": settings.GOOGLE_CLIENT_ID,
-                    "client_secret": settings.GOOGLE_CLIENT_SECRET,
-                    "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-                    "token_uri": "https://oauth2.googleapis.com/token",
-                    "redirect_uris": [settings.GOOGLE_REDIRECT_URI]
-                }
-            },
+            GoogleCalendarService.get_client_config(),
             scopes=GoogleCalendarService.SCOPES
         )
 
@@ -50,15 +104,7 @@ class GoogleCalendarService:
         Обменивает код авторизации на токены доступа
         """
         flow = Flow.from_client_config(
-            {
-                "web": {
-                    "client_id": settings.GOOGLE_CLIENT_ID,
-                    "client_secret": settings.GOOGLE_CLIENT_SECRET,
-                    "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-                    "token_uri": "https://oauth2.googleapis.com/token",
-                    "redirect_uris": [settings.GOOGLE_REDIRECT_URI]
-                }
-            },
+            GoogleCalendarService.get_client_config(),
             scopes=GoogleCalendarService.SCOPES
         )
 
@@ -76,5 +122,426 @@ class GoogleCalendarService:
             'token_uri': credentials.token_uri,
             'client_id': credentials.client_id,
             'client_secret': credentials.client_secret,
-            'expiry': credentials.expiry.isoformat() if credentials.expiry else None
-        }
\ No newline at end of file
+            # expiry от google-auth - наивное время UTC; отдаем с часовым поясом
+            'expiry': from_google_expiry(credentials.expiry).isoformat() if credentials.expiry else None
+        }
+
+    @staticmethod
+    def build_event_body(task):
+        """Событие календаря для задачи: час, начиная со срока выполнения"""
+        start_time = task.due_date or timezone.now() + datetime.timedelta(days=1)
+        end_time = start_time + datetime.timedelta(hours=1)
+        return {
+            'summary': f"[ProjectFlow] {task.title}",
+            'description': task.description or "Без описания",
+            'start': {
+                'dateTime': start_time.isoformat(),
+                'timeZone': settings.TIME_ZONE,
+            },
+            'end': {
+                'dateTime': end_time.isoformat(),
+                'timeZone': settings.TIME_ZONE,
+            },
+            'reminders': {
+                'useDefault': True
+            },
+            # Выгруженное начало: при загрузке изменений отличает перенос
+            # события в календаре от начала, выбранного при выгрузке
+            'extendedProperties': {
+                'private': {
+                    PUSHED_START_PROPERTY: start_time.isoformat(),
+                },
+            },
+        }
+
+    @staticmethod
+    def has_own_event(task, user_id):
+        """Есть ли у задачи событие в календаре пользователя user_id"""
+        return bool(task.google_calendar_event_id) and task.google_calendar_user_id in (None, user_id)
+
+    @staticmethod
+    def push_task(service, task, user_id=None):
+        """
+        Создает или обновляет событие задачи в календаре пользователя
+        user_id. Если событие было удалено в календаре или находится в
+        календаре другого пользователя, создается новое. Возвращает событие
+        """
+        body = GoogleCalendarService.build_event_body(task)
+        events = service.events()
+        if task.google_calendar_event_id and (user_id is None or GoogleCalendarService.has_own_event(task, user_id)):
+            try:
+                return events.update(
+                    calendarId='primary',
+                    eventId=task.google_calendar_event_id,
+                    body=body
+                ).execute()
+            except HttpError as e:
+                if e.resp.status not in (404, 410):
+                    raise
+        return events.insert(calendarId='primary', body=body).execute()
+
+    @staticmethod
+    def get_batch_uri():
+        """Адрес пакетных запросов (с учетом GOOGLE_CALENDAR_API_ENDPOINT)"""
+        if settings.GOOGLE_CALENDAR_API_ENDPOINT:
+            return urllib.parse.urljoin(settings.GOOGLE_CALENDAR_API_ENDPOINT, f'/{BATCH_PATH}')
+        return DEFAULT_BATCH_URI
+
+
+class CalendarBatchSync:
+    """
+    Пакетная выгрузка набора задач в календарь пользователя: до
+    CALENDAR_BATCH_SIZE операций в одном HTTP-запросе, частота
+    ограничивается квотой пользователя (TokenBucket). ID событий и их
+    владелец записываются одним bulk_update в конце
+    """
+
+    def __init__(self, service, bucket, user_id, batch_size=None):
+        self.service = service
+        self.bucket = bucket
+        self.user_id = user_id
+        self.batch_size = batch_size or settings.CALENDAR_BATCH_SIZE
+        self.results = {}
+
+    def sync(self, tasks):
+        """Выгружает задачи и возвращает отчет по каждой"""
+        tasks = list(tasks)
+        # (задача, обновлять ли существующее событие)
+        operations = [(task, GoogleCalendarService.has_own_event(task, self.user_id)) for task in tasks]
+        while operations:
+            # События, удаленные в календаре, создаются заново следующим проходом
+            recreate = []
+            for start in range(0, len(operations), self.batch_size):
+                recreate.extend(self.execute(operations[start:start + self.batch_size]))
+            operations = [(task, False) for task in recreate]
+
+        self.save_event_ids(tasks)
+        return self.get_report(tasks)
+
+    def execute(self, operations):
+        """Один пакетный запрос. Возвращает задачи, чьи события нужно создать заново"""
+        recreate = []
+        by_request_id = {}
+
+        def callback(request_id, response, exception):
+            task, is_update = by_request_id[request_id]
+            if exception is None:
+                self.results[task.id] = {
+                    'task': task.id,
+                    'status': 'updated' if is_update else 'created',
+                    'event_id': response['id'],
+                }
+            elif is_update and isinstance(exception, HttpError) and exception.resp.status in (404, 410):
+                recreate.append(task)
+            else:
+                self.add_failure(task, exception)
+
+        batch = BatchHttpRequest(callback=callback, batch_uri=GoogleCalendarService.get_batch_uri())
+        events = self.service.events()
+        for task, is_update in operations:
+            body = GoogleCalendarService.build_event_body(task)
+            if is_update:
+                request = events.update(calendarId='primary', eventId=task.google_calendar_event_id, body=body)
+            else:
+                request = events.insert(calendarId='primary', body=body)
+            by_request_id[str(task.id)] = (task, is_update)
+            batch.add(request, request_id=str(task.id))
+
+        self.bucket.acquire(len(operations))
+        try:
+            batch.execute()
+        except Exception as e:
+            # Ошибка всего пакета (сеть, перегрузка): операции без ответа неудачны
+            logger.warning('Ошибка пакетного запроса к Google Calendar: %s', e)
+            for task, _ in operations:
+                if task.id not in self.results:
+                    self.add_failure(task, e)
+            return []
+        return recreate
+
+    def add_failure(self, task, error):
+        self.results[task.id] = {
+            'task': task.id,
+            'status': 'failed',
+            'error': str(error),
+            'retryable': is_retryable_error(error),
+        }
+
+    def save_event_ids(self, tasks):
+        changed = []
+        for task in tasks:
+            result = self.results.get(task.id)
+            if result and result['status'] != 'failed' and (
+                result['event_id'] != task.google_calendar_event_id or task.google_calendar_user_id != self.user_id
+            ):
+                task.google_calendar_event_id = result['event_id']
+                task.google_calendar_user_id = self.user_id
+                changed.append(task)
+        if changed:
+            # bulk_update не меняет updated_at и не вызывает сигналы задач
+            Task.objects.bulk_update(
+                changed, ['google_calendar_event_id', 'google_calendar_user'], batch_size=1000
+            )
+
+    def get_report(self, tasks):
+        results = [self.results[task.id] for task in tasks]
+        counts = {status: 0 for status in ('created', 'updated', 'failed')}
+        for result in results:
+            counts[result['status']] += 1
+        return {'total': len(results), **counts, 'tasks': results}
+
+
+def parse_event_start(event):
+    """Начало события как aware datetime (для событий на весь день - полночь)"""
+    start = event.get('start') or {}
+    if start.get('dateTime'):
+        return parse_datetime(start['dateTime'])
+    if start.get('date'):
+        date = parse_date(start['date'])
+        return timezone.make_aware(datetime.datetime.combine(date, datetime.time.min)) if date else None
+    return None
+
+
+class CalendarPullSync:
+    """
+    Инкрементальная загрузка изменений из календаря пользователя.
+    Список событий запрашивается с nextSyncToken прошлой загрузки
+    (первый раз - полностью), поэтому приходят только измененные
+    события. Задачи находятся по google_calendar_event_id (индекс
+    task_calendar_event), новые сроки записываются одним bulk_update на
+    страницу. Конфликт решается по времени изменения: перенос события
+    применяется, только если он новее последней правки задачи
+    """
+
+    def __init__(self, profile, service=None, bucket=None):
+        self.profile = profile
+        self.service = service or get_calendar_client(profile)
+        self.bucket = bucket or TokenBucket(profile.user_id)
+        self.report = {'events': 0, 'updated': 0, 'conflicts': 0, 'unlinked': 0}
+
+    def pull(self):
+        """Загружает изменения и сохраняет новый nextSyncToken. Возвращает отчет"""
+        sync_token = self.profile.google_calendar_sync_token
+        try:
+            next_sync_token = self.pull_pages(sync_token)
+        except HttpError as e:
+            if not sync_token or e.resp.status != 410:
+                raise
+            # Токен устарел: Google требует полной повторной загрузки
+            next_sync_token = self.pull_pages(None)
+
+        UserProfile.objects.filter(pk=self.profile.pk).update(google_calendar_sync_token=next_sync_token)
+        self.profile.google_calendar_sync_token = next_sync_token
+        return self.report
+
+    def pull_pages(self, sync_token):
+        page_token = None
+        while True:
+            params = {
+                'calendarId': 'primary',
+                'showDeleted': True,
+                'maxResults': PULL_PAGE_SIZE,
+                'fields': PULL_FIELDS,
+            }
+            if sync_token:
+                params['syncToken'] = sync_token
+            if page_token:
+                params['pageToken'] = page_token
+
+            self.bucket.acquire()
+            response = self.service.events().list(**params).execute()
+            self.apply(response.get('items', []))
+
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                return response.get('nextSyncToken')
+
+    def apply(self, items):
+        """Применяет страницу измененных событий к задачам"""
+        self.report['events'] += len(items)
+        by_event_id = {item['id']: item for item in items if item.get('id')}
+        if not by_event_id:
+            return
+
+        now = timezone.now()
+        with transaction.atomic():
+            tasks = Task.objects.select_for_update().filter(
+                Q(google_calendar_user__isnull=True) | Q(google_calendar_user=self.profile.user_id),
+                google_calendar_event_id__in=list(by_event_id),
+                project_id__in=get_member_project_ids(self.profile.user_id)
+            ).only('id', 'project_id', 'due_date', 'updated_at', 'google_calendar_event_id', 'google_calendar_user')
+
+            changed = []
+            unlinked = []
+            for task in tasks:
+                event = by_event_id[task.google_calendar_event_id]
+                if event.get('status') == 'cancelled':
+                    # Событие удалено в календаре: следующая выгрузка создаст новое
+                    task.google_calendar_event_id = None
+                    task.google_calendar_user_id = None
+                    unlinked.append(task)
+                    continue
+
+                due_date = self.get_moved_start(event)
+                if due_date is None or due_date == task.due_date:
+                    continue
+                event_updated = parse_datetime(event.get('updated') or '')
+                if event_updated is not None and event_updated <= task.updated_at:
+                    # Задачу изменили позже, чем событие: остается значение задачи
+                    self.report['conflicts'] += 1
+                    continue
+
+                task.due_date = due_date
+                task.updated_at = now
+                changed.append(task)
+
+            if unlinked:
+                Task.objects.bulk_update(
+                    unlinked, ['google_calendar_event_id', 'google_calendar_user'], batch_size=1000
+                )
+                self.report['unlinked'] += len(unlinked)
+            if changed:
+                Task.objects.bulk_update(changed, ['due_date', 'updated_at'], batch_size=1000)
+                self.report['updated'] += len(changed)
+                self.record_changes(changed)
+
+    @staticmethod
+    def get_moved_start(event):
+        """
+        Новое начало события или None, если событие не переносили
+        после выгрузки (начало совпадает с выгруженным)
+        """
+        start = parse_event_start(event)
+        pushed = ((event.get('extendedProperties') or {}).get('private') or {}).get(PUSHED_START_PROPERTY)
+        if start is None or (pushed and parse_datetime(pushed) == start):
+            return None
+        return start
+
+    @staticmethod
+    def record_changes(tasks):
+        """
+        bulk_update не вызывает сигналы: журнал изменений, версии кэша
+        аналитики и события проектов обновляются явно
+        """
+        task_ids_by_project = {}
+        for task in tasks:
+            task_ids_by_project.setdefault(task.project_id, []).append(task.id)
+
+        with ProjectChange.collect():
+            for project_id, task_ids in task_ids_by_project.items():
+                ProjectChange.record(project_id, ProjectChange.KIND_TASK, task_ids)
+
+        bump_project_versions(list(task_ids_by_project))
+        for project_id, task_ids in task_ids_by_project.items():
+            realtime_events.publish_project_event(
+                project_id, realtime_events.TASKS_UPDATED,
+                task_ids=task_ids, changes=['due_date']
+            )
+
+
+class CalendarSyncWorker:
+    """
+    Выполнение заданий очереди синхронизации (CalendarSyncJob)
+    """
+
+    def __init__(self, batch_size=10):
+        self.batch_size = batch_size
+
+    def run_once(self):
+        """Забирает и выполняет одну порцию заданий. Возвращает их количество"""
+        jobs = CalendarSyncJob.claim(self.batch_size)
+        for job in jobs:
+            self.process(job)
+        return len(jobs)
+
+    def process(self, job):
+        try:
+            service = get_calendar_client(job.user.profile)
+        except CalendarNotConnected as e:
+            job.mark_failed(e, retry=False)
+            return
+
+        bucket = TokenBucket(job.user_id)
+        if job.kind == CalendarSyncJob.KIND_TASK:
+            self.process_task(job, service, bucket)
+        elif job.kind == CalendarSyncJob.KIND_DELETE:
+            self.process_delete(job, service, bucket)
+        else:
+            self.process_bulk(job, service, bucket)
+
+    def process_task(self, job, service, bucket):
+        task = job.task
+        if task is None:
+            job.mark_failed('Задача удалена', retry=False)
+            return
+
+        try:
+            bucket.acquire()
+            event = GoogleCalendarService.push_task(service, task, job.user_id)
+        except Exception as e:
+            retry = is_retryable_error(e)
+            logger.warning('Ошибка синхронизации задачи %s с Google Calendar: %s', task.id, e)
+            job.mark_failed(e, retry=retry)
+            return
+
+        if event['id'] != task.google_calendar_event_id or task.google_calendar_user_id != job.user_id:
+            # UPDATE без save(): не меняет updated_at и не вызывает сигналы задачи
+            Task.objects.filter(pk=task.pk).update(
+                google_calendar_event_id=event['id'], google_calendar_user=job.user_id
+            )
+        job.mark_done({'event_id': event['id'], 'event_link': event.get('htmlLink')})
+
+    def process_delete(self, job, service, bucket):
+        try:
+            bucket.acquire()
+            service.events().delete(calendarId='primary', eventId=job.event_id).execute()
+        except Exception as e:
+            if isinstance(e, HttpError) and e.resp.status in (404, 410):
+                # Событие уже удалено в календаре
+                job.mark_done({'event_id': job.event_id, 'deleted': False})
+                return
+            logger.warning('Ошибка удаления события %s из Google Calendar: %s', job.event_id, e)
+            job.mark_failed(e, retry=is_retryable_error(e))
+            return
+        job.mark_done({'event_id': job.event_id, 'deleted': True})
+
+    def process_bulk(self, job, service, bucket):
+        tasks = Task.objects.only(*EVENT_TASK_FIELDS).order_by('id')
+        if job.kind == CalendarSyncJob.KIND_PROJECT:
+            if not is_project_member(job.user, job.project_id):
+                job.mark_failed('Пользователь не является участником проекта', retry=False)
+                return
+            tasks = tasks.filter(project_id=job.project_id)
+        else:
+            tasks = tasks.filter(assignee_id=job.user_id)
+
+        report = CalendarBatchSync(service, bucket, job.user_id).sync(tasks)
+
+        retryable = sum(1 for result in report['tasks'] if result.get('retryable'))
+        if retryable:
+            # Повтор выгрузит набор целиком: уже созданные события
+            # обновятся по сохраненным ID, а не продублируются
+            job.mark_failed(f'Временные ошибки: {retryable} из {report["total"]}', result=report)
+        else:
+            job.mark_done(report)
+
+
+def pull_calendar_changes(profiles):
+    """
+    Загружает изменения календарей пользователей profiles.
+    Возвращает (суммарный отчет, количество пользователей с ошибками)
+    """
+    total = {'events': 0, 'updated': 0, 'conflicts': 0, 'unlinked': 0}
+    failed = 0
+    for profile in profiles:
+        try:
+            report = CalendarPullSync(profile).pull()
+        except CalendarNotConnected:
+            continue
+        except Exception as e:
+            logger.warning('Ошибка загрузки изменений календаря пользователя %s: %s', profile.user_id, e)
+            failed += 1
+            continue
+        for key, value in report.items():
+            total[key] += value
+    return total, failed
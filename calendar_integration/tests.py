@@ -1,3 +1,896 @@
-from django.test import TestCase
+import itertools
+import json
+import re
+import threading
+from datetime import timedelta
+from importlib import import_module
+from io import StringIO
+from email.parser import Parser
+from urllib.parse import parse_qsl, urlsplit
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from django.apps import apps as django_apps
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from accounts.models import UserProfile
+from projects.models import Project, ProjectChange
+from tasks.importer import TaskImporter, iter_records
+from tasks.models import Task
+from .clients import client_cache, get_calendar_client
+from .models import CalendarQuota, CalendarSyncJob
+from .quota import TokenBucket
+from .services import CalendarPullSync, CalendarSyncWorker
 
-# Create your tests here.
+EVENTS_PATH = re.compile(r'^/calendar/v3/calendars/(?P<calendar>[^/]+)/events(?:/(?P<event_id>[^/?]+))?')
+
+
+class FakeCalendarServer:
+    """
+    Локальный HTTP-сервер с минимальной реализацией событий Calendar API v3
+    и пакетного endpoint. failures - очередь кодов ответа, которые сервер
+    вернет вместо обработки следующих запросов (операций пакета)
+    """
+
+    def __init__(self):
+        self.events = {}
+        self.requests = []
+        self.batches = []
+        self.failures = []
+        # Заголовки Authorization запросов к событиям и выданные токены
+        self.authorizations = []
+        self.issued_tokens = []
+        # Журнал изменений событий (номер изменения - syncToken) и запросы списка
+        self.changes = []
+        self.list_queries = []
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), self.make_handler())
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def endpoint(self):
+        return f'http://127.0.0.1:{self.httpd.server_port}/calendar/v3/'
+
+    @property
+    def token_uri(self):
+        return f'http://127.0.0.1:{self.httpd.server_port}/token'
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def handle(self, method, path, body):
+        """Возвращает (код ответа, тело ответа)"""
+        with self.lock:
+            self.requests.append((method, path))
+            if self.failures:
+                status = self.failures.pop(0)
+                return status, {'error': {'code': status, 'message': 'Fake failure'}}
+
+            match = EVENTS_PATH.match(path)
+            if not match:
+                return 404, {'error': {'code': 404, 'message': 'Not Found'}}
+            event_id = match['event_id']
+
+            if method == 'GET' and event_id is None:
+                return self.list_events(dict(parse_qsl(urlsplit(path).query)))
+            if method == 'POST' and event_id is None:
+                event = dict(body, id=f'event{next(self.ids)}')
+            elif method == 'PUT' and event_id in self.events:
+                event = dict(body, id=event_id)
+            elif method == 'GET' and event_id in self.events:
+                return 200, self.events[event_id]
+            elif method == 'DELETE' and event_id in self.events:
+                self.delete_event(event_id)
+                return 204, None
+            else:
+                return 404, {'error': {'code': 404, 'message': 'Not Found'}}
+
+            event['htmlLink'] = f'https://calendar.example/{event["id"]}'
+            self.save_event(event)
+            return 200, event
+
+    def save_event(self, event):
+        event['updated'] = timezone.now().isoformat()
+        self.events[event['id']] = event
+        self.changes.append(dict(event))
+
+    def delete_event(self, event_id):
+        del self.events[event_id]
+        self.changes.append({'id': event_id, 'status': 'cancelled', 'updated': timezone.now().isoformat()})
+
+    def move_event(self, event_id, start):
+        """Перенос события пользователем в интерфейсе календаря"""
+        with self.lock:
+            event = dict(self.events[event_id])
+            event['start'] = {'dateTime': start.isoformat()}
+            event['end'] = {'dateTime': (start + timedelta(hours=1)).isoformat()}
+            self.save_event(event)
+
+    def list_events(self, query):
+        """
+        Список событий. С syncToken (номер изменения) - только измененные
+        после него события, включая удаленные
+        """
+        self.list_queries.append(query)
+        sync_token = query.get('syncToken')
+        if sync_token is not None:
+            if not sync_token.isdigit() or int(sync_token) > len(self.changes):
+                return 410, {'error': {'code': 410, 'message': 'Sync token is no longer valid'}}
+            latest = {}
+            for event in self.changes[int(sync_token):]:
+                latest[event['id']] = event
+            items = list(latest.values())
+        else:
+            items = list(self.events.values())
+
+        offset = int(query.get('pageToken', 0))
+        size = int(query.get('maxResults', 250))
+        response = {'items': items[offset:offset + size]}
+        if offset + size < len(items):
+            response['nextPageToken'] = str(offset + size)
+        else:
+            response['nextSyncToken'] = str(len(self.changes))
+        return 200, response
+
+    def handle_token(self, form):
+        """OAuth2: обмен refresh_token на новый токен доступа"""
+        with self.lock:
+            if form.get('refresh_token') == 'revoked':
+                return 400, {'error': 'invalid_grant'}
+            token = f'refreshed-{len(self.issued_tokens) + 1}'
+            self.issued_tokens.append(token)
+            return 200, {'access_token': token, 'expires_in': 3600, 'token_type': 'Bearer'}
+
+    def handle_batch(self, content_type, content):
+        """Выполняет операции multipart/mixed-пакета, возвращает (тип, тело)"""
+        message = Parser().parsestr(f'Content-Type: {content_type}\r\n\r\n{content}')
+        self.batches.append(len(message.get_payload()))
+
+        boundary = 'batch_response'
+        parts = []
+        for part in message.get_payload():
+            request = part.get_payload()
+            request_line, rest = request.split('\n', 1)
+            method, path, _ = request_line.split(' ')
+            _, _, body = rest.replace('\r\n', '\n').partition('\n\n')
+            status, payload = self.handle(method, path, json.loads(body) if body.strip() else None)
+            parts.append(
+                f'--{boundary}\r\n'
+                'Content-Type: application/http\r\n'
+                f'Content-ID: <response-{part["Content-ID"][1:]}\r\n\r\n'
+                f'HTTP/1.1 {status} OK\r\n'
+                'Content-Type: application/json\r\n\r\n'
+                f'{json.dumps(payload) if payload is not None else ""}\r\n'
+            )
+        parts.append(f'--{boundary}--\r\n')
+        return f'multipart/mixed; boundary={boundary}', ''.join(parts).encode('utf-8')
+
+    def make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def respond(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                raw = self.rfile.read(length) if length else b''
+                if self.path.startswith('/batch/'):
+                    content_type, content = server.handle_batch(self.headers['Content-Type'], raw.decode('utf-8'))
+                    status = 200
+                else:
+                    if self.path == '/token':
+                        status, payload = server.handle_token(dict(parse_qsl(raw.decode('utf-8'))))
+                    else:
+                        server.authorizations.append(self.headers.get('Authorization'))
+                        status, payload = server.handle(self.command, self.path, json.loads(raw) if raw else None)
+                    content_type = 'application/json'
+                    content = json.dumps(payload).encode('utf-8') if payload is not None else b''
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            do_GET = do_POST = do_PUT = do_DELETE = respond
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+class CalendarSyncTestCase(TestCase):
+    """Общая подготовка: фейковый сервер Calendar API и пользователь с токеном"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = FakeCalendarServer().start()
+        cls.settings_override = override_settings(
+            GOOGLE_CALENDAR_API_ENDPOINT=cls.server.endpoint,
+            GOOGLE_TOKEN_URI=cls.server.token_uri
+        )
+        cls.settings_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings_override.disable()
+        cls.server.stop()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.server.events.clear()
+        self.server.requests.clear()
+        self.server.batches.clear()
+        self.server.failures.clear()
+        self.server.authorizations.clear()
+        self.server.issued_tokens.clear()
+        self.server.changes.clear()
+        self.server.list_queries.clear()
+        cache.clear()
+        client_cache.clear()
+
+        self.user = User.objects.create_user(username='owner', password='password')
+        self.user.profile.google_calendar_token = 'access-token'
+        self.user.profile.google_calendar_refresh_token = 'refresh-token'
+        self.user.profile.save()
+
+        self.project = Project.objects.create(name='Проект', created_by=self.user)
+        self.project.members.add(self.user)
+        self.task = Task.objects.create(
+            title='Релиз',
+            project=self.project,
+            created_by=self.user,
+            due_date=timezone.now() + timedelta(days=3)
+        )
+
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+
+class CalendarSyncQueueTest(CalendarSyncTestCase):
+    """Очередь синхронизации: постановка, выполнение воркером, повторы"""
+
+    def sync(self):
+        return self.client.post(f'/api/tasks/{self.task.id}/sync_calendar/')
+
+    def run_worker(self):
+        return CalendarSyncWorker().run_once()
+
+    def test_sync_returns_job_and_worker_creates_event(self):
+        response = self.sync()
+        self.assertEqual(response.status_code, 202)
+        job_id = response.json()['job_id']
+        # Запрос к API не обращается к Google
+        self.assertEqual(self.server.requests, [])
+
+        self.assertEqual(self.run_worker(), 1)
+
+        self.task.refresh_from_db()
+        self.assertIn(self.task.google_calendar_event_id, self.server.events)
+        event = self.server.events[self.task.google_calendar_event_id]
+        self.assertEqual(event['summary'], '[ProjectFlow] Релиз')
+
+        job = self.client.get(response.json()['status_url']).json()
+        self.assertEqual(job['id'], job_id)
+        self.assertEqual(job['status'], CalendarSyncJob.STATUS_DONE)
+        self.assertEqual(job['result']['event_id'], self.task.google_calendar_event_id)
+
+    def test_repeated_sync_reuses_pending_job(self):
+        first = self.sync().json()['job_id']
+        second = self.sync().json()['job_id']
+        self.assertEqual(first, second)
+
+        self.run_worker()
+        self.assertEqual(self.server.requests, [('POST', '/calendar/v3/calendars/primary/events?alt=json')])
+
+        # После выполнения повторная синхронизация обновляет то же событие
+        self.assertNotEqual(self.sync().json()['job_id'], first)
+        self.run_worker()
+        self.assertEqual(self.server.requests[-1][0], 'PUT')
+        self.assertEqual(len(self.server.events), 1)
+
+    def test_transient_error_is_retried_with_backoff(self):
+        job_id = self.sync().json()['job_id']
+        self.server.failures = [503]
+
+        self.run_worker()
+        job = CalendarSyncJob.objects.get(id=job_id)
+        self.assertEqual(job.status, CalendarSyncJob.STATUS_PENDING)
+        self.assertEqual(job.attempts, 1)
+        self.assertGreater(job.run_at, timezone.now())
+
+        # До истечения задержки задание не выдается
+        self.assertEqual(self.run_worker(), 0)
+
+        CalendarSyncJob.objects.filter(id=job_id).update(run_at=timezone.now())
+        self.run_worker()
+        job.refresh_from_db()
+        self.assertEqual(job.status, CalendarSyncJob.STATUS_DONE)
+        self.assertEqual(job.attempts, 2)
+
+    @override_settings(CALENDAR_SYNC_MAX_ATTEMPTS=2)
+    def test_job_fails_after_max_attempts(self):
+        job_id = self.sync().json()['job_id']
+        self.server.failures = [503, 503]
+
+        self.run_worker()
+        CalendarSyncJob.objects.filter(id=job_id).update(run_at=timezone.now())
+        self.run_worker()
+
+        job = CalendarSyncJob.objects.get(id=job_id)
+        self.assertEqual(job.status, CalendarSyncJob.STATUS_FAILED)
+        self.assertEqual(job.attempts, 2)
+
+    def test_permanent_error_is_not_retried(self):
+        job_id = self.sync().json()['job_id']
+        self.server.failures = [400]
+
+        self.run_worker()
+        job = CalendarSyncJob.objects.get(id=job_id)
+        self.assertEqual(job.status, CalendarSyncJob.STATUS_FAILED)
+        self.assertEqual(job.attempts, 1)
+
+    def test_event_deleted_in_calendar_is_recreated(self):
+        self.sync()
+        self.run_worker()
+        self.server.events.clear()
+
+        self.sync()
+        self.run_worker()
+        self.task.refresh_from_db()
+        self.assertIn(self.task.google_calendar_event_id, self.server.events)
+
+    def test_stale_running_job_is_reclaimed(self):
+        job_id = self.sync().json()['job_id']
+        CalendarSyncJob.objects.filter(id=job_id).update(
+            status=CalendarSyncJob.STATUS_RUNNING,
+            locked_at=timezone.now() - timedelta(hours=1)
+        )
+
+        self.assertEqual(self.run_worker(), 1)
+        self.assertEqual(CalendarSyncJob.objects.get(id=job_id).status, CalendarSyncJob.STATUS_DONE)
+
+    def test_job_status_is_private(self):
+        job_id = self.sync().json()['job_id']
+        other = User.objects.create_user(username='other', password='password')
+        self.client.force_authenticate(user=other)
+        self.assertEqual(self.client.get(f'/api/calendar/jobs/{job_id}/').status_code, 404)
+
+    def test_worker_command(self):
+        self.sync()
+        call_command('calendar_sync_worker', '--once', stdout=open('/dev/null', 'w'))
+        self.task.refresh_from_db()
+        self.assertIsNotNone(self.task.google_calendar_event_id)
+
+
+@override_settings(CALENDAR_BATCH_SIZE=5)
+class CalendarBulkSyncTest(CalendarSyncTestCase):
+    """Пакетная выгрузка задач проекта и назначенных задач"""
+
+    def create_tasks(self, count, **kwargs):
+        return [
+            Task.objects.create(title=f'Задача {index}', project=self.project, created_by=self.user, **kwargs)
+            for index in range(count)
+        ]
+
+    def sync_project(self):
+        response = self.client.post(f'/api/calendar/sync/project/{self.project.id}/')
+        self.assertEqual(response.status_code, 202)
+        CalendarSyncWorker().run_once()
+        return CalendarSyncJob.objects.get(id=response.json()['job_id'])
+
+    def test_project_tasks_are_synced_in_batches(self):
+        self.create_tasks(11)
+
+        job = self.sync_project()
+        self.assertEqual(job.status, CalendarSyncJob.STATUS_DONE)
+        # 12 задач пакетами по 5 операций
+        self.assertEqual(self.server.batches, [5, 5, 2])
+        self.assertEqual(job.result['created'], 12)
+        self.assertEqual(job.result['failed'], 0)
+
+        event_ids = dict(Task.objects.filter(project=self.project).values_list('id', 'google_calendar_event_id'))
+        self.assertEqual(set(event_ids.values()), set(self.server.events))
+        self.assertEqual(
+            {result['task']: result['event_id'] for result in job.result['tasks']},
+            event_ids
+        )
+
+    def test_resync_updates_and_recreates_events(self):
+        self.create_tasks(2)
+        self.sync_project()
+        self.task.refresh_from_db()
+        del self.server.events[self.task.google_calendar_event_id]
+
+        job = self.sync_project()
+        self.assertEqual(job.result['updated'], 2)
+        self.assertEqual(job.result['created'], 1)
+        self.assertEqual(len(self.server.events), 3)
+        self.task.refresh_from_db()
+        self.assertIn(self.task.google_calendar_event_id, self.server.events)
+
+    def test_event_ids_are_saved_with_one_query(self):
+        self.create_tasks(7)
+        response = self.client.post(f'/api/calendar/sync/project/{self.project.id}/')
+        with CaptureQueriesContext(connection) as context:
+            CalendarSyncWorker().run_once()
+        updates = [
+            query['sql'] for query in context.captured_queries
+            if query['sql'].startswith('UPDATE "tasks_task"')
+        ]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(CalendarSyncJob.objects.get(id=response.json()['job_id']).status, CalendarSyncJob.STATUS_DONE)
+
+    def test_per_task_failures_are_reported(self):
+        self.create_tasks(2)
+        self.server.failures = [400]
+
+        job = self.sync_project()
+        self.assertEqual(job.status, CalendarSyncJob.STATUS_DONE)
+        self.assertEqual(job.result['failed'], 1)
+        self.assertEqual(job.result['created'], 2)
+        failed = [result for result in job.result['tasks'] if result['status'] == 'failed']
+        self.assertFalse(failed[0]['retryable'])
+
+    def test_transient_failures_retry_job(self):
+        self.create_tasks(2)
+        self.server.failures = [503]
+
+        job = self.sync_project()
+        self.assertEqual(job.status, CalendarSyncJob.STATUS_PENDING)
+        self.assertEqual(job.result['failed'], 1)
+
+        CalendarSyncJob.objects.filter(id=job.id).update(run_at=timezone.now())
+        CalendarSyncWorker().run_once()
+        job.refresh_from_db()
+        self.assertEqual(job.status, CalendarSyncJob.STATUS_DONE)
+        self.assertEqual(len(self.server.events), 3)
+
+    def test_assigned_tasks(self):
+        other = User.objects.create_user(username='other', password='password')
+        self.project.members.add(other)
+        self.create_tasks(3, assignee=self.user)
+        self.create_tasks(2, assignee=other)
+
+        response = self.client.post('/api/calendar/sync/assigned/')
+        self.assertEqual(response.status_code, 202)
+        CalendarSyncWorker().run_once()
+        job = CalendarSyncJob.objects.get(id=response.json()['job_id'])
+        self.assertEqual(job.result['total'], 3)
+
+    def test_non_member_cannot_sync_project(self):
+        other = User.objects.create_user(username='other', password='password')
+        self.client.force_authenticate(user=other)
+        response = self.client.post(f'/api/calendar/sync/project/{self.project.id}/')
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(CALENDAR_QUOTA_RATE=10, CALENDAR_QUOTA_BURST=5)
+    def test_token_bucket_waits_when_quota_is_spent(self):
+        waits = []
+        self.assertEqual(TokenBucket(self.user.id).acquire(5, sleep=waits.append), 0)
+        # Другой экземпляр (другой воркер) видит ту же квоту
+        TokenBucket(self.user.id).acquire(5, sleep=waits.append)
+        self.assertEqual(len(waits), 1)
+        self.assertAlmostEqual(waits[0], 0.5, delta=0.05)
+        self.assertLess(CalendarQuota.objects.get(user=self.user).tokens, 0)
+
+        # Квоты пользователей независимы
+        other = User.objects.create_user(username='other', password='password')
+        self.assertEqual(TokenBucket(other.id).reserve(5), 0)
+
+
+class CalendarClientTest(CalendarSyncTestCase):
+    """Кэш клиентов Calendar API и обновление токенов"""
+
+    def get_profile(self, user=None):
+        return UserProfile.objects.get(user=user or self.user)
+
+    def test_client_is_cached_per_user(self):
+        client = get_calendar_client(self.get_profile())
+        self.assertIs(get_calendar_client(self.get_profile()), client)
+
+        # Повторная авторизация (новый refresh_token) - новый клиент
+        UserProfile.objects.filter(user=self.user).update(google_calendar_refresh_token='new-refresh-token')
+        self.assertIsNot(get_calendar_client(self.get_profile()), client)
+
+    @override_settings(CALENDAR_CLIENT_CACHE_SIZE=1)
+    def test_cache_is_bounded(self):
+        other = User.objects.create_user(username='other', password='password')
+        UserProfile.objects.filter(user=other).update(google_calendar_token='other-token')
+
+        client = get_calendar_client(self.get_profile())
+        get_calendar_client(self.get_profile(other))
+        self.assertIsNot(get_calendar_client(self.get_profile()), client)
+
+    def test_expired_token_is_refreshed_and_saved(self):
+        UserProfile.objects.filter(user=self.user).update(
+            google_calendar_token_expiry=timezone.now() - timedelta(minutes=5)
+        )
+        self.client.post(f'/api/tasks/{self.task.id}/sync_calendar/')
+        CalendarSyncWorker().run_once()
+
+        self.assertEqual(self.server.issued_tokens, ['refreshed-1'])
+        self.assertEqual(self.server.authorizations, ['Bearer refreshed-1'])
+        profile = self.get_profile()
+        self.assertEqual(profile.google_calendar_token, 'refreshed-1')
+        self.assertGreater(profile.google_calendar_token_expiry, timezone.now() + timedelta(minutes=50))
+
+        # Следующая синхронизация использует сохраненный токен без обновления
+        self.client.post(f'/api/tasks/{self.task.id}/sync_calendar/')
+        CalendarSyncWorker().run_once()
+        self.assertEqual(self.server.issued_tokens, ['refreshed-1'])
+
+    def test_refresh_command_refreshes_expiring_tokens(self):
+        UserProfile.objects.filter(user=self.user).update(
+            google_calendar_token_expiry=timezone.now() + timedelta(minutes=5)
+        )
+        fresh = User.objects.create_user(username='fresh', password='password')
+        UserProfile.objects.filter(user=fresh).update(
+            google_calendar_token='fresh-token',
+            google_calendar_refresh_token='fresh-refresh-token',
+            google_calendar_token_expiry=timezone.now() + timedelta(hours=1)
+        )
+        revoked = User.objects.create_user(username='revoked', password='password')
+        UserProfile.objects.filter(user=revoked).update(
+            google_calendar_token='revoked-token',
+            google_calendar_refresh_token='revoked',
+            google_calendar_token_expiry=timezone.now() - timedelta(hours=1)
+        )
+
+        # Клиент, созданный до обновления, подхватывает новый токен из профиля
+        get_calendar_client(self.get_profile())
+
+        call_command('refresh_calendar_tokens', '--margin', '900', stdout=open('/dev/null', 'w'), stderr=open('/dev/null', 'w'))
+
+        self.assertEqual(self.server.issued_tokens, ['refreshed-1'])
+        self.assertEqual(self.get_profile().google_calendar_token, 'refreshed-1')
+        self.assertEqual(self.get_profile(fresh).google_calendar_token, 'fresh-token')
+        self.assertEqual(self.get_profile(revoked).google_calendar_token, 'revoked-token')
+
+        self.client.post(f'/api/tasks/{self.task.id}/sync_calendar/')
+        CalendarSyncWorker().run_once()
+        self.assertEqual(self.server.authorizations, ['Bearer refreshed-1'])
+        self.assertEqual(self.server.issued_tokens, ['refreshed-1'])
+
+
+class CalendarPullTest(CalendarSyncTestCase):
+    """Инкрементальная загрузка изменений календаря в сроки задач"""
+
+    def setUp(self):
+        super().setUp()
+        self.other_task = Task.objects.create(title='Без срока', project=self.project, created_by=self.user)
+        CalendarSyncJob.enqueue_project(self.project, self.user)
+        CalendarSyncWorker().run_once()
+        for task in (self.task, self.other_task):
+            task.refresh_from_db()
+
+    def pull(self):
+        return CalendarPullSync(UserProfile.objects.get(user=self.user)).pull()
+
+    def test_first_pull_stores_sync_token_without_changes(self):
+        report = self.pull()
+        self.assertEqual(report['events'], 2)
+        self.assertEqual(report['updated'], 0)
+        self.assertNotIn('syncToken', self.server.list_queries[0])
+
+        profile = UserProfile.objects.get(user=self.user)
+        self.assertEqual(profile.google_calendar_sync_token, str(len(self.server.changes)))
+        self.other_task.refresh_from_db()
+        self.assertIsNone(self.other_task.due_date)
+
+    def test_moved_event_updates_due_date(self):
+        self.pull()
+        new_start = (self.task.due_date + timedelta(days=2)).replace(microsecond=0)
+        self.server.move_event(self.task.google_calendar_event_id, new_start)
+
+        task_changes = ProjectChange.objects.filter(object_id=self.task.id, kind=ProjectChange.KIND_TASK)
+        changes_before = task_changes.count()
+        with CaptureQueriesContext(connection) as context:
+            report = self.pull()
+        # Запрошены только изменения после прошлой загрузки
+        self.assertIn('syncToken', self.server.list_queries[-1])
+        self.assertEqual(report['events'], 1)
+        self.assertEqual(report['updated'], 1)
+        updates = [query for query in context.captured_queries if query['sql'].startswith('UPDATE "tasks_task"')]
+        self.assertEqual(len(updates), 1)
+
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.due_date, new_start)
+        # Журнал изменений проекта пополняется, хотя сигналы не отправлялись
+        self.assertEqual(task_changes.count(), changes_before + 1)
+
+        # Повторная загрузка ничего не меняет
+        self.assertEqual(self.pull(), {'events': 0, 'updated': 0, 'conflicts': 0, 'unlinked': 0})
+
+    def test_newer_local_change_wins(self):
+        self.pull()
+        self.server.move_event(self.task.google_calendar_event_id, self.task.due_date + timedelta(days=2))
+        local_due_date = self.task.due_date + timedelta(days=5)
+        self.task.due_date = local_due_date
+        self.task.save()
+
+        report = self.pull()
+        self.assertEqual(report['conflicts'], 1)
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.due_date, local_due_date)
+
+    def test_deleted_event_unlinks_task(self):
+        self.pull()
+        with self.server.lock:
+            self.server.delete_event(self.task.google_calendar_event_id)
+
+        self.assertEqual(self.pull()['unlinked'], 1)
+        self.task.refresh_from_db()
+        self.assertIsNone(self.task.google_calendar_event_id)
+
+    def test_expired_sync_token_triggers_full_pull(self):
+        UserProfile.objects.filter(user=self.user).update(google_calendar_sync_token='expired')
+
+        report = self.pull()
+        self.assertEqual(report['events'], 2)
+        self.assertEqual(
+            UserProfile.objects.get(user=self.user).google_calendar_sync_token,
+            str(len(self.server.changes))
+        )
+
+    def test_tasks_of_other_projects_are_not_changed(self):
+        self.pull()
+        self.project.members.remove(self.user)
+        self.server.move_event(self.task.google_calendar_event_id, self.task.due_date + timedelta(days=2))
+
+        self.assertEqual(self.pull()['updated'], 0)
+
+    def test_pull_command(self):
+        new_start = self.task.due_date + timedelta(days=1)
+        self.server.move_event(self.task.google_calendar_event_id, new_start)
+        call_command('pull_calendar_changes', stdout=open('/dev/null', 'w'))
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.due_date, new_start)
+
+
+class CalendarAutoSyncTest(CalendarSyncTestCase):
+    """Автосинхронизация: правки задачи выгружаются один раз за окно"""
+
+    def setUp(self):
+        super().setUp()
+        self.user.profile.google_calendar_auto_sync = True
+        self.user.profile.save()
+        self.task.assignee = self.user
+        self.task.save()
+
+    def edit(self, **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            for name, value in fields.items():
+                setattr(self.task, name, value)
+                self.task.save()
+
+    def flush(self):
+        # Окно истекло
+        CalendarSyncJob.objects.filter(status=CalendarSyncJob.STATUS_PENDING).update(run_at=timezone.now())
+        return CalendarSyncWorker().run_once()
+
+    def test_burst_of_edits_is_one_call_per_window(self):
+        for i in range(5):
+            self.edit(title=f'Релиз {i}', description=f'Шаг {i}')
+
+        jobs = CalendarSyncJob.objects.filter(task=self.task)
+        self.assertEqual(jobs.count(), 1)
+        self.assertGreater(jobs.get().run_at, timezone.now())
+        # До конца окна задание не выполняется
+        self.assertEqual(CalendarSyncWorker().run_once(), 0)
+
+        self.assertEqual(self.flush(), 1)
+        self.assertEqual(len(self.server.requests), 1)
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.google_calendar_user_id, self.user.id)
+        event = self.server.events[self.task.google_calendar_event_id]
+        self.assertEqual(event['summary'], '[ProjectFlow] Релиз 4')
+
+        # Следующее окно обновляет то же событие
+        self.edit(title='Релиз 5')
+        self.flush()
+        self.assertEqual(self.server.requests[-1][0], 'PUT')
+        self.assertEqual(len(self.server.events), 1)
+
+    def test_unrelated_changes_are_not_synced(self):
+        self.edit(status='В работе', priority='Высокий')
+        self.assertFalse(CalendarSyncJob.objects.exists())
+
+    def test_auto_sync_is_opt_in(self):
+        UserProfile.objects.filter(user=self.user).update(google_calendar_auto_sync=False)
+        self.edit(title='Релиз 2')
+        self.assertFalse(CalendarSyncJob.objects.exists())
+
+    def test_manual_sync_runs_pending_auto_sync_now(self):
+        self.edit(title='Релиз 2')
+        response = self.client.post(f'/api/tasks/{self.task.id}/sync_calendar/')
+        self.assertEqual(CalendarSyncJob.objects.get().id, response.json()['job_id'])
+        self.assertEqual(CalendarSyncWorker().run_once(), 1)
+
+    def test_deleted_task_deletes_event(self):
+        self.edit(title='Релиз 2')
+        self.flush()
+        self.task.refresh_from_db()
+        event_id = self.task.google_calendar_event_id
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.task.delete()
+        job = CalendarSyncJob.objects.get(kind=CalendarSyncJob.KIND_DELETE)
+        self.assertEqual(job.event_id, event_id)
+
+        self.flush()
+        self.assertNotIn(event_id, self.server.events)
+        job.refresh_from_db()
+        self.assertEqual(job.status, CalendarSyncJob.STATUS_DONE)
+        self.assertEqual(job.result, {'event_id': event_id, 'deleted': True})
+
+    def test_status_and_toggle(self):
+        self.assertEqual(self.client.get('/api/calendar/status/').json(), {'connected': True, 'auto_sync': True})
+        response = self.client.put('/api/calendar/auto-sync/', {'enabled': False}, format='json')
+        self.assertEqual(response.json(), {'auto_sync': False})
+        self.assertFalse(UserProfile.objects.get(user=self.user).google_calendar_auto_sync)
+        response = self.client.put('/api/calendar/auto-sync/', {'enabled': 'yes'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_bulk_update_schedules_sync(self):
+        other = Task.objects.create(title='Другая', project=self.project, created_by=self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/tasks/bulk/', {'ids': [self.task.id, other.id], 'priority': 'Высокий'},
+                             format='json')
+        self.assertFalse(CalendarSyncJob.objects.exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/tasks/bulk/', {
+                'ids': [self.task.id, other.id], 'due_date': (timezone.now() + timedelta(days=3)).isoformat()
+            }, format='json')
+        self.assertEqual(response.status_code, 200)
+        # У второй задачи нет ни события, ни исполнителя
+        self.assertEqual(list(CalendarSyncJob.objects.values_list('task_id', 'user_id')), [(self.task.id, self.user.id)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/tasks/bulk/', {'ids': [other.id], 'assignee_id': self.user.id}, format='json')
+        self.assertTrue(CalendarSyncJob.objects.filter(task=other, user=self.user).exists())
+
+    def test_import_schedules_sync(self):
+        record = json.dumps({'type': 'task', 'title': 'Из файла', 'assignee': 'owner'})
+        with self.captureOnCommitCallbacks(execute=True):
+            TaskImporter(self.project, self.user).run(iter_records(StringIO(record), 'ndjson'))
+        task = Task.objects.get(title='Из файла')
+        self.assertTrue(CalendarSyncJob.objects.filter(task=task, user=self.user).exists())
+
+    def test_flag_is_checked_once_per_bulk_delete(self):
+        tasks = [
+            Task.objects.create(title=f'Задача {i}', project=self.project, created_by=self.user,
+                                google_calendar_event_id=f'event-{i}', google_calendar_user=self.user)
+            for i in range(5)
+        ]
+        with CaptureQueriesContext(connection) as context:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post('/api/tasks/bulk/', {
+                    'ids': [task.id for task in tasks], 'delete': True
+                }, format='json')
+        self.assertEqual(response.status_code, 200)
+        profile_queries = [query for query in context.captured_queries if 'accounts_userprofile' in query['sql']]
+        self.assertEqual(len(profile_queries), 1)
+        self.assertEqual(
+            sorted(CalendarSyncJob.objects.filter(kind=CalendarSyncJob.KIND_DELETE).values_list('event_id', flat=True)),
+            [f'event-{i}' for i in range(5)]
+        )
+
+    def test_legacy_event_is_deleted_for_job_owner(self):
+        self.edit(title='Релиз 2')
+        self.flush()
+        # Событие выгружено до появления google_calendar_user
+        Task.objects.filter(id=self.task.id).update(google_calendar_user=None, assignee=None)
+        self.task.refresh_from_db()
+        event_id = self.task.google_calendar_event_id
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.task.delete()
+        job = CalendarSyncJob.objects.get(kind=CalendarSyncJob.KIND_DELETE)
+        self.assertEqual((job.user_id, job.event_id), (self.user.id, event_id))
+
+    def test_backfill_event_owner(self):
+        self.edit(title='Релиз 2')
+        self.flush()
+        Task.objects.filter(id=self.task.id).update(google_calendar_user=None)
+
+        migration = import_module('calendar_integration.migrations.0005_backfill_task_calendar_user')
+        migration.backfill_event_owners(django_apps, connection.schema_editor())
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.google_calendar_user_id, self.user.id)
+
+
+class CalendarAutoSyncTransactionTest(TransactionTestCase):
+    """Автосинхронизация с настоящими транзакциями: autocommit и откат точки сохранения"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='owner', password='password')
+        UserProfile.objects.filter(user=self.user).update(
+            google_calendar_token='access-token', google_calendar_auto_sync=True
+        )
+        self.project = Project.objects.create(name='Проект', created_by=self.user)
+        self.project.members.add(self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_api_save_in_autocommit_schedules_sync(self):
+        response = self.client.post('/api/tasks/', {
+            'title': 'Релиз', 'project': self.project.id, 'assignee_id': self.user.id
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        task_id = response.json()['id']
+        self.assertTrue(CalendarSyncJob.objects.filter(task_id=task_id, user=self.user).exists())
+
+        CalendarSyncJob.objects.all().delete()
+        response = self.client.patch(f'/api/tasks/{task_id}/', {
+            'due_date': (timezone.now() + timedelta(days=2)).isoformat()
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(CalendarSyncJob.objects.filter(task_id=task_id, user=self.user).exists())
+
+    def test_rolled_back_savepoint_is_not_synced(self):
+        kept = Task.objects.create(title='Оставлена', project=self.project, created_by=self.user)
+        rolled_back = Task.objects.create(title='Откачена', project=self.project, created_by=self.user,
+                                          google_calendar_event_id='event-1', google_calendar_user=self.user)
+        rolled_back_id = rolled_back.id
+        CalendarSyncJob.objects.all().delete()
+
+        with transaction.atomic():
+            kept.assignee = self.user
+            kept.save()
+            try:
+                with transaction.atomic():
+                    rolled_back.title = 'Новое название'
+                    rolled_back.save()
+                    rolled_back.delete()
+                    raise IntegrityError
+            except IntegrityError:
+                pass
+
+        self.assertEqual(list(CalendarSyncJob.objects.values_list('kind', 'task_id')),
+                         [(CalendarSyncJob.KIND_TASK, kept.id)])
+        self.assertTrue(Task.objects.filter(id=rolled_back_id).exists())
+
+
+class CalendarSyncClaimTest(TransactionTestCase):
+    """Параллельные воркеры не получают одно и то же задание"""
+
+    def test_locked_job_is_skipped(self):
+        user = User.objects.create_user(username='owner', password='password')
+        project = Project.objects.create(name='Проект', created_by=user)
+        tasks = [Task.objects.create(title=f'Задача {i}', project=project, created_by=user) for i in range(2)]
+        jobs = [CalendarSyncJob.enqueue(task, user) for task in tasks]
+
+        locked = threading.Event()
+        release = threading.Event()
+
+        def hold_lock():
+            # Другой воркер держит блокировку первого задания
+            try:
+                with transaction.atomic():
+                    CalendarSyncJob.objects.select_for_update().get(id=jobs[0].id)
+                    locked.set()
+                    release.wait(10)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=hold_lock)
+        thread.start()
+        try:
+            self.assertTrue(locked.wait(10))
+            claimed = CalendarSyncJob.claim(limit=10)
+        finally:
+            release.set()
+            thread.join()
+
+        self.assertEqual([job.id for job in claimed], [jobs[1].id])
@@ -2,7 +2,12 @@ from django.urls import path
 from .views import (
     GoogleAuthURLView,
     GoogleAuthCallbackView,
-    GoogleCalendarSuccessView
+    GoogleCalendarSuccessView,
+    CalendarSyncJobView,
+    CalendarProjectSyncView,
+    CalendarAssignedSyncView,
+    CalendarStatusView,
+    CalendarAutoSyncView
 )
 
 urlpatterns = [
@@ -14,4 +19,15 @@ urlpatterns = [
 
     # URL для подтверждения успешной авторизации
     path('success/', GoogleCalendarSuccessView.as_view(), name='google_auth_success'),
+
+    # Состояние задания синхронизации задачи
+    path('jobs/<int:job_id>/', CalendarSyncJobView.as_view(), name='calendar_sync_job'),
+
+    # Пакетная выгрузка задач проекта и назначенных пользователю задач
+    path('sync/project/<int:project_id>/', CalendarProjectSyncView.as_view(), name='calendar_sync_project'),
+    path('sync/assigned/', CalendarAssignedSyncView.as_view(), name='calendar_sync_assigned'),
+
+    # Статус подключения и автосинхронизация изменений задач
+    path('status/', CalendarStatusView.as_view(), name='calendar_status'),
+    path('auto-sync/', CalendarAutoSyncView.as_view(), name='calendar_auto_sync'),
 ]
\ No newline at end of file
@@ -1,10 +1,14 @@
 from rest_framework import views, status, permissions
 from rest_framework.response import Response
-from django.shortcuts import redirect
+from django.shortcuts import get_object_or_404, redirect
 from django.conf import settings
 from datetime import datetime
+from .models import CalendarSyncJob
+from .serializers import CalendarSyncJobSerializer
 from .services import GoogleCalendarService
 from accounts.models import UserProfile
+from projects.models import Project
+from projects.permissions import IsProjectMember
 
 
 class GoogleAuthURLView(views.APIView):
@@ -125,4 +129,92 @@ class GoogleCalendarSuccessView(views.APIView):
         return Response({
             'success': True,
             'message': 'Авторизация в Google Calendar успешно завершена'
-        })
\ No newline at end of file
+        })
+
+
+class CalendarSyncJobView(views.APIView):
+    """
+    Состояние задания синхронизации с Google Calendar (для опроса
+    после 202 от /api/tasks/<id>/sync_calendar/ и /api/calendar/sync/...).
+    Для пакетной выгрузки result - отчет по каждой задаче
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, job_id):
+        job = get_object_or_404(CalendarSyncJob, id=job_id, user=request.user)
+        return Response(CalendarSyncJobSerializer(job).data)
+
+
+def enqueue_bulk_sync(request, enqueue):
+    """
+    Постановка в очередь пакетной выгрузки задач в календарь: enqueue()
+    создает задание. Возвращает 202 и ID задания для опроса
+    (/api/calendar/jobs/<id>/)
+    """
+    if not request.user.profile.google_calendar_token:
+        return Response({
+            'status': 'redirect',
+            'url': '/api/calendar/auth-url/'
+        })
+
+    job = enqueue()
+    return Response({
+        'status': 'queued',
+        'job_id': job.id,
+        'job_status': job.status,
+        'status_url': job.get_absolute_url(),
+    }, status=status.HTTP_202_ACCEPTED)
+
+
+class CalendarProjectSyncView(views.APIView):
+    """Выгрузка всех задач проекта в календарь пользователя"""
+    permission_classes = [IsProjectMember]
+
+    def post(self, request, project_id):
+        project = get_object_or_404(Project, id=project_id)
+        return enqueue_bulk_sync(request, lambda: CalendarSyncJob.enqueue_project(project, request.user))
+
+
+class CalendarAssignedSyncView(views.APIView):
+    """Выгрузка всех задач, назначенных пользователю, в его календарь"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        return enqueue_bulk_sync(request, lambda: CalendarSyncJob.enqueue_assigned(request.user))
+
+
+class CalendarStatusView(views.APIView):
+    """Подключен ли Google Calendar и включена ли автосинхронизация"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        profile = request.user.profile
+        return Response({
+            'connected': bool(profile.google_calendar_token),
+            'auto_sync': profile.google_calendar_auto_sync,
+        })
+
+
+class CalendarAutoSyncView(views.APIView):
+    """
+    Включение и отключение автосинхронизации: изменения задач
+    выгружаются в календарь не чаще раза в CALENDAR_AUTO_SYNC_WINDOW
+    секунд на задачу, удаление задачи удаляет ее событие
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def put(self, request):
+        enabled = request.data.get('enabled')
+        if not isinstance(enabled, bool):
+            return Response({'error': 'Поле enabled должно быть true или false'}, status=status.HTTP_400_BAD_REQUEST)
+
+        profile = request.user.profile
+        if enabled and not profile.google_calendar_token:
+            return Response({
+                'status': 'redirect',
+                'url': '/api/calendar/auth-url/'
+            })
+
+        profile.google_calendar_auto_sync = enabled
+        profile.save(update_fields=['google_calendar_auto_sync', 'updated_at'])
+        return Response({'auto_sync': enabled})
@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+
+# Бэкенды, которые не видят изменений из других процессов
+PROCESS_LOCAL_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def get_shared_cache(setting_name):
+    """
+    Кэш, указанный настройкой setting_name, или None, если она пуста.
+    Записи таких кэшей сбрасываются при изменении данных, поэтому
+    допустим только общий для всех процессов бэкенд (Redis, Memcached):
+    в локальной памяти других процессов устаревшие данные остались бы
+    до истечения таймаута
+    """
+    alias = getattr(settings, setting_name)
+    if not alias:
+        return None
+    if settings.CACHES[alias]['BACKEND'] in PROCESS_LOCAL_BACKENDS:
+        raise ImproperlyConfigured(
+            f'{setting_name} "{alias}" должен указывать на общий для процессов кэш'
+        )
+    return caches[alias]
@@ -0,0 +1,28 @@
+import hashlib
+from django.utils.cache import get_conditional_response
+
+
+def make_etag(*parts):
+    """Строит ETag из частей штампа версии (без сериализации тела ответа)"""
+    raw = ':'.join(str(part) for part in parts)
+    return '"%s"' % hashlib.md5(raw.encode('utf-8')).hexdigest()
+
+
+def get_not_modified_response(request, etag):
+    """
+    Возвращает ответ 304, если клиент прислал совпадающий If-None-Match, иначе None.
+    Проверка только по ETag: у Last-Modified точность в одну секунду, и
+    изменение в ту же секунду, что и прошлый ответ, осталось бы незамеченным
+    """
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        set_validators(response, etag)
+    return response
+
+
+def set_validators(response, etag):
+    """Добавляет к ответу ETag и запрет кэширования без проверки"""
+    response['ETag'] = etag
+    # Ответы зависят от прав пользователя: только приватный кэш с обязательной проверкой
+    response['Cache-Control'] = 'private, no-cache'
+    return response
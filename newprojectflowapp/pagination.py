@@ -0,0 +1,194 @@
+import base64
+import binascii
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Курсорная (keyset) пагинация по паре (created_at, id).
+
+    Вместо OFFSET каждая следующая страница начинается строго после
+    последней записи предыдущей, поэтому глубина листания не влияет
+    на скорость, а вставка новых записей не сдвигает страницы.
+    Курсор непрозрачен для клиента. Курсор хранит позицию только в
+    этом порядке, поэтому queryset с другой сортировкой (?ordering=,
+    релевантность поиска) отклоняется с ошибкой 400.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = api_settings.PAGE_SIZE or 10
+    max_page_size = 100
+
+    # Направление сортировки: '-' - от новых к старым
+    ordering = ('-created_at', '-id')
+
+    invalid_cursor_message = 'Неверный курсор'
+    ordering_conflict_message = 'Курсорная пагинация не поддерживает выбранную сортировку'
+
+    @classmethod
+    def is_requested(cls, request):
+        """
+        Клиент включает курсорную пагинацию параметром ?cursor=
+        (пустое значение - первая страница)
+        """
+        return cls.cursor_query_param in request.query_params
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+
+        self.check_ordering(queryset)
+        queryset = queryset.order_by(*self.ordering)
+
+        position = self.decode_cursor(request)
+        if position is not None:
+            queryset = queryset.filter(self.get_position_filter(*position))
+
+        # Берем на одну запись больше, чтобы узнать, есть ли следующая страница
+        results = list(queryset[:self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        results = results[:self.page_size]
+
+        self.last_position = self.get_position(results[-1]) if results else None
+
+        return results
+
+    def check_ordering(self, queryset):
+        """
+        Сортировка queryset должна быть началом порядка курсора
+        (например, -created_at для -created_at, -id), иначе страницы
+        не совпали бы с порядком, который ожидает клиент
+        """
+        active = tuple(queryset.query.order_by)
+        if active and active != tuple(self.ordering[:len(active)]):
+            raise ValidationError({self.cursor_query_param: self.ordering_conflict_message})
+
+    def get_position(self, obj):
+        """Позиция записи в порядке сортировки (сохраняется в курсоре)"""
+        return obj.created_at, obj.pk
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def get_position_filter(self, created_at, pk):
+        """Условие "строго после" позиции курсора в порядке сортировки"""
+        if self.ordering[0].startswith('-'):
+            return Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+        return Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            padding = '=' * (-len(encoded) % 4)
+            raw = base64.urlsafe_b64decode(encoded + padding).decode('utf-8')
+            return self.parse_position(raw)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def parse_position(self, raw):
+        """Разбирает позицию из строки курсора; ValueError - неверный курсор"""
+        created_at, pk = raw.rsplit('|', 1)
+        created_at = parse_datetime(created_at)
+        if created_at is None:
+            raise ValueError(raw)
+        return created_at, int(pk)
+
+    def format_position(self, position):
+        created_at, pk = position
+        return f'{created_at.isoformat()}|{pk}'
+
+    def encode_cursor(self, position):
+        raw = self.format_position(position)
+        return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+    def get_next_link(self):
+        if not self.has_next or self.last_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.last_position))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class CommentKeysetPagination(KeysetPagination):
+    """Курсорная пагинация комментариев: от старых к новым"""
+    ordering = ('created_at', 'id')
+
+
+class UserSearchPagination(KeysetPagination):
+    """
+    Курсорная пагинация справочника пользователей по
+    (match_rank, username, id): сначала лучшие совпадения, внутри
+    одного ранга - по логину
+    """
+    ordering = ('match_rank', 'username', 'id')
+    page_size = 20
+
+    def get_position(self, obj):
+        return obj.match_rank, obj.username, obj.pk
+
+    def get_position_filter(self, match_rank, username, pk):
+        return (
+            Q(match_rank__gt=match_rank)
+            | Q(match_rank=match_rank, username__gt=username)
+            | Q(match_rank=match_rank, username=username, id__gt=pk)
+        )
+
+    def parse_position(self, raw):
+        # Логин может содержать разделитель, поэтому он разбирается последним
+        match_rank, rest = raw.split('|', 1)
+        username, pk = rest.rsplit('|', 1)
+        return int(match_rank), username, int(pk)
+
+    def format_position(self, position):
+        match_rank, username, pk = position
+        return f'{match_rank}|{username}|{pk}'
+
+
+class KeysetOrPageNumberPagination(PageNumberPagination):
+    """
+    Постраничная пагинация по умолчанию с переключением на курсорную,
+    если клиент передал параметр ?cursor=. Существующие клиенты,
+    использующие ?page=, продолжают работать без изменений
+    """
+    keyset_class = KeysetPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.keyset_class.is_requested(request):
+            self.keyset = self.keyset_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
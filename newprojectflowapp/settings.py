@@ -22,6 +22,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     # Сторонние приложения
     'rest_framework',
@@ -34,6 +35,7 @@ INSTALLED_APPS = [
     'tasks',
     'calendar_integration',
     'analytics',
+    'realtime',
 ]
 
 MIDDLEWARE = [
@@ -152,6 +154,74 @@ CSRF_TRUSTED_ORIGINS = ['http://localhost:8000', 'http://127.0.0.1:8000']
 GOOGLE_CLIENT_ID = config('GOOGLE_CLIENT_ID')
 GOOGLE_CLIENT_SECRET = config('GOOGLE_CLIENT_SECRET')
 GOOGLE_REDIRECT_URI = config('GOOGLE_REDIRECT_URI')
+GOOGLE_TOKEN_URI = config('GOOGLE_TOKEN_URI', default='https://oauth2.googleapis.com/token')
+# Адрес Calendar API (пусто - адрес из описания API; в тестах - локальный сервер)
+GOOGLE_CALENDAR_API_ENDPOINT = config('GOOGLE_CALENDAR_API_ENDPOINT', default='')
+
+# Клиенты Calendar API (calendar_integration/clients.py): размер LRU-кэша
+# на поток и за сколько секунд до истечения токены обновляются заранее
+# (manage.py refresh_calendar_tokens, запускать периодически)
+CALENDAR_CLIENT_CACHE_SIZE = int(config('CALENDAR_CLIENT_CACHE_SIZE', default=256))
+CALENDAR_TOKEN_REFRESH_MARGIN = int(config('CALENDAR_TOKEN_REFRESH_MARGIN', default=900))
+
+# Очередь синхронизации с Google Calendar (calendar_integration.CalendarSyncJob):
+# число попыток, экспоненциальная задержка повтора и время, через которое
+# задание упавшего воркера забирается повторно
+CALENDAR_SYNC_MAX_ATTEMPTS = int(config('CALENDAR_SYNC_MAX_ATTEMPTS', default=5))
+CALENDAR_SYNC_BACKOFF_SECONDS = int(config('CALENDAR_SYNC_BACKOFF_SECONDS', default=30))
+CALENDAR_SYNC_BACKOFF_MAX_SECONDS = int(config('CALENDAR_SYNC_BACKOFF_MAX_SECONDS', default=3600))
+CALENDAR_SYNC_LOCK_TIMEOUT = int(config('CALENDAR_SYNC_LOCK_TIMEOUT', default=300))
+# Окно автосинхронизации: правки задачи за это время выгружаются одним запросом
+CALENDAR_AUTO_SYNC_WINDOW = int(config('CALENDAR_AUTO_SYNC_WINDOW', default=60))
+
+# Пакетная выгрузка задач: операций в одном пакетном запросе к Calendar API
+CALENDAR_BATCH_SIZE = int(config('CALENDAR_BATCH_SIZE', default=50))
+
+# Квота запросов к Calendar API на пользователя (token bucket, calendar_integration/quota.py):
+# операций в секунду и максимальный всплеск (состояние - в таблице CalendarQuota)
+CALENDAR_QUOTA_RATE = float(config('CALENDAR_QUOTA_RATE', default=10))
+CALENDAR_QUOTA_BURST = int(config('CALENDAR_QUOTA_BURST', default=50))
+
+# Сколько дней хранится журнал изменений проектов для инкрементальной синхронизации
+PROJECT_CHANGES_RETENTION_DAYS = int(config('PROJECT_CHANGES_RETENTION_DAYS', default=30))
+
+# Кэш (по умолчанию локальная память процесса; в production - общий бэкенд, например Redis)
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default=''),
+    }
+}
+
+# Кэш результатов аналитики: записи устаревают по версии проекта,
+# таймаут нужен только для уборки неиспользуемых записей.
+# Только общий для процессов бэкенд: новая версия проекта в локальной
+# памяти не дошла бы до других процессов. По умолчанию отключен
+ANALYTICS_CACHE_ALIAS = config('ANALYTICS_CACHE_ALIAS', default='')
+ANALYTICS_CACHE_TIMEOUT = int(config('ANALYTICS_CACHE_TIMEOUT', default=86400))
+
+# Кэш наборов участия пользователей (ID проектов) между запросами.
+# Только общий для процессов бэкенд (Redis, Memcached): сброс при изменении
+# участников не дошел бы до локальной памяти других процессов.
+# По умолчанию отключен - набор запоминается только на время запроса
+MEMBERSHIP_CACHE_ALIAS = config('MEMBERSHIP_CACHE_ALIAS', default='')
+MEMBERSHIP_CACHE_TIMEOUT = int(config('MEMBERSHIP_CACHE_TIMEOUT', default=300))
+
+# Кэш страниц поиска по справочнику пользователей (отдельно для каждого
+# пользователя); сбрасывается при изменении пользователей и участников.
+# Только общий для процессов бэкенд, по умолчанию отключен
+USER_SEARCH_CACHE_ALIAS = config('USER_SEARCH_CACHE_ALIAS', default='')
+USER_SEARCH_CACHE_TIMEOUT = int(config('USER_SEARCH_CACHE_TIMEOUT', default=300))
+
+# Push-канал событий проектов (realtime).
+# InProcessBroker - один процесс; PostgresBroker - несколько узлов через LISTEN/NOTIFY
+REALTIME_BROKER = config('REALTIME_BROKER', default='realtime.brokers.InProcessBroker')
+REALTIME_PG_CHANNEL = config('REALTIME_PG_CHANNEL', default='projectflow_events')
+REALTIME_QUEUE_SIZE = int(config('REALTIME_QUEUE_SIZE', default=100))
+REALTIME_HEARTBEAT_SECONDS = int(config('REALTIME_HEARTBEAT_SECONDS', default=15))
+# Как часто открытый поток перепроверяет участие пользователя в проекте
+REALTIME_ACCESS_CHECK_SECONDS = int(config('REALTIME_ACCESS_CHECK_SECONDS', default=30))
+REALTIME_RETRY_MILLISECONDS = 3000
 
 # Настройки для login_required decorator
 LOGIN_URL = '/login/'
@@ -13,6 +13,7 @@ urlpatterns = [
     path('api/tasks/', include('tasks.urls')),
     path('api/calendar/', include('calendar_integration.urls')),
     path('api/analytics/', include('analytics.urls')),
+    path('api/realtime/', include('realtime.urls')),
 
     # Добавляем URL-схемы для браузерного API
     path('api-auth/', include('rest_framework.urls')),
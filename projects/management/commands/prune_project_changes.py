@@ -0,0 +1,27 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from projects.models import ProjectChange
+
+
+class Command(BaseCommand):
+    """
+    Удаляет устаревшие записи журнала изменений проектов.
+    Клиенты с токенами старше срока хранения получают 410 и выполняют
+    полную синхронизацию
+    """
+    help = 'Удаляет записи журнала изменений проектов старше срока хранения'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=settings.PROJECT_CHANGES_RETENTION_DAYS,
+            help='Срок хранения записей в днях'
+        )
+
+    def handle(self, *args, **options):
+        border = timezone.now() - timedelta(days=options['days'])
+        deleted, _ = ProjectChange.objects.filter(created_at__lt=border).delete()
+        self.stdout.write(self.style.SUCCESS(f'Удалено записей журнала: {deleted}'))
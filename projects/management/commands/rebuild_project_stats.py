@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from projects.models import ProjectStats
+
+
+class Command(BaseCommand):
+    """
+    Пересчитывает или проверяет счетчики задач проектов (ProjectStats),
+    например после массового редактирования задач через SQL
+    """
+    help = 'Пересчитывает счетчики задач проектов по статусам'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--project',
+            type=int,
+            action='append',
+            dest='project_ids',
+            help='ID проекта (можно указать несколько раз)'
+        )
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только проверить расхождения, не исправляя их'
+        )
+
+    def handle(self, *args, **options):
+        check_only = options['check']
+        drift = ProjectStats.rebuild(
+            project_ids=options['project_ids'],
+            dry_run=check_only
+        )
+
+        for project_id, status, current, expected in drift:
+            self.stdout.write(
+                f"Проект {project_id}, статус «{status}»: {current} -> {expected}"
+            )
+
+        if not drift:
+            self.stdout.write(self.style.SUCCESS('Расхождений не найдено'))
+        elif check_only:
+            # Ненулевой код возврата позволяет использовать проверку в мониторинге
+            self.stderr.write(self.style.ERROR(f'Найдено расхождений: {len(drift)}'))
+            raise SystemExit(1)
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Исправлено расхождений: {len(drift)}'))
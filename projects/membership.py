@@ -0,0 +1,98 @@
+"""
+Набор участия пользователя - ID проектов, в которых он состоит.
+
+Набор загружается одним запросом и запоминается на время запроса
+(в объекте HttpRequest). Между запросами он кэшируется, только если
+MEMBERSHIP_CACHE_ALIAS указывает на общий для всех процессов кэш:
+изменение участников проекта (сигнал m2m_changed в projects/models.py)
+удаляет записи затронутых пользователей, и в локальном кэше другого
+процесса отозванный доступ сохранился бы до истечения таймаута.
+"""
+from django.conf import settings
+from django.db import transaction
+from newprojectflowapp.caches import get_shared_cache
+
+MEMBERSHIP_KEY = 'membership:user:{}'
+
+
+def get_cache():
+    """Общий кэш наборов участия или None, если кэш между запросами отключен"""
+    return get_shared_cache('MEMBERSHIP_CACHE_ALIAS')
+
+
+def _get_request_memo(request):
+    # DRF Request оборачивает HttpRequest: храним набор в исходном запросе,
+    # чтобы его видели и представления Django, и сериализаторы DRF
+    request = getattr(request, '_request', request)
+    memo = getattr(request, '_member_project_ids', None)
+    if memo is None:
+        memo = request._member_project_ids = {}
+    return memo
+
+
+def get_member_project_ids(user, request=None):
+    """
+    Возвращает frozenset ID проектов пользователя (объект или ID).
+    С request набор запоминается до конца запроса
+    """
+    user_id = getattr(user, 'pk', user)
+    if user_id is None:
+        return frozenset()
+
+    memo = _get_request_memo(request) if request is not None else None
+    if memo is not None and user_id in memo:
+        return memo[user_id]
+
+    cache = get_cache()
+    key = MEMBERSHIP_KEY.format(user_id)
+    project_ids = cache.get(key) if cache is not None else None
+    if project_ids is None:
+        from .models import Project
+        project_ids = frozenset(
+            Project.members.through.objects.filter(user_id=user_id).values_list('project_id', flat=True)
+        )
+        if cache is not None:
+            cache.set(key, project_ids, timeout=settings.MEMBERSHIP_CACHE_TIMEOUT)
+
+    if memo is not None:
+        memo[user_id] = project_ids
+    return project_ids
+
+
+def is_project_member(user, project_id, request=None):
+    """Проверяет, состоит ли пользователь в проекте"""
+    try:
+        project_id = int(project_id)
+    except (TypeError, ValueError):
+        return False
+    return project_id in get_member_project_ids(user, request)
+
+
+def filter_by_membership(queryset, user, request=None, project_field='project'):
+    """
+    Ограничивает queryset проектами пользователя. Для проектов
+    фильтрует по первичному ключу, для остальных моделей - по полю
+    project_field. Вместо JOIN с таблицей участников - условие IN
+    """
+    project_ids = get_member_project_ids(user, request)
+    if queryset.model._meta.label == 'projects.Project':
+        return queryset.filter(pk__in=project_ids)
+    return queryset.filter(**{f'{project_field}_id__in': project_ids})
+
+
+def invalidate_memberships(user_ids):
+    """
+    Удаляет закэшированные наборы пользователей сразу и еще раз после
+    фиксации транзакции: читатель, загрузивший набор до фиксации,
+    мог успеть записать в кэш старое значение
+    """
+    cache = get_cache()
+    if cache is None:
+        return
+
+    keys = [MEMBERSHIP_KEY.format(user_id) for user_id in set(user_ids) if user_id is not None]
+    if not keys:
+        return
+
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
@@ -0,0 +1,70 @@
+# Generated by Django 5.0.4 on 2026-10-18 19:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_project_stats(apps, schema_editor):
+    """Заполняет счетчики по уже существующим задачам"""
+    Task = apps.get_model("tasks", "Task")
+    ProjectStats = apps.get_model("projects", "ProjectStats")
+
+    ProjectStats.objects.bulk_create(
+        [
+            ProjectStats(
+                project_id=item["project_id"],
+                status=item["status"],
+                task_count=item["count"],
+            )
+            for item in Task.objects.values("project_id", "status").annotate(
+                count=Count("id")
+            )
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("projects", "0001_initial"),
+        ("tasks", "0002_task_priority_comment"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProjectStats",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("status", models.CharField(max_length=20, verbose_name="Статус")),
+                (
+                    "task_count",
+                    models.IntegerField(default=0, verbose_name="Количество задач"),
+                ),
+                (
+                    "project",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="stats",
+                        to="projects.project",
+                        verbose_name="Проект",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Счетчик задач проекта",
+                "verbose_name_plural": "Счетчики задач проектов",
+                "unique_together": {("project", "status")},
+            },
+        ),
+        migrations.RunPython(populate_project_stats, migrations.RunPython.noop),
+    ]
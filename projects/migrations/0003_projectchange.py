@@ -0,0 +1,74 @@
+# Generated by Django 5.0.4 on 2026-10-18 19:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("projects", "0002_projectstats"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProjectChange",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("task", "Задача"),
+                            ("comment", "Комментарий"),
+                            ("member", "Участник"),
+                            ("project", "Проект"),
+                        ],
+                        max_length=10,
+                        verbose_name="Тип объекта",
+                    ),
+                ),
+                ("object_id", models.BigIntegerField(verbose_name="ID объекта")),
+                (
+                    "action",
+                    models.CharField(
+                        choices=[("upsert", "Изменение"), ("delete", "Удаление")],
+                        max_length=10,
+                        verbose_name="Действие",
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        auto_now_add=True, db_index=True, verbose_name="Дата изменения"
+                    ),
+                ),
+                (
+                    "project",
+                    models.ForeignKey(
+                        db_constraint=False,
+                        db_index=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="changes",
+                        to="projects.project",
+                        verbose_name="Проект",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Изменение проекта",
+                "verbose_name_plural": "Изменения проектов",
+                "indexes": [
+                    models.Index(fields=["project", "id"], name="project_change_seq")
+                ],
+            },
+        ),
+    ]
@@ -1,5 +1,12 @@
-from django.db import models
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.db import models, transaction
+from django.db.models import Count, F
+from django.db.models.signals import post_save, pre_delete, m2m_changed
+from django.dispatch import receiver
 from django.contrib.auth.models import User
+from .membership import invalidate_memberships
 
 
 class Project(models.Model):
@@ -37,17 +44,343 @@ class Project(models.Model):
     def __str__(self):
         return self.name
 
+    def get_member_ids(self):
+        """Множество ID участников проекта"""
+        return set(
+            Project.members.through.objects.filter(project_id=self.id).values_list('user_id', flat=True)
+        )
+
+    def set_members(self, user_ids):
+        """
+        Приводит состав участников к user_ids (создатель остается всегда;
+        несуществующие ID пропускаются). Изменения вычисляются разностью
+        множеств и применяются одним INSERT и одним DELETE.
+        Возвращает (добавленные ID, удаленные ID)
+        """
+        target = set(User.objects.filter(id__in=set(user_ids)).values_list('id', flat=True))
+        target.add(self.created_by_id)
+        current = self.get_member_ids()
+        return self.apply_member_changes(target - current, current - target)
+
+    def update_members(self, add_ids=(), remove_ids=()):
+        """
+        Добавляет и удаляет участников пакетом. Уже состоящие и
+        несуществующие пользователи при добавлении пропускаются,
+        создатель при удалении не затрагивается.
+        Возвращает (добавленные ID, удаленные ID)
+        """
+        current = self.get_member_ids()
+        to_add = set(add_ids) - current
+        if to_add:
+            to_add = set(User.objects.filter(id__in=to_add).values_list('id', flat=True))
+        to_remove = (set(remove_ids) & current) - {self.created_by_id}
+        return self.apply_member_changes(to_add, to_remove)
+
+    def apply_member_changes(self, to_add, to_remove):
+        # members.add/remove с набором ID - один запрос на операцию
+        # и один сигнал m2m_changed (журнал изменений, кэши участия)
+        with transaction.atomic(), ProjectChange.collect():
+            if to_add:
+                self.members.add(*to_add)
+            if to_remove:
+                self.members.remove(*to_remove)
+        return sorted(to_add), sorted(to_remove)
+
+    def get_status_counts(self):
+        """Получить количество задач проекта по статусам из счетчиков"""
+        # stats.all() использует prefetch_related, если он был выполнен
+        return {stat.status: stat.task_count for stat in self.stats.all()}
+
     def get_task_count(self):
         """Получить количество задач в проекте"""
-        return self.tasks.count()
+        return sum(self.get_status_counts().values())
 
     def get_completed_task_count(self):
         """Получить количество завершенных задач"""
-        return self.tasks.filter(status='Завершена').count()
+        return self.get_status_counts().get('Завершена', 0)
 
     def get_progress_percentage(self):
         """Получить процент выполнения проекта"""
-        total = self.get_task_count()
+        counts = self.get_status_counts()
+        total = sum(counts.values())
         if total == 0:
             return 0
-        return int((self.get_completed_task_count() / total) * 100)
\ No newline at end of file
+        return int((counts.get('Завершена', 0) / total) * 100)
+
+
+# Изменения счетчиков, накапливаемые внутри ProjectStats.collect_deltas()
+_pending_stats_deltas = ContextVar('pending_stats_deltas', default=None)
+
+
+class ProjectStats(models.Model):
+    """
+    Денормализованные счетчики задач проекта по статусам.
+    Обновляются в одной транзакции с созданием, удалением
+    и сменой статуса задачи
+    """
+    project = models.ForeignKey(
+        Project,
+        on_delete=models.CASCADE,
+        related_name='stats',
+        verbose_name="Проект"
+    )
+    status = models.CharField(max_length=20, verbose_name="Статус")
+    task_count = models.IntegerField(default=0, verbose_name="Количество задач")
+
+    class Meta:
+        verbose_name = "Счетчик задач проекта"
+        verbose_name_plural = "Счетчики задач проектов"
+        unique_together = ('project', 'status')
+
+    def __str__(self):
+        return f"{self.project_id}: {self.status} = {self.task_count}"
+
+    @classmethod
+    def apply_deltas(cls, deltas):
+        """
+        Применяет изменения счетчиков вида {(project_id, status): delta}
+        """
+        # Внутри collect_deltas() изменения только накапливаются
+        pending = _pending_stats_deltas.get()
+        if pending is not None:
+            pending.update(deltas)
+            return
+
+        with transaction.atomic():
+            for (project_id, status), delta in deltas.items():
+                if not delta:
+                    continue
+
+                updated = cls.objects.filter(
+                    project_id=project_id,
+                    status=status
+                ).update(task_count=F('task_count') + delta)
+
+                # Строку счетчика создаем только при увеличении: при каскадном
+                # удалении проекта счетчики уже удалены вместе с ним
+                if not updated and delta > 0:
+                    stat, created = cls.objects.get_or_create(
+                        project_id=project_id,
+                        status=status,
+                        defaults={'task_count': delta}
+                    )
+                    if not created:
+                        cls.objects.filter(pk=stat.pk).update(task_count=F('task_count') + delta)
+
+    @classmethod
+    @contextmanager
+    def collect_deltas(cls):
+        """
+        Накапливает изменения счетчиков внутри блока и применяет их
+        одним пакетом в конце (например, при массовом удалении задач,
+        когда сигналы срабатывают для каждой строки)
+        """
+        if _pending_stats_deltas.get() is not None:
+            yield
+            return
+
+        pending = Counter()
+        token = _pending_stats_deltas.set(pending)
+        try:
+            yield
+        finally:
+            _pending_stats_deltas.reset(token)
+        cls.apply_deltas(pending)
+
+    @classmethod
+    def rebuild(cls, project_ids=None, dry_run=False):
+        """
+        Пересчитывает счетчики по таблице задач.
+        Возвращает список расхождений (project_id, status, было, стало)
+        """
+        from tasks.models import Task
+
+        tasks = Task.objects.all()
+        stats = cls.objects.all()
+        if project_ids:
+            tasks = tasks.filter(project_id__in=project_ids)
+            stats = stats.filter(project_id__in=project_ids)
+
+        actual = {
+            (item['project_id'], item['status']): item['count']
+            for item in tasks.values('project_id', 'status').annotate(count=Count('id'))
+        }
+
+        with transaction.atomic():
+            stored = {
+                (stat.project_id, stat.status): stat
+                for stat in stats.select_for_update()
+            }
+
+            drift = []
+            for key in sorted(set(actual) | set(stored)):
+                expected = actual.get(key, 0)
+                stat = stored.get(key)
+                current = stat.task_count if stat else 0
+                if current != expected:
+                    drift.append((key[0], key[1], current, expected))
+
+            if dry_run or not drift:
+                return drift
+
+            for project_id, status, current, expected in drift:
+                stat = stored.get((project_id, status))
+                if stat is None:
+                    cls.objects.create(project_id=project_id, status=status, task_count=expected)
+                elif expected == 0:
+                    stat.delete()
+                else:
+                    stat.task_count = expected
+                    stat.save(update_fields=['task_count'])
+
+        return drift
+
+
+# Записи журнала, накапливаемые внутри ProjectChange.collect()
+_pending_changes = ContextVar('pending_project_changes', default=None)
+
+
+class ProjectChange(models.Model):
+    """
+    Журнал изменений проекта для инкрементальной синхронизации.
+    Автоинкрементный id служит последовательностью изменений:
+    клиент получает только записи с id больше, чем в его токене
+    """
+    KIND_TASK = 'task'
+    KIND_COMMENT = 'comment'
+    KIND_MEMBER = 'member'
+    KIND_PROJECT = 'project'
+    KIND_CHOICES = (
+        (KIND_TASK, 'Задача'),
+        (KIND_COMMENT, 'Комментарий'),
+        (KIND_MEMBER, 'Участник'),
+        (KIND_PROJECT, 'Проект'),
+    )
+
+    ACTION_UPSERT = 'upsert'
+    ACTION_DELETE = 'delete'
+    ACTION_CHOICES = (
+        (ACTION_UPSERT, 'Изменение'),
+        (ACTION_DELETE, 'Удаление'),
+    )
+
+    # Без ограничения внешнего ключа: записи о каскадном удалении задач
+    # удаляемого проекта не должны мешать удалению, а старые записи
+    # удаляет команда prune_project_changes
+    project = models.ForeignKey(
+        Project,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='changes',
+        db_index=False,
+        verbose_name="Проект"
+    )
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, verbose_name="Тип объекта")
+    object_id = models.BigIntegerField(verbose_name="ID объекта")
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES, verbose_name="Действие")
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name="Дата изменения")
+
+    class Meta:
+        verbose_name = "Изменение проекта"
+        verbose_name_plural = "Изменения проектов"
+        indexes = [
+            models.Index(fields=['project', 'id'], name='project_change_seq'),
+        ]
+
+    def __str__(self):
+        return f"{self.project_id}: {self.kind} {self.object_id} {self.action}"
+
+    @classmethod
+    def record(cls, project_id, kind, object_ids, action=ACTION_UPSERT):
+        """Добавляет в журнал записи об изменении объектов одного типа"""
+        if project_id is None:
+            return
+
+        changes = [
+            cls(project_id=project_id, kind=kind, object_id=object_id, action=action)
+            for object_id in object_ids
+        ]
+
+        # Внутри collect() записи только накапливаются
+        pending = _pending_changes.get()
+        if pending is not None:
+            pending.extend(changes)
+            return
+
+        cls.objects.bulk_create(changes)
+
+    @classmethod
+    @contextmanager
+    def collect(cls):
+        """
+        Накапливает записи журнала внутри блока и добавляет их
+        одним INSERT в конце (например, при массовом удалении задач)
+        """
+        if _pending_changes.get() is not None:
+            yield
+            return
+
+        pending = []
+        token = _pending_changes.set(pending)
+        try:
+            yield
+        finally:
+            _pending_changes.reset(token)
+        cls.objects.bulk_create(pending, batch_size=1000)
+
+
+# Сигналы журнала изменений проекта
+@receiver(post_save, sender=Project)
+def record_project_change(sender, instance, **kwargs):
+    ProjectChange.record(instance.id, ProjectChange.KIND_PROJECT, [instance.id])
+
+
+@receiver(m2m_changed, sender=Project.members.through)
+def record_member_changes(sender, instance, action, reverse, pk_set, **kwargs):
+    # Изменения со стороны пользователя (user.projects.add(...)) тоже учитываем
+    if action == 'pre_clear':
+        if reverse:
+            instance._cleared_project_ids = list(instance.projects.values_list('id', flat=True))
+        else:
+            instance._cleared_member_ids = list(instance.members.values_list('id', flat=True))
+        return
+
+    if action == 'post_clear':
+        if reverse:
+            pairs = [(project_id, instance.id) for project_id in instance._cleared_project_ids]
+        else:
+            pairs = [(instance.id, user_id) for user_id in instance._cleared_member_ids]
+        change_action = ProjectChange.ACTION_DELETE
+    elif action in ('post_add', 'post_remove'):
+        if reverse:
+            pairs = [(project_id, instance.id) for project_id in pk_set]
+        else:
+            pairs = [(instance.id, user_id) for user_id in pk_set]
+        change_action = ProjectChange.ACTION_UPSERT if action == 'post_add' else ProjectChange.ACTION_DELETE
+    else:
+        return
+
+    # Одна пачка записей журнала на весь набор участников
+    with ProjectChange.collect():
+        for project_id, user_id in pairs:
+            ProjectChange.record(project_id, ProjectChange.KIND_MEMBER, [user_id], change_action)
+
+
+# Сигналы кэша наборов участия (projects/membership.py)
+@receiver(m2m_changed, sender=Project.members.through)
+def invalidate_memberships_on_member_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        invalidate_memberships([instance.id])
+    elif action == 'post_clear':
+        # Список участников сохранен обработчиком pre_clear выше
+        invalidate_memberships(instance._cleared_member_ids)
+    else:
+        invalidate_memberships(pk_set or [])
+
+
+@receiver(pre_delete, sender=Project)
+def invalidate_memberships_on_project_delete(sender, instance, **kwargs):
+    # Каскадное удаление участников не отправляет m2m_changed
+    invalidate_memberships(instance.members.values_list('id', flat=True))
@@ -0,0 +1,41 @@
+from rest_framework import permissions
+from rest_framework.exceptions import NotFound
+from .membership import is_project_member
+from .models import Project
+
+
+class IsProjectMember(permissions.IsAuthenticated):
+    """
+    Доступ только участникам проекта. Проект берется из URL (project_id)
+    или из параметра запроса ?project_id=; без проекта достаточно
+    аутентификации. Для объектов проверяется их проект.
+    Проверка выполняется по набору участия, загружаемому один раз за запрос
+    """
+    message = 'У вас нет доступа к этому проекту'
+
+    @staticmethod
+    def get_project_id(request, view):
+        return view.kwargs.get('project_id') or request.query_params.get('project_id')
+
+    def has_permission(self, request, view):
+        if not super().has_permission(request, view):
+            return False
+
+        project_id = self.get_project_id(request, view)
+        if not project_id:
+            return True
+        if is_project_member(request.user, project_id, request):
+            return True
+
+        # Отказ: различаем несуществующий проект и чужой
+        try:
+            exists = Project.objects.filter(id=project_id).exists()
+        except (TypeError, ValueError):
+            exists = False
+        if not exists:
+            raise NotFound('Проект не найден')
+        return False
+
+    def has_object_permission(self, request, view, obj):
+        project_id = obj.pk if isinstance(obj, Project) else obj.project_id
+        return is_project_member(request.user, project_id, request)
@@ -60,26 +60,46 @@ class ProjectCreateSerializer(serializers.ModelSerializer):
             **validated_data
         )
 
-        # Добавляем создателя проекта как участника
-        project.members.add(current_user)
-
-        # Добавляем остальных участников, если они существуют
-        if member_ids:
-            existing_users = User.objects.filter(id__in=member_ids)
-            for user in existing_users:
-                project.members.add(user)
+        # Создатель и остальные участники добавляются одним INSERT
+        project.set_members(member_ids)
 
         return project
 
+
+class ProjectMembersUpdateSerializer(serializers.Serializer):
+    """Сериализатор для пакетного добавления/удаления участников проекта"""
+    MAX_USERS = 1000
+
+    add = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=False,
+        default=list,
+        max_length=MAX_USERS
+    )
+    remove = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=False,
+        default=list,
+        max_length=MAX_USERS
+    )
+
+    def validate(self, attrs):
+        if not attrs['add'] and not attrs['remove']:
+            raise serializers.ValidationError("Необходимо указать пользователей в add или remove")
+        if set(attrs['add']) & set(attrs['remove']):
+            raise serializers.ValidationError("Один пользователь не может быть и в add, и в remove")
+        return attrs
+
+
 class ProjectMemberActionSerializer(serializers.Serializer):
-        """Сериализатор для добавления/удаления участников проекта"""
-        user_id = serializers.IntegerField(required=False)
-        username = serializers.CharField(required=False)
+    """Сериализатор для добавления/удаления одного участника (add_member / remove_member)"""
+    user_id = serializers.IntegerField(required=False)
+    username = serializers.CharField(required=False)
 
-        def validate(self, attrs):
-            if not attrs.get('user_id') and not attrs.get('username'):
-                raise serializers.ValidationError({"error": "Необходимо указать user_id или username"})
-            return attrs
+    def validate(self, attrs):
+        if not attrs.get('user_id') and not attrs.get('username'):
+            raise serializers.ValidationError({"error": "Необходимо указать user_id или username"})
+        return attrs
 
 
 class ProjectUpdateSerializer(serializers.ModelSerializer):
@@ -103,15 +123,9 @@ class ProjectUpdateSerializer(serializers.ModelSerializer):
         instance.description = validated_data.get('description', instance.description)
         instance.save()
 
-        # Обновляем список участников, если он был предоставлен
+        # Обновляем список участников, если он был предоставлен:
+        # меняются только добавленные и удаленные связи, создатель остается
         if member_ids is not None:
-            # Сначала очищаем существующих участников, кроме создателя
-            instance.members.clear()
-            instance.members.add(instance.created_by)
-
-            # Добавляем новых участников
-            existing_users = User.objects.filter(id__in=member_ids)
-            for user in existing_users:
-                instance.members.add(user)
+            instance.set_members(member_ids)
 
         return instance
\ No newline at end of file
@@ -0,0 +1,240 @@
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+from tasks.models import Task, Comment
+from tasks.serializers import TaskSerializer, CommentSerializer
+from .models import Project, ProjectChange
+from .membership import is_project_member
+from .serializers import ProjectMemberSerializer
+
+
+class KanbanService:
+    """
+    Сервис для построения канбан-доски проекта
+    """
+
+    @staticmethod
+    def get_board_queryset(project):
+        """
+        Возвращает все задачи проекта одним запросом вместе со связанными
+        данными, которые нужны TaskSerializer
+        """
+        return Task.objects.filter(
+            project=project
+        ).select_related(
+            'project', 'assignee', 'created_by'
+        ).defer(
+            'search_vector'
+        )
+
+    @staticmethod
+    def build_board(project):
+        """
+        Строит канбан-доску: задачи загружаются одним запросом
+        в порядке рангов и группируются по статусам уже в Python
+        """
+        # Создаем пустые колонки в порядке статусов
+        columns = {status_key: [] for status_key, _ in Task.STATUS_CHOICES}
+
+        # Распределяем задачи по колонкам
+        for task in KanbanService.get_board_queryset(project).order_by('rank', 'id'):
+            columns.setdefault(task.status, []).append(task)
+
+        # Формируем структуру данных для канбан-доски
+        kanban_data = {}
+        for status_key, status_name in Task.STATUS_CHOICES:
+            kanban_data[status_key] = {
+                'name': status_name,
+                'tasks': TaskSerializer(columns[status_key], many=True).data
+            }
+
+        return kanban_data
+
+
+class SyncTokenExpired(Exception):
+    """Токен синхронизации устарел: журнал изменений за этот период уже очищен"""
+
+
+class SyncService:
+    """
+    Сервис инкрементальной синхронизации проекта ("изменения с момента").
+    Токен синхронизации - подписанная пара (ID проекта, ID последнего
+    полученного изменения из журнала ProjectChange)
+    """
+    TOKEN_SALT = 'projects.sync'
+
+    # Максимальное количество записей журнала за один запрос
+    MAX_CHANGES = 500
+
+    # Записи моложе этого интервала выдаются повторно в следующем ответе:
+    # транзакция, получившая меньший id, могла зафиксироваться позже
+    SETTLE_INTERVAL = timedelta(seconds=5)
+
+    @staticmethod
+    def make_token(project_id, change_id):
+        return signing.dumps([project_id, change_id], salt=SyncService.TOKEN_SALT)
+
+    @staticmethod
+    def read_token(project_id, token):
+        """
+        Возвращает ID последнего полученного изменения.
+        Токен живет меньше, чем хранятся записи журнала
+        """
+        max_age = timedelta(days=settings.PROJECT_CHANGES_RETENTION_DAYS) - timedelta(hours=1)
+        try:
+            token_project_id, change_id = signing.loads(
+                token, salt=SyncService.TOKEN_SALT, max_age=max_age
+            )
+        except signing.SignatureExpired:
+            raise SyncTokenExpired()
+        except (signing.BadSignature, TypeError, ValueError):
+            raise ValueError('Неверный токен синхронизации')
+
+        if token_project_id != project_id:
+            raise ValueError('Токен выдан для другого проекта')
+        return change_id
+
+    @staticmethod
+    def get_current_token(project):
+        """Токен, соответствующий текущему состоянию проекта"""
+        last_id = ProjectChange.objects.filter(
+            project=project
+        ).order_by('-id').values_list('id', flat=True).first()
+        return SyncService.make_token(project.id, last_id or 0)
+
+    @staticmethod
+    def get_changes(project, since_id):
+        """
+        Возвращает объекты, измененные после since_id, и записи
+        об удалении (tombstones). Объем ответа пропорционален числу изменений
+        """
+        changes = list(
+            ProjectChange.objects.filter(
+                project=project,
+                id__gt=since_id
+            ).order_by('id').values('id', 'kind', 'object_id', 'action', 'created_at')[:SyncService.MAX_CHANGES + 1]
+        )
+        has_more = len(changes) > SyncService.MAX_CHANGES
+        changes = changes[:SyncService.MAX_CHANGES]
+
+        # Для каждого объекта важно только последнее действие
+        latest = {}
+        for change in changes:
+            latest[(change['kind'], change['object_id'])] = change['action']
+
+        # Токен продвигается только до "устоявшихся" записей
+        next_id = since_id
+        settled_before = timezone.now() - SyncService.SETTLE_INTERVAL
+        for change in changes:
+            if change['created_at'] > settled_before and not has_more:
+                break
+            next_id = change['id']
+
+        def ids(kind, action):
+            return [object_id for (k, object_id), a in latest.items() if k == kind and a == action]
+
+        # Текущее состояние измененных задач (одним запросом, как для доски)
+        task_ids = ids(ProjectChange.KIND_TASK, ProjectChange.ACTION_UPSERT)
+        tasks = list(KanbanService.get_board_queryset(project).filter(id__in=task_ids)) if task_ids else []
+        found_task_ids = {task.id for task in tasks}
+
+        comment_ids = ids(ProjectChange.KIND_COMMENT, ProjectChange.ACTION_UPSERT)
+        comments = list(
+            Comment.objects.filter(id__in=comment_ids, task__project=project).select_related('author')
+        ) if comment_ids else []
+        found_comment_ids = {comment.id for comment in comments}
+
+        member_ids = ids(ProjectChange.KIND_MEMBER, ProjectChange.ACTION_UPSERT)
+        members = list(User.objects.filter(id__in=member_ids, projects=project)) if member_ids else []
+        found_member_ids = {member.id for member in members}
+
+        # Объекты, которых уже нет в проекте, передаются как удаленные
+        deleted_tasks = ids(ProjectChange.KIND_TASK, ProjectChange.ACTION_DELETE)
+        deleted_tasks += [task_id for task_id in task_ids if task_id not in found_task_ids]
+        deleted_comments = ids(ProjectChange.KIND_COMMENT, ProjectChange.ACTION_DELETE)
+        deleted_comments += [comment_id for comment_id in comment_ids if comment_id not in found_comment_ids]
+        removed_members = ids(ProjectChange.KIND_MEMBER, ProjectChange.ACTION_DELETE)
+        removed_members += [user_id for user_id in member_ids if user_id not in found_member_ids]
+
+        result = {
+            'sync_token': SyncService.make_token(project.id, next_id),
+            'has_more': has_more,
+            'tasks': TaskSerializer(tasks, many=True).data,
+            'deleted_tasks': deleted_tasks,
+            'comments': CommentSerializer(comments, many=True).data,
+            'deleted_comments': deleted_comments,
+            'members': ProjectMemberSerializer(members, many=True).data,
+            'removed_members': removed_members,
+            'project': None,
+        }
+
+        # Краткие данные проекта (название, прогресс) передаются при любых изменениях
+        if latest:
+            result['project'] = {
+                'id': project.id,
+                'name': project.name,
+                'description': project.description,
+                'progress_percentage': project.get_progress_percentage(),
+                'task_count': project.get_task_count(),
+            }
+
+        return result
+
+
+class ProjectVersionService:
+    """
+    Штамп версии проекта для условных запросов (ETag).
+    Версия - ID последней записи журнала изменений проекта: любая запись
+    задач, комментариев, участников или самого проекта попадает в журнал
+    """
+
+    @staticmethod
+    def annotate_versions(queryset):
+        """Добавляет к проектам поле version одним запросом"""
+        last_change = ProjectChange.objects.filter(project=OuterRef('pk')).order_by('-id')
+        return queryset.annotate(version=Subquery(last_change.values('id')[:1]))
+
+    @staticmethod
+    def get_project_stamp(user, project_id, with_overdue=False, request=None):
+        """
+        Возвращает штамп проекта, доступного пользователю, или None.
+        with_overdue учитывает момент, когда задача последней стала
+        просроченной: is_overdue меняется со временем без записи в базу
+        """
+        if not is_project_member(user, project_id, request):
+            return None
+
+        queryset = ProjectVersionService.annotate_versions(
+            Project.objects.filter(pk=project_id)
+        )
+        fields = ['id', 'version']
+
+        if with_overdue:
+            queryset = queryset.annotate(
+                overdue_since=Subquery(
+                    Task.objects.filter(
+                        project=OuterRef('pk'),
+                        due_date__lt=timezone.now()
+                    ).exclude(
+                        status='Завершена'
+                    ).order_by('-due_date').values('due_date')[:1]
+                )
+            )
+            fields.append('overdue_since')
+
+        stamp = queryset.values(*fields).first()
+        if stamp is None:
+            return None
+
+        return {'parts': [stamp['id'], stamp['version'] or 0, stamp.get('overdue_since')]}
+
+    @staticmethod
+    def get_projects_stamp(projects):
+        """Общий штамп для набора проектов (например, всех проектов пользователя)"""
+        stamps = list(
+            ProjectVersionService.annotate_versions(projects).order_by('id').values_list('id', 'version')
+        )
+        return {'parts': [f'{project_id}.{version or 0}' for project_id, version in stamps]}
@@ -1,3 +1,566 @@
-from django.test import TestCase
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.http import http_date
+from rest_framework.test import APIClient
+from tasks.models import Task, Comment
+from .models import Project, ProjectStats, ProjectChange
+from .membership import MEMBERSHIP_KEY, get_member_project_ids, is_project_member
 
-# Create your tests here.
+
+class KanbanQueryCountTest(TestCase):
+    """
+    Регрессионный тест: количество запросов канбан-доски
+    не должно зависеть от количества задач
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='owner', password='password')
+        self.assignee = User.objects.create_user(username='assignee', password='password')
+        self.project = Project.objects.create(name='Доска', created_by=self.user)
+        self.project.members.add(self.user, self.assignee)
+
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def create_tasks(self, count):
+        """Создает задачи во всех колонках доски вместе с комментариями"""
+        statuses = [status_key for status_key, _ in Task.STATUS_CHOICES]
+        for index in range(count):
+            task = Task.objects.create(
+                title=f'Задача {index}',
+                project=self.project,
+                status=statuses[index % len(statuses)],
+                assignee=self.assignee,
+                created_by=self.user
+            )
+            Comment.objects.create(task=task, author=self.user, text='Комментарий')
+
+    def count_kanban_queries(self):
+        """Возвращает количество SQL-запросов одного запроса к доске"""
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(f'/api/projects/{self.project.id}/kanban/')
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries), response.json()
+
+    def test_query_count_does_not_grow_with_board_size(self):
+        self.create_tasks(4)
+        small_count, _ = self.count_kanban_queries()
+
+        self.create_tasks(40)
+        large_count, data = self.count_kanban_queries()
+
+        self.assertEqual(small_count, large_count)
+        self.assertEqual(sum(len(column['tasks']) for column in data.values()), 44)
+
+    def test_response_shape(self):
+        self.create_tasks(4)
+        _, data = self.count_kanban_queries()
+
+        self.assertEqual(list(data.keys()), [status_key for status_key, _ in Task.STATUS_CHOICES])
+        for status_key, status_name in Task.STATUS_CHOICES:
+            column = data[status_key]
+            self.assertEqual(column['name'], status_name)
+            self.assertEqual(len(column['tasks']), 1)
+
+            task = column['tasks'][0]
+            self.assertEqual(task['status'], status_key)
+            self.assertEqual(task['project_name'], 'Доска')
+            self.assertEqual(task['assignee']['username'], 'assignee')
+            self.assertEqual(task['created_by']['username'], 'owner')
+            self.assertEqual(task['comments_count'], 1)
+
+
+class ProjectStatsTest(TestCase):
+    """Счетчики задач проекта по статусам (ProjectStats)"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='owner', password='password')
+        self.project = Project.objects.create(name='Проект', created_by=self.user)
+        self.project.members.add(self.user)
+
+    def create_task(self, status='Новая', project=None):
+        return Task.objects.create(
+            title='Задача', project=project or self.project, status=status, created_by=self.user
+        )
+
+    def get_counts(self, project=None):
+        project = project or self.project
+        return dict(
+            ProjectStats.objects.filter(project=project, task_count__gt=0).values_list('status', 'task_count')
+        )
+
+    def test_create_and_delete(self):
+        first = self.create_task()
+        self.create_task()
+        self.create_task('Завершена')
+        self.assertEqual(self.get_counts(), {'Новая': 2, 'Завершена': 1})
+
+        first.delete()
+        self.assertEqual(self.get_counts(), {'Новая': 1, 'Завершена': 1})
+
+        Task.objects.filter(project=self.project).delete()
+        self.assertEqual(self.get_counts(), {})
+
+    def test_status_change(self):
+        task = self.create_task()
+        task.status = 'В работе'
+        task.save()
+        self.assertEqual(self.get_counts(), {'В работе': 1})
+
+        # Сохранение без смены статуса не меняет счетчики
+        task.title = 'Другая задача'
+        task.save()
+        self.assertEqual(self.get_counts(), {'В работе': 1})
+
+    def test_save_with_update_fields(self):
+        task = self.create_task()
+        task.status = 'На проверке'
+        task.save(update_fields=['status'])
+        self.assertEqual(self.get_counts(), {'На проверке': 1})
+
+        # Задача, загруженная без поля status, счетчики не трогает
+        deferred = Task.objects.only('id', 'title').get(pk=task.pk)
+        deferred.title = 'Переименована'
+        deferred.save(update_fields=['title'])
+        self.assertEqual(self.get_counts(), {'На проверке': 1})
+
+    def test_move_to_another_project(self):
+        other = Project.objects.create(name='Другой', created_by=self.user)
+        task = self.create_task()
+        task.project = other
+        task.status = 'Завершена'
+        task.save()
+        self.assertEqual(self.get_counts(), {})
+        self.assertEqual(self.get_counts(other), {'Завершена': 1})
+
+    def test_project_progress_reads_counters(self):
+        self.create_task()
+        self.create_task('Завершена')
+        project = Project.objects.prefetch_related('stats').get(pk=self.project.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(project.get_task_count(), 2)
+            self.assertEqual(project.get_completed_task_count(), 1)
+            self.assertEqual(project.get_progress_percentage(), 50)
+
+    def test_rebuild_command(self):
+        self.create_task()
+        self.create_task('Завершена')
+        # Расхождение после правки в обход сигналов
+        Task.objects.filter(project=self.project, status='Новая').update(status='В работе')
+
+        with self.assertRaises(SystemExit) as context:
+            call_command('rebuild_project_stats', '--check', stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(context.exception.code, 1)
+        self.assertEqual(self.get_counts(), {'Новая': 1, 'Завершена': 1})
+
+        call_command('rebuild_project_stats', stdout=StringIO())
+        self.assertEqual(self.get_counts(), {'В работе': 1, 'Завершена': 1})
+        self.assertEqual(ProjectStats.rebuild(), [])
+        call_command('rebuild_project_stats', '--check', stdout=StringIO())
+
+
+class UserStatisticsTest(TestCase):
+    """Статистика пользователя считается одним запросом"""
+
+    def test_statistics_in_one_query(self):
+        user = User.objects.create_user(username='owner', password='password')
+        for index in range(2):
+            project = Project.objects.create(name=f'Проект {index}', created_by=user)
+            project.members.add(user)
+            for status in ('Новая', 'Завершена', 'Завершена'):
+                Task.objects.create(title='Задача', project=project, status=status, assignee=user, created_by=user)
+
+        client = APIClient()
+        client.force_authenticate(user=user)
+        with self.assertNumQueries(1):
+            response = client.get('/api/auth/statistics/')
+        self.assertEqual(response.json(), {'projects_count': 2, 'tasks_count': 6, 'completed_tasks_count': 4})
+
+
+class ProjectChangesTest(TestCase):
+    """Инкрементальная синхронизация проекта (/changes/?since=)"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='owner', password='password')
+        self.project = Project.objects.create(name='Проект', created_by=self.user)
+        self.project.members.add(self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.url = f'/api/projects/{self.project.id}/changes/'
+
+    def get_token(self):
+        data = self.client.get(self.url).json()
+        self.assertTrue(data['full_sync_required'])
+        return data['sync_token']
+
+    def changes(self, token):
+        response = self.client.get(self.url, {'since': token})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def settle(self):
+        # Записи журнала старше интервала "устаивания"
+        ProjectChange.objects.update(created_at=timezone.now() - timedelta(seconds=10))
+
+    def test_changes_since_token(self):
+        token = self.get_token()
+        task = Task.objects.create(title='Задача', project=self.project, created_by=self.user)
+        comment = Comment.objects.create(task=task, author=self.user, text='Комментарий')
+        self.settle()
+
+        data = self.changes(token)
+        self.assertEqual([item['id'] for item in data['tasks']], [task.id])
+        self.assertEqual([item['id'] for item in data['comments']], [comment.id])
+        self.assertEqual(data['project']['task_count'], 1)
+
+        # По новому токену изменений нет
+        data = self.changes(data['sync_token'])
+        self.assertEqual(data['tasks'], [])
+        self.assertIsNone(data['project'])
+
+    def test_deletions_are_tombstones(self):
+        task = Task.objects.create(title='Задача', project=self.project, created_by=self.user)
+        comment = Comment.objects.create(task=task, author=self.user, text='Комментарий')
+        other = Task.objects.create(title='Другая', project=self.project, created_by=self.user)
+        self.settle()
+        token = self.get_token()
+
+        comment_id, other_id = comment.id, other.id
+        comment.delete()
+        other.delete()
+        self.settle()
+        data = self.changes(token)
+        self.assertEqual(data['deleted_tasks'], [other_id])
+        self.assertEqual(data['deleted_comments'], [comment_id])
+        self.assertEqual(data['tasks'], [])
+
+    def test_members(self):
+        token = self.get_token()
+        member = User.objects.create_user(username='member', password='password')
+        self.project.members.add(member)
+        self.settle()
+        data = self.changes(token)
+        self.assertEqual([item['id'] for item in data['members']], [member.id])
+
+        self.project.members.remove(member)
+        self.settle()
+        data = self.changes(data['sync_token'])
+        self.assertEqual(data['removed_members'], [member.id])
+
+    def test_recent_changes_are_delivered_again(self):
+        token = self.get_token()
+        task = Task.objects.create(title='Задача', project=self.project, created_by=self.user)
+
+        # Запись моложе интервала: выдается, но токен не продвигается
+        data = self.changes(token)
+        self.assertEqual([item['id'] for item in data['tasks']], [task.id])
+        self.assertEqual(self.changes(data['sync_token'])['tasks'], data['tasks'])
+
+        self.settle()
+        data = self.changes(data['sync_token'])
+        self.assertEqual(self.changes(data['sync_token'])['tasks'], [])
+
+    def test_invalid_tokens(self):
+        other = Project.objects.create(name='Другой', created_by=self.user)
+        other.members.add(self.user)
+        other_token = self.client.get(f'/api/projects/{other.id}/changes/').json()['sync_token']
+        self.assertEqual(self.client.get(self.url, {'since': other_token}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'since': 'garbage'}).status_code, 400)
+
+        token = self.get_token()
+        with override_settings(PROJECT_CHANGES_RETENTION_DAYS=0):
+            response = self.client.get(self.url, {'since': token})
+        self.assertEqual(response.status_code, 410)
+        self.assertTrue(response.json()['full_sync_required'])
+
+    def test_prune_command(self):
+        Task.objects.create(title='Старая', project=self.project, created_by=self.user)
+        ProjectChange.objects.update(created_at=timezone.now() - timedelta(days=31))
+        Task.objects.create(title='Новая', project=self.project, created_by=self.user)
+        fresh = ProjectChange.objects.filter(created_at__gt=timezone.now() - timedelta(days=1)).count()
+
+        call_command('prune_project_changes', '--days', '30', stdout=StringIO())
+        self.assertEqual(ProjectChange.objects.count(), fresh)
+
+    def test_comment_save_does_not_load_task(self):
+        task = Task.objects.create(title='Задача', project=self.project, created_by=self.user)
+        with CaptureQueriesContext(connection) as context:
+            Comment.objects.create(task=task, author=self.user, text='Комментарий')
+        self.assertFalse([query for query in context.captured_queries if query['sql'].startswith('SELECT')])
+
+        # Без загруженной задачи читается только project_id
+        with CaptureQueriesContext(connection) as context:
+            comment = Comment.objects.create(task_id=task.id, author=self.user, text='Комментарий')
+        selects = [query['sql'] for query in context.captured_queries if query['sql'].startswith('SELECT')]
+        self.assertEqual(len(selects), 1)
+        self.assertEqual(
+            ProjectChange.objects.filter(kind=ProjectChange.KIND_COMMENT, object_id=comment.id).get().project_id,
+            self.project.id
+        )
+
+
+class ConditionalGetTest(TestCase):
+    """Условные запросы (If-None-Match) к проекту, доске и аналитике"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='owner', password='password')
+        self.project = Project.objects.create(name='Проект', created_by=self.user)
+        self.project.members.add(self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def assert_not_modified_until_change(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertFalse(response.has_header('Last-Modified'))
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        # Изменение в ту же секунду тоже меняет ETag
+        Task.objects.create(title='Задача', project=self.project, created_by=self.user)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_project_detail(self):
+        self.assert_not_modified_until_change(f'/api/projects/{self.project.id}/')
+
+    def test_kanban(self):
+        self.assert_not_modified_until_change(f'/api/projects/{self.project.id}/kanban/')
+
+    def test_analytics(self):
+        self.assert_not_modified_until_change(f'/api/analytics/project-progress/{self.project.id}/')
+        self.assert_not_modified_until_change('/api/analytics/dashboard/')
+
+    def test_if_modified_since_is_ignored(self):
+        url = f'/api/projects/{self.project.id}/kanban/'
+        future = http_date((timezone.now() + timedelta(days=1)).timestamp())
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=future)
+        self.assertEqual(response.status_code, 200)
+
+    def test_etag_depends_on_query_string(self):
+        url = f'/api/projects/{self.project.id}/tasks/'
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, {'cursor': ''}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+
+SHARED_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'projectflow-membership-tests'),
+    },
+}
+
+
+class MembershipTest(TestCase):
+    """Набор участия, IsProjectMember и сброс кэша участия"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='owner', password='password')
+        self.other = User.objects.create_user(username='other', password='password')
+        self.project = Project.objects.create(name='Проект', created_by=self.user)
+        self.project.members.add(self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.url = f'/api/analytics/burndown/{self.project.id}/'
+
+    def test_permission_allows_members(self):
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.assertEqual(
+            self.client.get('/api/analytics/tasks-by-status/', {'project_id': self.project.id}).status_code, 200
+        )
+
+    def test_permission_denies_other_users(self):
+        self.client.force_authenticate(user=self.other)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.assertEqual(
+            self.client.get('/api/analytics/tasks-by-status/', {'project_id': self.project.id}).status_code, 403
+        )
+
+    def test_permission_missing_project_is_404(self):
+        self.assertEqual(self.client.get('/api/analytics/burndown/999999/').status_code, 404)
+        self.assertEqual(
+            self.client.get('/api/analytics/tasks-by-status/', {'project_id': 'abc'}).status_code, 404
+        )
+
+    def test_permission_requires_authentication(self):
+        self.client.force_authenticate(user=None)
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_revoked_access_applies_to_next_request(self):
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.project.members.remove(self.user)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    def test_set_is_memoized_per_request(self):
+        request = RequestFactory().get('/')
+        with self.assertNumQueries(1):
+            get_member_project_ids(self.user, request)
+            self.assertTrue(is_project_member(self.user, self.project.id, request))
+        # Новый запрос загружает набор заново
+        with self.assertNumQueries(1):
+            get_member_project_ids(self.user, RequestFactory().get('/'))
+
+    def test_process_local_cache_is_refused(self):
+        with override_settings(MEMBERSHIP_CACHE_ALIAS='default'):
+            with self.assertRaises(ImproperlyConfigured):
+                get_member_project_ids(self.user)
+
+
+@override_settings(CACHES=SHARED_CACHES, MEMBERSHIP_CACHE_ALIAS='shared')
+class SharedMembershipCacheTest(TestCase):
+    """Кэш наборов участия между запросами на общем бэкенде"""
+
+    def setUp(self):
+        caches['shared'].clear()
+        self.user = User.objects.create_user(username='owner', password='password')
+        self.other = User.objects.create_user(username='other', password='password')
+        self.project = Project.objects.create(name='Проект', created_by=self.user)
+        self.project.members.add(self.user)
+
+    def cached(self, user):
+        return caches['shared'].get(MEMBERSHIP_KEY.format(user.id))
+
+    def test_set_is_cached_between_requests(self):
+        get_member_project_ids(self.user)
+        self.assertEqual(self.cached(self.user), frozenset({self.project.id}))
+        with self.assertNumQueries(0):
+            self.assertEqual(get_member_project_ids(self.user), frozenset({self.project.id}))
+
+    def test_add_invalidates(self):
+        get_member_project_ids(self.other)
+        self.assertEqual(self.cached(self.other), frozenset())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.project.members.add(self.other)
+        self.assertIsNone(self.cached(self.other))
+        self.assertEqual(get_member_project_ids(self.other), frozenset({self.project.id}))
+
+    def test_remove_invalidates(self):
+        get_member_project_ids(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.project.members.remove(self.user)
+        self.assertIsNone(self.cached(self.user))
+        self.assertEqual(get_member_project_ids(self.user), frozenset())
+
+    def test_reverse_and_clear_invalidate(self):
+        get_member_project_ids(self.other)
+        self.other.projects.add(self.project)
+        self.assertIsNone(self.cached(self.other))
+
+        get_member_project_ids(self.user)
+        get_member_project_ids(self.other)
+        self.project.members.clear()
+        self.assertIsNone(self.cached(self.user))
+        self.assertIsNone(self.cached(self.other))
+
+    def test_project_delete_invalidates(self):
+        get_member_project_ids(self.user)
+        self.project.delete()
+        self.assertIsNone(self.cached(self.user))
+
+    def test_stale_value_written_before_commit_is_removed(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.project.members.remove(self.user)
+            # Читатель до фиксации записал старый набор
+            caches['shared'].set(MEMBERSHIP_KEY.format(self.user.id), frozenset({self.project.id}))
+        self.assertIsNone(self.cached(self.user))
+
+
+class ProjectMembersTest(TestCase):
+    """Изменение состава участников разностью наборов и защита создателя"""
+
+    def setUp(self):
+        self.owner = User.objects.create_user(username='owner', password='password')
+        self.users = [User.objects.create_user(username=f'user{index}', password='password') for index in range(4)]
+        self.project = Project.objects.create(name='Проект', created_by=self.owner)
+        self.project.members.add(self.owner, self.users[0], self.users[1])
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.owner)
+        self.url = f'/api/projects/{self.project.id}/'
+
+    def member_ids(self):
+        return set(self.project.members.values_list('id', flat=True))
+
+    def test_set_members_applies_diff(self):
+        ids = [self.users[1].id, self.users[2].id, 999999]
+        with CaptureQueriesContext(connection) as context:
+            added, removed = self.project.set_members(ids)
+        self.assertEqual((added, removed), ([self.users[2].id], [self.users[0].id]))
+        # Создатель остается, несуществующие пользователи пропускаются
+        self.assertEqual(self.member_ids(), {self.owner.id, self.users[1].id, self.users[2].id})
+
+        # Одна вставка и одно удаление связей вместо записи на каждого участника
+        statements = [query['sql'].split()[0] for query in context.captured_queries]
+        self.assertEqual(statements.count('INSERT'), 2)  # связи и журнал изменений
+        self.assertEqual(statements.count('DELETE'), 1)
+
+    def test_set_members_without_changes(self):
+        self.assertEqual(self.project.set_members([self.users[0].id, self.users[1].id]), ([], []))
+
+    def test_update_members_protects_owner(self):
+        added, removed = self.project.update_members(
+            add_ids=[self.users[0].id, self.users[3].id], remove_ids=[self.owner.id, self.users[1].id]
+        )
+        self.assertEqual((added, removed), ([self.users[3].id], [self.users[1].id]))
+        self.assertIn(self.owner.id, self.member_ids())
+
+    def test_members_endpoint(self):
+        response = self.client.post(self.url + 'members/', {
+            'add': [self.users[2].id], 'remove': [self.users[0].id]
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'added': [self.users[2].id], 'removed': [self.users[0].id]})
+        self.assertEqual(self.member_ids(), {self.owner.id, self.users[1].id, self.users[2].id})
+
+    def test_members_endpoint_validation(self):
+        response = self.client.post(self.url + 'members/', {'remove': [self.owner.id]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(self.url + 'members/', {}, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(self.url + 'members/', {
+            'add': [self.users[2].id], 'remove': [self.users[2].id]
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_only_owner_changes_members(self):
+        self.client.force_authenticate(user=self.users[0])
+        for path, data in (('members/', {'add': [self.users[2].id]}),
+                           ('add_member/', {'user_id': self.users[2].id}),
+                           ('remove_member/', {'user_id': self.users[1].id})):
+            response = self.client.post(self.url + path, data, format='json')
+            self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.member_ids(), {self.owner.id, self.users[0].id, self.users[1].id})
+
+    def test_add_and_remove_member_endpoints(self):
+        response = self.client.post(self.url + 'add_member/', {'username': 'user2'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(self.users[2].id, self.member_ids())
+
+        response = self.client.post(self.url + 'remove_member/', {'user_id': self.users[0].id}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(self.users[0].id, self.member_ids())
+
+        response = self.client.post(self.url + 'remove_member/', {'username': 'owner'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(self.owner.id, self.member_ids())
+
+        response = self.client.post(self.url + 'add_member/', {'username': 'nobody'}, format='json')
+        self.assertEqual(response.status_code, 404)
+        response = self.client.post(self.url + 'add_member/', {}, format='json')
+        self.assertEqual(response.status_code, 400)
@@ -1,28 +1,44 @@
-from rest_framework import viewsets, permissions, status
+from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.db.models import Q
 from django.contrib.auth.models import User
+from django.db.models import Q
 from rest_framework.exceptions import NotFound, PermissionDenied
 from .models import Project
-from .serializers import ProjectSerializer, ProjectCreateSerializer, ProjectUpdateSerializer, ProjectMemberSerializer
+from .serializers import ProjectSerializer, ProjectCreateSerializer, ProjectUpdateSerializer
 from tasks.models import Task
 from tasks.serializers import TaskSerializer
-from .serializers import ProjectMemberActionSerializer
+from .serializers import ProjectMembersUpdateSerializer, ProjectMemberActionSerializer
+from .services import KanbanService, SyncService, SyncTokenExpired, ProjectVersionService
+from .membership import filter_by_membership
+from .permissions import IsProjectMember
+from newprojectflowapp.pagination import KeysetPagination
+from newprojectflowapp.conditional import make_etag, get_not_modified_response, set_validators
 
 
 class ProjectViewSet(viewsets.ModelViewSet):
     """
     ViewSet для управления проектами
     """
-    permission_classes = [permissions.IsAuthenticated]
+    permission_classes = [IsProjectMember]
 
     def get_queryset(self):
         """
         Возвращает только проекты, в которых пользователь является участником
         """
-        user = self.request.user
-        return Project.objects.filter(members=user).order_by('-created_at')
+        queryset = filter_by_membership(
+            Project.objects.all(), self.request.user, self.request
+        ).select_related(
+            'created_by'
+        ).prefetch_related(
+            'stats'
+        ).order_by('-created_at')
+
+        # Список участников нужен только полному представлению проекта
+        if self.action in ['list', 'retrieve']:
+            queryset = queryset.prefetch_related('members')
+
+        return queryset
 
     def get_serializer_class(self):
         """
@@ -47,116 +63,171 @@ class ProjectViewSet(viewsets.ModelViewSet):
         context = super().get_serializer_context()
         return context
 
+    def check_project_version(self, with_overdue=False):
+        """
+        Вычисляет ETag по штампу версии проекта.
+        Возвращает (etag, ответ 304 или None) до загрузки
+        и сериализации данных
+        """
+        stamp = ProjectVersionService.get_project_stamp(
+            self.request.user, self.kwargs['pk'], with_overdue=with_overdue, request=self.request
+        )
+        if stamp is None:
+            raise NotFound("Проект не найден")
+
+        # Адрес с параметрами (курсор, размер страницы) тоже входит в ETag
+        etag = make_etag(self.action, self.request.get_full_path(), *stamp['parts'])
+        return etag, get_not_modified_response(self.request, etag)
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Получение проекта с поддержкой условных запросов (If-None-Match)
+        """
+        etag, not_modified = self.check_project_version()
+        if not_modified is not None:
+            return not_modified
+
+        response = super().retrieve(request, *args, **kwargs)
+        return set_validators(response, etag)
+
     @action(detail=True, methods=['get'])
     def tasks(self, request, pk=None):
         """
         Получение всех задач проекта
         """
+        etag, not_modified = self.check_project_version(with_overdue=True)
+        if not_modified is not None:
+            return not_modified
+
         project = self.get_object()
-        tasks = Task.objects.filter(project=project)
+        tasks = KanbanService.get_board_queryset(project)
+
+        # Курсорная пагинация включается параметром ?cursor=
+        if KeysetPagination.is_requested(request):
+            paginator = KeysetPagination()
+            page = paginator.paginate_queryset(tasks, request, view=self)
+            serializer = TaskSerializer(page, many=True)
+            return set_validators(paginator.get_paginated_response(serializer.data), etag)
+
         serializer = TaskSerializer(tasks, many=True)
-        return Response(serializer.data)
+        return set_validators(Response(serializer.data), etag)
 
     @action(detail=True, methods=['get'])
     def kanban(self, request, pk=None):
         """
         Получение задач проекта, сгруппированных по статусам для канбан-доски
         """
-        project = self.get_object()
+        etag, not_modified = self.check_project_version(with_overdue=True)
+        if not_modified is not None:
+            return not_modified
 
-        # Получаем все возможные статусы задач
-        statuses = dict(Task.STATUS_CHOICES)
+        project = self.get_object()
 
-        # Создаем структуру данных для канбан-доски
-        kanban_data = {}
-        for status_key, status_name in Task.STATUS_CHOICES:
-            tasks = Task.objects.filter(project=project, status=status_key)
-            kanban_data[status_key] = {
-                'name': status_name,
-                'tasks': TaskSerializer(tasks, many=True).data
-            }
+        # Строим доску одним запросом к задачам
+        kanban_data = KanbanService.build_board(project)
 
-        return Response(kanban_data)
+        return set_validators(Response(kanban_data), etag)
 
-    @action(detail=True, methods=['post'])
-    def add_member(self, request, pk=None):
+    @action(detail=True, methods=['get'])
+    def changes(self, request, pk=None):
         """
-        Добавляет участника в проект
+        Инкрементальная синхронизация: задачи, комментарии и участники,
+        измененные после выданного сервером токена ?since=
         """
         project = self.get_object()
 
-        # Проверяем, является ли текущий пользователь создателем проекта
-        if project.created_by != request.user:
-            raise PermissionDenied("Только создатель проекта может добавлять участников")
-
-        # Используем сериализатор
-        serializer = ProjectMemberActionSerializer(data=request.data)
-        if not serializer.is_valid():
-            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-
-        # Получаем ID или username пользователя из запроса
-        user_id = serializer.validated_data.get('user_id')
-        username = serializer.validated_data.get('username')
+        since = request.query_params.get('since')
+        if not since:
+            # Без токена возвращаем текущий токен: клиент загружает
+            # проект полностью и дальше запрашивает только изменения
+            return Response({
+                'sync_token': SyncService.get_current_token(project),
+                'full_sync_required': True
+            })
 
         try:
-            if user_id:
-                user = User.objects.get(id=user_id)
-            else:
-                user = User.objects.get(username=username)
-        except User.DoesNotExist:
-            raise NotFound("Пользователь не найден")
-
-        # Добавляем пользователя как участника
-        project.members.add(user)
+            since_id = SyncService.read_token(project.id, since)
+        except SyncTokenExpired:
+            return Response(
+                {'error': 'Токен синхронизации устарел', 'full_sync_required': True},
+                status=status.HTTP_410_GONE
+            )
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-        return Response({"success": f"Пользователь {user.username} добавлен в проект"})
+        return Response(SyncService.get_changes(project, since_id))
 
     @action(detail=True, methods=['post'])
-    def remove_member(self, request, pk=None):
+    def members(self, request, pk=None):
         """
-        Удаляет участника из проекта
+        Пакетно добавляет и удаляет участников проекта:
+        {"add": [ID пользователей], "remove": [ID пользователей]}
         """
         project = self.get_object()
 
         # Проверяем, является ли текущий пользователь создателем проекта
-        if project.created_by != request.user:
-            raise PermissionDenied("Только создатель проекта может удалять участников")
+        if project.created_by_id != request.user.id:
+            raise PermissionDenied("Только создатель проекта может изменять состав участников")
 
-        # Используем сериализатор
-        serializer = ProjectMemberActionSerializer(data=request.data)
+        serializer = ProjectMembersUpdateSerializer(data=request.data)
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-        # Получаем ID или username пользователя из запроса
-        user_id = serializer.validated_data.get('user_id')
-        username = serializer.validated_data.get('username')
-
-        try:
-            if user_id:
-                user = User.objects.get(id=user_id)
-            else:
-                user = User.objects.get(username=username)
-        except User.DoesNotExist:
-            raise NotFound("Пользователь не найден")
+        add_ids = serializer.validated_data['add']
+        remove_ids = serializer.validated_data['remove']
 
-        # Проверяем, что пользователь не удаляет сам себя
-        if user == project.created_by:
+        if project.created_by_id in remove_ids:
             return Response(
                 {"error": "Нельзя удалить создателя проекта из участников"},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Удаляем пользователя из участников
-        project.members.remove(user)
+        added, removed = project.update_members(add_ids, remove_ids)
 
-        return Response({"success": f"Пользователь {user.username} удален из проекта"})
+        return Response({"added": added, "removed": removed})
+
+    def get_member_action_target(self, request, message):
+        """
+        Проект и пользователь для add_member / remove_member.
+        Пользователь задается user_id или username
+        """
+        project = self.get_object()
+        if project.created_by_id != request.user.id:
+            raise PermissionDenied(message)
+
+        serializer = ProjectMemberActionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
 
-    @action(detail=False, methods=['get'])
-    def all_users(self, request):
+        user_id = serializer.validated_data.get('user_id')
+        lookup = {'id': user_id} if user_id else {'username': serializer.validated_data['username']}
+        user = User.objects.filter(**lookup).only('id', 'username').first()
+        if user is None:
+            raise NotFound("Пользователь не найден")
+        return project, user
+
+    @action(detail=True, methods=['post'])
+    def add_member(self, request, pk=None):
         """
-        Возвращает список всех пользователей для выбора участников проекта
+        Добавляет участника в проект (обертка над members для старых клиентов)
         """
-        users = User.objects.all()
-        serializer = ProjectMemberSerializer(users, many=True)
-        return Response(serializer.data)
+        project, user = self.get_member_action_target(
+            request, "Только создатель проекта может добавлять участников"
+        )
+        project.update_members(add_ids=[user.id])
+        return Response({"success": f"Пользователь {user.username} добавлен в проект"})
 
+    @action(detail=True, methods=['post'])
+    def remove_member(self, request, pk=None):
+        """
+        Удаляет участника из проекта (обертка над members для старых клиентов)
+        """
+        project, user = self.get_member_action_target(
+            request, "Только создатель проекта может удалять участников"
+        )
+        if user.id == project.created_by_id:
+            return Response(
+                {"error": "Нельзя удалить создателя проекта из участников"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        project.update_members(remove_ids=[user.id])
+        return Response({"success": f"Пользователь {user.username} удален из проекта"})
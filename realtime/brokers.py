@@ -0,0 +1,218 @@
+"""
+Брокеры событий для push-канала проектов.
+
+Подписчик - это asyncio-очередь в цикле событий ASGI-воркера, поэтому
+тысячи простаивающих соединений не занимают потоков. Публикация
+выполняется из синхронного кода (сигналы моделей) и передается
+в цикл подписчика через call_soon_threadsafe.
+"""
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+from django.conf import settings
+from django.db import connection
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# Служебное сообщение: очередь подписчика переполнена, клиенту нужно
+# заново загрузить данные (например, через /changes/)
+RESYNC_MESSAGE = {'type': 'resync'}
+
+
+class Subscription:
+    """
+    Подписка одного соединения на канал. Создается внутри цикла событий
+    """
+
+    def __init__(self, broker, channel, maxsize):
+        self.broker = broker
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+        self.closed = False
+
+    def deliver(self, message):
+        """Кладет сообщение в очередь. Вызывается только в цикле подписчика"""
+        if self.closed:
+            return
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # Медленный клиент: отбрасываем накопленное и просим пересинхронизацию
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC_MESSAGE)
+
+    async def get(self, timeout=None):
+        """Ждет следующее сообщение; по истечении timeout возвращает None"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.broker.unsubscribe(self)
+
+
+class InProcessBroker:
+    """
+    Брокер по умолчанию: события доходят только до соединений
+    этого же процесса (один воркер, разработка).
+    Для работы на нескольких узлах достаточно переопределить publish()
+    так, чтобы сообщение доходило до всех узлов, и вызывать dispatch()
+    на каждом из них
+    """
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def publish(self, channel, message):
+        self.dispatch(channel, message)
+
+    def subscribe(self, channel):
+        subscription = Subscription(self, channel, settings.REALTIME_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.channel]
+
+    def dispatch(self, channel, message):
+        """Раздает сообщение локальным подписчикам канала"""
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, message)
+            except RuntimeError:
+                # Цикл событий соединения уже закрыт
+                self.unsubscribe(subscription)
+
+    def dispatch_all(self, message):
+        """Раздает сообщение всем локальным подписчикам"""
+        with self._lock:
+            channels = list(self._subscribers)
+        for channel in channels:
+            self.dispatch(channel, message)
+
+
+def shrink_message(message):
+    """
+    Сокращает сообщение, не помещающееся в уведомление: остаются тип,
+    проект и скалярные поля, списки идентификаторов отбрасываются.
+    Клиент догружает изменения через /changes/
+    """
+    shrunk = {key: value for key, value in message.items() if not isinstance(value, (list, tuple, dict))}
+    shrunk['truncated'] = True
+    return shrunk
+
+
+class PostgresBroker(InProcessBroker):
+    """
+    Брокер для нескольких узлов на LISTEN/NOTIFY PostgreSQL.
+    Каждый процесс держит одно слушающее соединение, а не по одному
+    на клиента; уведомления раздаются локальным подписчикам
+    """
+
+    # Ограничение PostgreSQL на размер уведомления - 8000 байт
+    MAX_PAYLOAD_BYTES = 7900
+    # Пауза перед повторным подключением LISTEN (удваивается до максимума)
+    RECONNECT_DELAY_SECONDS = 1
+    RECONNECT_MAX_DELAY_SECONDS = 30
+
+    def __init__(self):
+        super().__init__()
+        self.pg_channel = settings.REALTIME_PG_CHANNEL
+        self._listener = None
+
+    def encode(self, channel, message):
+        payload = json.dumps({'channel': channel, 'message': message}, default=str)
+        if len(payload.encode('utf-8')) > self.MAX_PAYLOAD_BYTES:
+            payload = json.dumps({'channel': channel, 'message': shrink_message(message)}, default=str)
+        return payload
+
+    def publish(self, channel, message):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [self.pg_channel, self.encode(channel, message)])
+
+    def subscribe(self, channel):
+        subscription = super().subscribe(channel)
+        self._ensure_listener(subscription.loop)
+        return subscription
+
+    def _ensure_listener(self, loop):
+        with self._lock:
+            if self._listener is not None and not self._listener.closed:
+                return
+
+            # Отдельное соединение в режиме autocommit, не связанное с ORM.
+            # Открывается драйвером напрямую: подписка и переподключение
+            # выполняются в цикле событий, где get_new_connection() запрещен
+            listener = connection.Database.connect(**connection.get_connection_params())
+            listener.autocommit = True
+            with listener.cursor() as cursor:
+                cursor.execute(f'LISTEN {connection.ops.quote_name(self.pg_channel)}')
+            fileno = listener.fileno()
+            loop.add_reader(fileno, self._read_notifications, loop, listener, fileno)
+            self._listener = listener
+
+    def _reconnect(self, loop, delay):
+        """Повторно открывает LISTEN, пока есть подписчики; при ошибке - с нарастающей паузой"""
+        with self._lock:
+            if not self._subscribers:
+                return
+        try:
+            self._ensure_listener(loop)
+        except Exception:
+            logger.exception('Не удалось восстановить соединение LISTEN')
+            next_delay = min(delay * 2, self.RECONNECT_MAX_DELAY_SECONDS)
+            loop.call_later(next_delay, self._reconnect, loop, next_delay)
+            return
+
+        # Уведомления, пришедшие без соединения, потеряны: клиенты пересинхронизируются
+        self.dispatch_all(RESYNC_MESSAGE)
+
+    def _read_notifications(self, loop, listener, fileno):
+        try:
+            listener.poll()
+        except Exception:
+            logger.exception('Соединение LISTEN потеряно, будет открыто заново')
+            loop.remove_reader(fileno)
+            listener.close()
+            loop.call_later(self.RECONNECT_DELAY_SECONDS, self._reconnect, loop, self.RECONNECT_DELAY_SECONDS)
+            return
+
+        while listener.notifies:
+            notification = listener.notifies.pop(0)
+            try:
+                payload = json.loads(notification.payload)
+            except ValueError:
+                continue
+            self.dispatch(payload['channel'], payload['message'])
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """Возвращает брокер, указанный в настройке REALTIME_BROKER"""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(settings.REALTIME_BROKER)()
+    return _broker
@@ -0,0 +1,78 @@
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.db import transaction
+from .brokers import get_broker
+
+logger = logging.getLogger(__name__)
+
+# Типы событий канала проекта
+TASK_CREATED = 'task.created'
+TASK_UPDATED = 'task.updated'
+TASK_MOVED = 'task.moved'
+TASK_DELETED = 'task.deleted'
+TASKS_UPDATED = 'tasks.updated'
+TASKS_DELETED = 'tasks.deleted'
+TASKS_IMPORTED = 'tasks.imported'
+COMMENT_CREATED = 'comment.created'
+COMMENT_UPDATED = 'comment.updated'
+COMMENT_DELETED = 'comment.deleted'
+
+# События, накопленные внутри collect()
+_pending_events = ContextVar('pending_project_events', default=None)
+
+
+def project_channel(project_id):
+    return f'project.{project_id}'
+
+
+def publish_project_event(project_id, event_type, **data):
+    """
+    Публикует событие в канал проекта после фиксации транзакции:
+    клиенты не должны узнать об изменениях, которые будут откачены.
+    События содержат только идентификаторы - актуальные данные
+    клиент получает через /changes/
+    """
+    pending = _pending_events.get()
+    if pending is not None:
+        pending.append((project_id, event_type, data))
+        return
+
+    message = {'type': event_type, 'project_id': project_id, **data}
+
+    def publish():
+        try:
+            get_broker().publish(project_channel(project_id), message)
+        except Exception:
+            # Недоступность брокера не должна ломать запись задач
+            logger.exception('Не удалось опубликовать событие %s', event_type)
+
+    transaction.on_commit(publish)
+
+
+@contextmanager
+def collect():
+    """
+    Накапливает события внутри блока и публикует их в конце. Удаления
+    задач объединяются в одно событие tasks.deleted на проект
+    (например, при массовом удалении, когда сигналы срабатывают для каждой строки)
+    """
+    if _pending_events.get() is not None:
+        yield
+        return
+
+    pending = []
+    token = _pending_events.set(pending)
+    try:
+        yield
+    finally:
+        _pending_events.reset(token)
+
+    deleted_by_project = {}
+    for project_id, event_type, data in pending:
+        if event_type == TASK_DELETED:
+            deleted_by_project.setdefault(project_id, []).append(data['task_id'])
+        else:
+            publish_project_event(project_id, event_type, **data)
+    for project_id, task_ids in deleted_by_project.items():
+        publish_project_event(project_id, TASKS_DELETED, task_ids=task_ids)
@@ -0,0 +1,234 @@
+import asyncio
+import json
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+from projects.models import Project
+from tasks.models import Task
+from . import brokers, events
+from .brokers import InProcessBroker, PostgresBroker, RESYNC_MESSAGE, shrink_message
+from .views import ACCESS_REVOKED_MESSAGE, format_event
+
+
+class RecordingBroker(InProcessBroker):
+    """Брокер, запоминающий опубликованные сообщения"""
+
+    def __init__(self):
+        super().__init__()
+        self.published = []
+
+    def publish(self, channel, message):
+        self.published.append((channel, message))
+
+
+class BrokerTestMixin:
+    """Подменяет брокер процесса на время теста"""
+
+    broker_class = RecordingBroker
+
+    def setUp(self):
+        super().setUp()
+        self.previous_broker = brokers._broker
+        brokers._broker = self.broker = self.broker_class()
+
+    def tearDown(self):
+        brokers._broker = self.previous_broker
+        super().tearDown()
+
+
+@override_settings(REALTIME_QUEUE_SIZE=2)
+class InProcessBrokerTest(SimpleTestCase):
+    """Раздача сообщений подписчикам внутри процесса"""
+
+    def test_publish_reaches_channel_subscribers(self):
+        async def scenario():
+            broker = InProcessBroker()
+            subscription = broker.subscribe('project.1')
+            other = broker.subscribe('project.2')
+            broker.publish('project.1', {'type': 'task.created'})
+            received = await subscription.get(timeout=1)
+            missing = await other.get(timeout=0.01)
+            subscription.close()
+            other.close()
+            return received, missing, dict(broker._subscribers)
+
+        received, missing, subscribers = asyncio.run(scenario())
+        self.assertEqual(received, {'type': 'task.created'})
+        self.assertIsNone(missing)
+        self.assertEqual(subscribers, {})
+
+    def test_overflow_asks_for_resync(self):
+        async def scenario():
+            broker = InProcessBroker()
+            subscription = broker.subscribe('project.1')
+            for index in range(3):
+                broker.publish('project.1', {'type': 'task.updated', 'task_id': index})
+            await asyncio.sleep(0)
+            messages = []
+            while not subscription.queue.empty():
+                messages.append(subscription.queue.get_nowait())
+            subscription.close()
+            return messages
+
+        self.assertEqual(asyncio.run(scenario()), [RESYNC_MESSAGE])
+
+
+class PostgresBrokerTest(TestCase):
+    """LISTEN/NOTIFY: ограничение размера уведомления и переподключение"""
+
+    def test_large_message_is_shrunk(self):
+        broker = PostgresBroker()
+        message = {'type': 'tasks.updated', 'project_id': 1, 'task_ids': list(range(5000))}
+
+        payload = broker.encode('project.1', message)
+        self.assertLessEqual(len(payload.encode('utf-8')), broker.MAX_PAYLOAD_BYTES)
+        self.assertEqual(json.loads(payload)['message'], shrink_message(message))
+        self.assertEqual(shrink_message(message), {'type': 'tasks.updated', 'project_id': 1, 'truncated': True})
+
+        # pg_notify не должен падать на размере сообщения
+        broker.publish('project.1', message)
+
+    def test_small_message_is_sent_as_is(self):
+        message = {'type': 'task.deleted', 'project_id': 1, 'task_id': 7}
+        payload = json.loads(PostgresBroker().encode('project.1', message))
+        self.assertEqual(payload, {'channel': 'project.1', 'message': message})
+
+    def notify(self, broker, channel, message):
+        # Отдельное соединение в autocommit: уведомление уходит сразу
+        sender = connection.Database.connect(**connection.get_connection_params())
+        sender.autocommit = True
+        try:
+            with sender.cursor() as cursor:
+                cursor.execute('SELECT pg_notify(%s, %s)', [broker.pg_channel, broker.encode(channel, message)])
+        finally:
+            sender.close()
+
+    def test_listener_reconnects_after_error(self):
+        broker = PostgresBroker()
+        broker.RECONNECT_DELAY_SECONDS = 0
+
+        async def scenario():
+            loop = asyncio.get_running_loop()
+            subscription = broker.subscribe('project.1')
+            listener = broker._listener
+            try:
+                self.notify(broker, 'project.1', {'type': 'task.created'})
+                received = await subscription.get(timeout=5)
+
+                # Соединение оборвалось: poll() падает, слушатель открывается заново
+                fileno = listener.fileno()
+                listener.close()
+                broker._read_notifications(loop, listener, fileno)
+                resync = await subscription.get(timeout=5)
+
+                self.notify(broker, 'project.1', {'type': 'task.updated'})
+                after_reconnect = await subscription.get(timeout=5)
+                return received, resync, after_reconnect, broker._listener
+            finally:
+                subscription.close()
+                if broker._listener is not None:
+                    loop.remove_reader(broker._listener.fileno())
+                    broker._listener.close()
+
+        received, resync, after_reconnect, new_listener = asyncio.run(scenario())
+        self.assertEqual(received, {'type': 'task.created'})
+        self.assertEqual(resync, RESYNC_MESSAGE)
+        self.assertEqual(after_reconnect, {'type': 'task.updated'})
+        self.assertIsNot(new_listener, None)
+
+
+class ProjectEventsTest(BrokerTestMixin, TestCase):
+    """События проекта публикуются после фиксации транзакции"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='owner', password='password')
+        self.project = Project.objects.create(name='Проект', created_by=self.user)
+        self.other_project = Project.objects.create(name='Другой', created_by=self.user)
+        self.project.members.add(self.user)
+        self.other_project.members.add(self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def create_task(self, project, title='Задача'):
+        return Task.objects.create(title=title, project=project, created_by=self.user)
+
+    def test_event_published_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            task = self.create_task(self.project)
+            self.assertEqual(self.broker.published, [])
+
+        self.assertEqual(self.broker.published, [(
+            events.project_channel(self.project.id),
+            {'type': events.TASK_CREATED, 'project_id': self.project.id,
+             'task_id': task.id, 'status': task.status, 'rank': task.rank}
+        )])
+
+    def test_bulk_delete_publishes_one_event_per_project(self):
+        tasks = [self.create_task(self.project) for _ in range(3)] + [self.create_task(self.other_project)]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/tasks/bulk/', {
+                'ids': [task.id for task in tasks], 'delete': True
+            }, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        messages = sorted((message for _, message in self.broker.published), key=lambda m: m['project_id'])
+        for message in messages:
+            message['task_ids'].sort()
+        self.assertEqual(messages, [
+            {'type': events.TASKS_DELETED, 'project_id': self.project.id,
+             'task_ids': [task.id for task in tasks[:3]]},
+            {'type': events.TASKS_DELETED, 'project_id': self.other_project.id,
+             'task_ids': [tasks[3].id]},
+        ])
+
+
+class ProjectEventsViewTest(BrokerTestMixin, TestCase):
+    """Push-канал проекта (Server-Sent Events)"""
+
+    broker_class = InProcessBroker
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='owner', password='password')
+        self.stranger = User.objects.create_user(username='stranger', password='password')
+        self.project = Project.objects.create(name='Проект', created_by=self.user)
+        self.project.members.add(self.user)
+        self.url = f'/api/realtime/projects/{self.project.id}/events/'
+
+    async def test_requires_authentication(self):
+        response = await self.async_client.get(self.url)
+        self.assertEqual(response.status_code, 401)
+
+    async def test_non_member_gets_404(self):
+        await self.async_client.aforce_login(self.stranger)
+        response = await self.async_client.get(self.url)
+        self.assertEqual(response.status_code, 404)
+
+    async def test_member_receives_events(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+        stream = aiter(response.streaming_content)
+        self.assertTrue((await anext(stream)).startswith(b'retry:'))
+        message = {'type': events.TASK_DELETED, 'project_id': self.project.id, 'task_id': 1}
+        self.broker.publish(events.project_channel(self.project.id), message)
+        self.assertEqual(await anext(stream), format_event(message).encode('utf-8'))
+
+    @override_settings(REALTIME_ACCESS_CHECK_SECONDS=0)
+    async def test_stream_closes_when_member_removed(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(self.url)
+        stream = aiter(response.streaming_content)
+        await anext(stream)
+
+        await sync_to_async(self.project.members.remove)(self.user)
+        self.assertEqual(await anext(stream), format_event(ACCESS_REVOKED_MESSAGE).encode('utf-8'))
+        with self.assertRaises(StopAsyncIteration):
+            await anext(stream)
+        self.assertEqual(dict(self.broker._subscribers), {})
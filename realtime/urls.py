@@ -0,0 +1,7 @@
+from django.urls import path
+from .views import project_events
+
+urlpatterns = [
+    # Push-канал событий проекта (Server-Sent Events)
+    path('projects/<int:project_id>/events/', project_events, name='project_events'),
+]
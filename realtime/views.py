@@ -0,0 +1,88 @@
+import json
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, AuthenticationFailed
+from projects.membership import is_project_member
+from .brokers import get_broker
+from .events import project_channel
+
+# Служебное сообщение: пользователь больше не участник проекта, поток закрывается
+ACCESS_REVOKED_MESSAGE = {'type': 'access.revoked'}
+
+
+async def get_request_user(request):
+    """
+    Аутентификация по JWT из заголовка Authorization или по сессии.
+    DRF не поддерживает асинхронные представления, поэтому проверяем сами
+    """
+    try:
+        result = await sync_to_async(JWTAuthentication().authenticate)(request)
+    except (InvalidToken, AuthenticationFailed):
+        return None
+    if result is not None:
+        return result[0]
+
+    user = await request.auser()
+    return user if user.is_authenticated else None
+
+
+def format_event(message):
+    """Сообщение в формате Server-Sent Events"""
+    data = json.dumps(message, ensure_ascii=False, default=str)
+    return f"event: {message['type']}\ndata: {data}\n\n"
+
+
+async def stream_events(subscription, check_access=None):
+    """
+    Поток событий одного соединения. Ожидание очереди не занимает поток;
+    комментарий-пинг поддерживает соединение через прокси.
+    check_access периодически перепроверяет участие в проекте:
+    удаленный участник не должен получать события дальше
+    """
+    try:
+        yield f"retry: {settings.REALTIME_RETRY_MILLISECONDS}\n\n"
+        checked_at = time.monotonic()
+        while True:
+            if check_access is not None and time.monotonic() - checked_at >= settings.REALTIME_ACCESS_CHECK_SECONDS:
+                if not await check_access():
+                    yield format_event(ACCESS_REVOKED_MESSAGE)
+                    return
+                checked_at = time.monotonic()
+
+            message = await subscription.get(timeout=settings.REALTIME_HEARTBEAT_SECONDS)
+            if message is None:
+                yield ': ping\n\n'
+            else:
+                yield format_event(message)
+    finally:
+        # Клиент отключился: ASGI-обработчик отменяет генератор
+        subscription.close()
+
+
+async def project_events(request, project_id):
+    """
+    Push-канал проекта (Server-Sent Events): создание, изменение,
+    перемещение задач и комментарии. Требует запуска через ASGI
+    """
+    user = await get_request_user(request)
+    if user is None:
+        return JsonResponse({'detail': 'Требуется аутентификация'}, status=401)
+
+    if not await sync_to_async(is_project_member)(user, project_id, request):
+        return JsonResponse({'detail': 'Проект не найден'}, status=404)
+
+    async def check_access():
+        # Без request: запоминание участия на время запроса здесь не подходит
+        return await sync_to_async(is_project_member)(user, project_id)
+
+    subscription = get_broker().subscribe(project_channel(project_id))
+    response = StreamingHttpResponse(
+        stream_events(subscription, check_access), content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    # Отключаем буферизацию ответа в nginx
+    response['X-Accel-Buffering'] = 'no'
+    return response
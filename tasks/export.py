@@ -0,0 +1,165 @@
+"""
+Потоковая выгрузка задач и комментариев в CSV и NDJSON.
+
+Задачи читаются серверным курсором (QuerySet.iterator) порциями по
+EXPORT_CHUNK_SIZE строк, комментарии подгружаются одним запросом на
+порцию. Вывод собирается в блоки по EXPORT_BUFFER_SIZE байт, поэтому
+память не зависит от объема выгрузки, а заголовок уходит клиенту сразу.
+
+Формат записей общий для CSV и NDJSON: поле type ("task" или "comment"),
+комментарии следуют за своей задачей. Тот же формат принимает импорт.
+"""
+import csv
+import io
+import json
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Prefetch
+from .models import Comment
+
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_BUFFER_SIZE = 64 * 1024
+
+FORMAT_CSV = 'csv'
+FORMAT_NDJSON = 'ndjson'
+CONTENT_TYPES = {
+    FORMAT_CSV: 'text/csv; charset=utf-8',
+    FORMAT_NDJSON: 'application/x-ndjson; charset=utf-8',
+}
+
+RECORD_TASK = 'task'
+RECORD_COMMENT = 'comment'
+
+EXPORT_FIELDS = [
+    'type', 'id', 'project_id', 'title', 'description', 'status', 'priority',
+    'assignee', 'created_by', 'due_date', 'created_at', 'updated_at',
+    'comments_count', 'task_id', 'author', 'text',
+]
+
+TASK_FIELDS = [
+    'id', 'project_id', 'title', 'description', 'status', 'priority',
+    'due_date', 'created_at', 'updated_at', 'comments_count',
+    'assignee__username', 'created_by__username',
+]
+
+
+def format_datetime(value):
+    return value.isoformat() if value else None
+
+
+def get_export_queryset(tasks, with_comments=False):
+    """
+    Сужает queryset задач до выгружаемых полей, задает устойчивый
+    порядок (по ID) и подключает комментарии
+    """
+    tasks = tasks.select_related(None).select_related(
+        'assignee', 'created_by'
+    ).only(*TASK_FIELDS).order_by('id')
+
+    if with_comments:
+        tasks = tasks.prefetch_related(Prefetch(
+            'comments',
+            queryset=Comment.objects.select_related('author').only(
+                'id', 'task_id', 'text', 'created_at', 'author__username'
+            ).order_by('created_at', 'id')
+        ))
+    return tasks
+
+
+def iter_records(tasks, with_comments=False):
+    """Записи выгрузки (словари) в порядке задач"""
+    tasks = get_export_queryset(tasks, with_comments)
+
+    # С prefetch_related комментарии загружаются на каждую порцию задач
+    for task in tasks.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield {
+            'type': RECORD_TASK,
+            'id': task.id,
+            'project_id': task.project_id,
+            'title': task.title,
+            'description': task.description,
+            'status': task.status,
+            'priority': task.priority,
+            'assignee': task.assignee.username if task.assignee else None,
+            'created_by': task.created_by.username,
+            'due_date': format_datetime(task.due_date),
+            'created_at': format_datetime(task.created_at),
+            'updated_at': format_datetime(task.updated_at),
+            'comments_count': task.comments_count,
+        }
+
+        if with_comments:
+            for comment in task.comments.all():
+                yield {
+                    'type': RECORD_COMMENT,
+                    'id': comment.id,
+                    'task_id': task.id,
+                    'author': comment.author.username,
+                    'text': comment.text,
+                    'created_at': format_datetime(comment.created_at),
+                }
+
+
+def iter_csv(records):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS, extrasaction='ignore')
+    writer.writeheader()
+    yield from _iter_buffered(buffer, records, writer.writerow)
+
+
+def iter_ndjson(records):
+    buffer = io.StringIO()
+
+    def write(record):
+        buffer.write(json.dumps(record, ensure_ascii=False))
+        buffer.write('\n')
+
+    yield from _iter_buffered(buffer, records, write)
+
+
+def _iter_buffered(buffer, records, write):
+    # Первый блок (заголовок CSV или первая запись) отдается сразу
+    flush_size = 0
+    for record in records:
+        write(record)
+        if buffer.tell() >= flush_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            flush_size = EXPORT_BUFFER_SIZE
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def iter_export(tasks, file_format=FORMAT_CSV, with_comments=False):
+    """Блоки текста выгрузки в формате file_format"""
+    records = iter_records(tasks, with_comments)
+    if file_format == FORMAT_NDJSON:
+        return iter_ndjson(records)
+    return iter_csv(records)
+
+
+async def _aiter_in_thread(iterator):
+    # Серверный курсор привязан к соединению потока, поэтому все
+    # обращения к итератору выполняются в одном потоке запроса
+    next_part = sync_to_async(next, thread_sensitive=True)
+    try:
+        while True:
+            part = await next_part(iterator, None)
+            if part is None:
+                break
+            yield part
+    finally:
+        # Клиент отключился или выгрузка завершена: закрываем курсор
+        await sync_to_async(iterator.close, thread_sensitive=True)()
+
+
+def get_streaming_content(iterator, request):
+    """
+    Содержимое для StreamingHttpResponse. Под ASGI синхронный итератор
+    был бы сначала прочитан целиком, поэтому он оборачивается в
+    асинхронный, читающий по одному блоку
+    """
+    if isinstance(getattr(request, '_request', request), ASGIRequest):
+        return _aiter_in_thread(iterator)
+    return iterator
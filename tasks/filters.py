@@ -0,0 +1,59 @@
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank
+from django.db.models import F
+from rest_framework import filters
+from rest_framework.settings import api_settings
+
+
+class TaskFullTextSearchFilter(filters.SearchFilter):
+    """
+    Полнотекстовый поиск задач по PostgreSQL tsvector (русская конфигурация).
+
+    Использует тот же параметр ?search=, что и стандартный SearchFilter,
+    но вместо ILIKE '%...%' ищет по проиндексированному (GIN) полю
+    Task.search_vector, ранжирует результаты и добавляет подсвеченные фрагменты
+    """
+    search_config = 'russian'
+    headline_options = {
+        'start_sel': '<mark>',
+        'stop_sel': '</mark>',
+        'max_words': 35,
+        'min_words': 15,
+        'max_fragments': 2,
+    }
+
+    def get_search_query(self, request):
+        """Строит SearchQuery из параметра поиска в синтаксисе веб-поиска"""
+        terms = ' '.join(self.get_search_terms(request))
+        if not terms:
+            return None
+        return SearchQuery(terms, config=self.search_config, search_type='websearch')
+
+    def filter_queryset(self, request, queryset, view):
+        query = self.get_search_query(request)
+        if query is None:
+            return queryset
+
+        queryset = queryset.filter(
+            search_vector=query
+        ).annotate(
+            search_rank=SearchRank(F('search_vector'), query),
+            title_headline=SearchHeadline(
+                'title', query,
+                config=self.search_config,
+                highlight_all=True,
+                start_sel=self.headline_options['start_sel'],
+                stop_sel=self.headline_options['stop_sel']
+            ),
+            description_headline=SearchHeadline(
+                'description', query,
+                config=self.search_config,
+                **self.headline_options
+            )
+        )
+
+        # Если клиент не задал сортировку явно, сортируем по релевантности
+        if not request.query_params.get(api_settings.ORDERING_PARAM):
+            queryset = queryset.order_by('-search_rank', '-created_at')
+
+        return queryset
+
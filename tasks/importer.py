@@ -0,0 +1,309 @@
+"""
+Пакетный импорт задач и комментариев из CSV или NDJSON
+(формат выгрузки tasks/export.py).
+
+Записи читаются потоком и обрабатываются порциями по IMPORT_BATCH_SIZE:
+проверка идет по заранее загруженной карте участников проекта без
+запросов на каждую строку, вставка - через bulk_create (он же назначает
+ранги карточек). Каждая порция фиксируется в своей транзакции вместе
+с данными, которые при обычной записи поддерживают сигналы: журналом
+изменений и смен статусов, счетчиками проекта и комментариев, версиями
+кэша аналитики, автосинхронизацией с календарем. Прерванный импорт
+продолжается с последней зафиксированной строки (resume_after).
+Ошибочные строки пропускаются и попадают в отчет.
+"""
+import csv
+import io
+import json
+from collections import Counter
+from contextlib import nullcontext
+from datetime import datetime, time
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from analytics.cache import bump_project_versions
+from calendar_integration.models import collect_auto_sync, schedule_auto_sync_on_commit
+from projects.models import Project, ProjectStats, ProjectChange
+from realtime import events
+from .export import FORMAT_CSV, FORMAT_NDJSON, RECORD_COMMENT, RECORD_TASK
+from .models import Task, Comment, TaskStatusTransition
+
+IMPORT_BATCH_SIZE = 1000
+
+# Сколько ошибок возвращать в отчете (всего ошибок - в failed)
+MAX_REPORTED_ERRORS = 1000
+
+STATUSES = {key for key, _ in Task.STATUS_CHOICES}
+PRIORITIES = {key for key, _ in Task.PRIORITY_CHOICES}
+TITLE_MAX_LENGTH = Task._meta.get_field('title').max_length
+
+
+class ImportRowError(Exception):
+    """Ошибка в отдельной строке файла: строка пропускается"""
+
+
+def iter_csv_records(stream):
+    """
+    (номер строки, запись) из текстового потока CSV. Вместо записи
+    с неверным числом полей - ImportRowError, он попадает в отчет
+    """
+    reader = csv.DictReader(stream)
+    for record in reader:
+        if None in record:
+            record = ImportRowError('Лишние поля в строке CSV')
+        elif None in record.values():
+            record = ImportRowError('Не хватает полей в строке CSV')
+        yield reader.line_num, record
+
+
+def iter_ndjson_records(stream):
+    """
+    (номер строки, запись) из текстового потока NDJSON. Вместо строки,
+    которая не является JSON-объектом, - ImportRowError
+    """
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        if not isinstance(record, dict):
+            record = ImportRowError('Строка не является JSON-объектом')
+        yield line_number, record
+
+
+def iter_records(stream, file_format):
+    if file_format == FORMAT_NDJSON:
+        return iter_ndjson_records(stream)
+    return iter_csv_records(stream)
+
+
+def open_text(file):
+    """Текстовый поток загруженного или открытого в бинарном режиме файла"""
+    return io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+
+
+def detect_format(filename, default=FORMAT_CSV):
+    """Формат по расширению файла"""
+    name = (filename or '').lower()
+    if name.endswith(('.ndjson', '.jsonl')):
+        return FORMAT_NDJSON
+    if name.endswith('.csv'):
+        return FORMAT_CSV
+    return default
+
+
+def clean(value):
+    """Значение поля как строка без пробелов по краям ('' для пустых)"""
+    if value is None:
+        return ''
+    return str(value).strip()
+
+
+class TaskImporter:
+    """
+    Импорт задач и комментариев в проект от имени пользователя user.
+    Ссылки на пользователей (assignee, created_by, author) - логины
+    участников проекта; создатель и автор, не найденные в проекте,
+    заменяются на user. Комментарий ссылается на задачу по ее id
+    в файле (task_id) и должен следовать за ней: порция не разрывает
+    задачу и ее комментарии, поэтому продолжение импорта их не теряет
+    """
+
+    def __init__(self, project, user, batch_size=IMPORT_BATCH_SIZE):
+        self.project = project
+        self.user = user
+        self.batch_size = batch_size
+
+        # Одна загрузка карты участников на весь импорт
+        self.members = dict(
+            Project.members.through.objects.filter(
+                project_id=project.id
+            ).values_list('user__username', 'user_id')
+        )
+
+        self.task_ids = {}
+        self.created_task_ids = []
+        self.created_comments = 0
+        self.failed = 0
+        self.errors = []
+        # Последняя строка, обработанная в зафиксированной порции
+        self.last_line = None
+
+    def run(self, records, dry_run=False, resume_after=None):
+        """
+        Импортирует записи (line, dict), фиксируя каждую порцию отдельно.
+        resume_after - продолжить после строки last_line прошлого отчета.
+        dry_run - проверить все записи в одной транзакции и откатить.
+        Возвращает отчет
+        """
+        with transaction.atomic() if dry_run else nullcontext(), collect_auto_sync():
+            for batch in self.iter_batches(records, resume_after):
+                self.import_batch(batch)
+            if dry_run:
+                transaction.set_rollback(True)
+
+        if not dry_run and (self.created_task_ids or self.created_comments):
+            events.publish_project_event(
+                self.project.id, events.TASKS_IMPORTED,
+                created_tasks=len(self.created_task_ids),
+                created_comments=self.created_comments
+            )
+
+        return self.get_report(dry_run)
+
+    def iter_batches(self, records, resume_after=None):
+        """
+        Порции записей. Новая порция начинается только с задачи:
+        комментарии остаются в одной транзакции со своей задачей
+        """
+        batch = []
+        for line, record in records:
+            if resume_after is not None and line <= resume_after:
+                continue
+            is_comment = isinstance(record, dict) and clean(record.get('type')) == RECORD_COMMENT
+            if len(batch) >= self.batch_size and not is_comment:
+                yield batch
+                batch = []
+            batch.append((line, record))
+        if batch:
+            yield batch
+
+    def get_report(self, dry_run=False):
+        return {
+            'dry_run': dry_run,
+            'created_tasks': len(self.created_task_ids),
+            'created_comments': self.created_comments,
+            'failed': self.failed,
+            'last_line': self.last_line,
+            'errors': sorted(self.errors, key=lambda error: error['line']),
+        }
+
+    def add_error(self, line, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'error': message})
+
+    def import_batch(self, batch):
+        """Вставляет порцию и ее производные данные в одной транзакции"""
+        with transaction.atomic():
+            self.insert_batch(batch)
+        self.last_line = batch[-1][0]
+
+    def insert_batch(self, batch):
+        # Задачи порции вставляются раньше ее комментариев,
+        # чтобы комментарии могли ссылаться на задачи той же порции
+        tasks = []
+        comments = []
+        for line, record in batch:
+            try:
+                if isinstance(record, ImportRowError):
+                    raise record
+                record_type = clean(record.get('type')) or RECORD_TASK
+                if record_type == RECORD_TASK:
+                    tasks.append((clean(record.get('id')), self.build_task(record)))
+                elif record_type == RECORD_COMMENT:
+                    comments.append((line, record))
+                else:
+                    raise ImportRowError('Неизвестный тип записи')
+            except ImportRowError as e:
+                self.add_error(line, str(e))
+
+        project_id = self.project.id
+        if tasks:
+            Task.objects.bulk_create([task for _, task in tasks], batch_size=self.batch_size)
+            for source_id, task in tasks:
+                if source_id:
+                    self.task_ids[source_id] = task.id
+            task_ids = [task.id for _, task in tasks]
+            self.created_task_ids.extend(task_ids)
+
+            ProjectChange.record(project_id, ProjectChange.KIND_TASK, task_ids)
+            TaskStatusTransition.record([
+                (task.id, project_id, None, task.status) for _, task in tasks
+            ])
+            ProjectStats.apply_deltas(Counter((project_id, task.status) for _, task in tasks))
+            schedule_auto_sync_on_commit((task.id, task.assignee_id) for _, task in tasks)
+
+        built_comments = []
+        for line, record in comments:
+            try:
+                built_comments.append(self.build_comment(record))
+            except ImportRowError as e:
+                self.add_error(line, str(e))
+
+        if built_comments:
+            Comment.objects.bulk_create(built_comments, batch_size=self.batch_size)
+            self.created_comments += len(built_comments)
+            ProjectChange.record(
+                project_id, ProjectChange.KIND_COMMENT, [comment.id for comment in built_comments]
+            )
+            Task.rebuild_comment_counts(task_ids=sorted({comment.task_id for comment in built_comments}))
+
+        if tasks or built_comments:
+            bump_project_versions([project_id])
+
+    def get_member_id(self, username):
+        return self.members.get(username) if username else None
+
+    def parse_due_date(self, value):
+        if not value:
+            return None
+        try:
+            parsed = parse_datetime(value)
+            if parsed is None:
+                date = parse_date(value)
+                if date is None:
+                    raise ValueError(value)
+                parsed = datetime.combine(date, time.min)
+        except ValueError:
+            raise ImportRowError('Неверный формат due_date')
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+        return parsed
+
+    def build_task(self, record):
+        title = clean(record.get('title'))
+        if not title:
+            raise ImportRowError('Не указан заголовок задачи')
+        if len(title) > TITLE_MAX_LENGTH:
+            raise ImportRowError(f'Заголовок длиннее {TITLE_MAX_LENGTH} символов')
+
+        status = clean(record.get('status')) or 'Новая'
+        if status not in STATUSES:
+            raise ImportRowError(f'Неизвестный статус: {status}')
+        priority = clean(record.get('priority')) or 'Без приоритета'
+        if priority not in PRIORITIES:
+            raise ImportRowError(f'Неизвестный приоритет: {priority}')
+
+        assignee = clean(record.get('assignee'))
+        assignee_id = self.get_member_id(assignee)
+        if assignee and assignee_id is None:
+            raise ImportRowError('Исполнитель должен быть участником проекта')
+
+        due_date = self.parse_due_date(clean(record.get('due_date')))
+
+        return Task(
+            project_id=self.project.id,
+            title=title,
+            description=clean(record.get('description')),
+            status=status,
+            priority=priority,
+            assignee_id=assignee_id,
+            created_by_id=self.get_member_id(clean(record.get('created_by'))) or self.user.id,
+            due_date=due_date,
+        )
+
+    def build_comment(self, record):
+        task_id = self.task_ids.get(clean(record.get('task_id')))
+        if task_id is None:
+            raise ImportRowError('Задача комментария не найдена среди импортированных выше')
+        text = clean(record.get('text'))
+        if not text:
+            raise ImportRowError('Пустой текст комментария')
+        return Comment(
+            task_id=task_id,
+            author_id=self.get_member_id(clean(record.get('author'))) or self.user.id,
+            text=text,
+        )
@@ -0,0 +1,171 @@
+import random
+import re
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.utils import timezone
+from rest_framework.request import Request
+from projects.models import Project
+from tasks.models import Task
+from tasks.views import TaskViewSet
+
+
+# Имена индексов из строк плана вида "Index Scan using <index> on ..."
+# и "Bitmap Index Scan on <index>"
+INDEX_PATTERN = re.compile(r'(?:Index (?:Only )?Scan (?:Backward )?using|Bitmap Index Scan on) (\w+)')
+
+# Комбинации фильтров TaskViewSet, для которых проверяется план запроса
+FILTER_COMBINATIONS = [
+    ('Все задачи пользователя', {}),
+    ('Задачи проекта', {'project': '{project}'}),
+    ('Проект + статус', {'project': '{project}', 'status': 'В работе'}),
+    ('Проект + приоритет', {'project': '{project}', 'priority': 'Высокий'}),
+    ('Статус', {'status': 'На проверке'}),
+    ('Мои задачи', {'assigned_to_me': 'true'}),
+    ('Мои задачи + статус', {'assigned_to_me': 'true', 'status': 'В работе'}),
+    ('Созданные мной', {'created_by_me': 'true'}),
+    ('Просроченные', {'overdue': 'true'}),
+    ('Просроченные в проекте', {'project': '{project}', 'overdue': 'true'}),
+]
+
+
+class Command(BaseCommand):
+    """
+    Воспроизводимый бенчмарк индексов задач: при необходимости заполняет
+    базу тестовыми данными и выводит EXPLAIN для каждой комбинации
+    фильтров TaskViewSet. Тестовые данные откатываются после выполнения
+    """
+    help = 'Выводит планы запросов TaskViewSet для всех комбинаций фильтров'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Количество тестовых задач (0 - использовать существующие данные)')
+        parser.add_argument('--projects', type=int, default=50,
+                            help='Количество тестовых проектов')
+        parser.add_argument('--users', type=int, default=200,
+                            help='Количество тестовых пользователей')
+        parser.add_argument('--user', help='Имя пользователя, от лица которого строятся запросы')
+        parser.add_argument('--analyze', action='store_true',
+                            help='Выполнить запросы (EXPLAIN ANALYZE)')
+        parser.add_argument('--random-seed', type=int, default=42,
+                            help='Начальное значение генератора случайных чисел')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Бенчмарк поддерживает только PostgreSQL')
+
+        with transaction.atomic():
+            if options['seed']:
+                user = self.seed(options)
+            else:
+                user = self.get_user(options['user'])
+
+            # Обновляем статистику планировщика
+            with connection.cursor() as cursor:
+                for model in (Task, Project, Project.members.through, User):
+                    cursor.execute(f'ANALYZE {connection.ops.quote_name(model._meta.db_table)}')
+
+            self.explain_all(user, analyze=options['analyze'])
+
+            # Тестовые данные никогда не сохраняются
+            transaction.set_rollback(True)
+
+    def get_user(self, username):
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f'Пользователь {username} не найден')
+
+        user = User.objects.filter(projects__isnull=False).first()
+        if user is None:
+            raise CommandError('Нет данных: укажите --seed для заполнения тестовыми данными')
+        return user
+
+    def seed(self, options):
+        """Заполняет базу тестовыми проектами, пользователями и задачами"""
+        rng = random.Random(options['random_seed'])
+        now = timezone.now()
+
+        users = User.objects.bulk_create([
+            User(username=f'bench_user_{index}') for index in range(options['users'])
+        ])
+        projects = Project.objects.bulk_create([
+            Project(name=f'Бенчмарк {index}', created_by=rng.choice(users))
+            for index in range(options['projects'])
+        ])
+
+        # Каждый пользователь участвует в нескольких проектах
+        Membership = Project.members.through
+        memberships = set()
+        for user in users:
+            for project in rng.sample(projects, min(3, len(projects))):
+                memberships.add((project.id, user.id))
+        Membership.objects.bulk_create([
+            Membership(project_id=project_id, user_id=user_id)
+            for project_id, user_id in memberships
+        ])
+
+        statuses = [choice for choice, _ in Task.STATUS_CHOICES]
+        priorities = [choice for choice, _ in Task.PRIORITY_CHOICES]
+        batch = []
+        for index in range(options['seed']):
+            due_date = None
+            if rng.random() < 0.6:
+                due_date = now + timedelta(days=rng.randint(-7, 90))
+            batch.append(Task(
+                title=f'Задача {index}',
+                project=rng.choice(projects),
+                status=rng.choices(statuses, weights=[2, 2, 1, 5])[0],
+                priority=rng.choice(priorities),
+                assignee=rng.choice(users) if rng.random() < 0.8 else None,
+                created_by=rng.choice(users),
+                due_date=due_date,
+            ))
+            if len(batch) >= 5000:
+                Task.objects.bulk_create(batch)
+                batch = []
+        Task.objects.bulk_create(batch)
+
+        self.stdout.write(
+            f"Создано: задач {options['seed']}, проектов {len(projects)}, пользователей {len(users)}"
+        )
+        return users[0]
+
+    def build_queryset(self, user, params):
+        """Строит queryset так же, как это делает TaskViewSet"""
+        django_request = RequestFactory().get('/api/tasks/', params)
+        django_request.user = user
+
+        view = TaskViewSet()
+        view.request = Request(django_request)
+        view.request.user = user
+        view.format_kwarg = None
+        view.action = 'list'
+        view.kwargs = {}
+
+        return view.filter_queryset(view.get_queryset())
+
+    def explain_all(self, user, analyze=False):
+        project = user.projects.first()
+        summary = []
+
+        for title, params in FILTER_COMBINATIONS:
+            params = {
+                key: value.format(project=project.id if project else 0)
+                for key, value in params.items()
+            }
+            queryset = self.build_queryset(user, params)[:10]
+            plan = queryset.explain(analyze=analyze)
+            indexes = sorted(set(INDEX_PATTERN.findall(plan)))
+
+            self.stdout.write(self.style.MIGRATE_HEADING(f'\n== {title}: {params}'))
+            self.stdout.write(plan)
+            summary.append((title, indexes))
+
+        self.stdout.write(self.style.MIGRATE_HEADING('\n== Итог'))
+        for title, indexes in summary:
+            used = ', '.join(indexes) if indexes else self.style.WARNING('индексы не используются')
+            self.stdout.write(f'{title}: {used}')
@@ -0,0 +1,65 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from tasks.export import CONTENT_TYPES, FORMAT_CSV, iter_export
+from tasks.models import Task
+
+
+class Command(BaseCommand):
+    """
+    Потоковая выгрузка задач проекта или пользователя в CSV / NDJSON
+    (тот же формат, что и у /api/tasks/export/)
+    """
+    help = 'Выгружает задачи (и комментарии) в CSV или NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--project',
+            type=int,
+            action='append',
+            dest='project_ids',
+            help='ID проекта (можно указать несколько раз)'
+        )
+        parser.add_argument(
+            '--assignee',
+            help='Логин исполнителя: только его задачи'
+        )
+        parser.add_argument(
+            '--format',
+            choices=sorted(CONTENT_TYPES),
+            default=FORMAT_CSV,
+            dest='file_format',
+            help='Формат выгрузки (по умолчанию csv)'
+        )
+        parser.add_argument(
+            '--comments',
+            action='store_true',
+            help='Выгрузить вместе с комментариями'
+        )
+        parser.add_argument(
+            '--output',
+            help='Файл для записи (по умолчанию стандартный вывод)'
+        )
+
+    def handle(self, *args, **options):
+        if not options['project_ids'] and not options['assignee']:
+            raise CommandError('Укажите --project и/или --assignee')
+
+        tasks = Task.objects.all()
+        if options['project_ids']:
+            tasks = tasks.filter(project_id__in=options['project_ids'])
+        if options['assignee']:
+            try:
+                assignee = User.objects.get(username=options['assignee'])
+            except User.DoesNotExist:
+                raise CommandError(f"Пользователь {options['assignee']} не найден")
+            tasks = tasks.filter(assignee=assignee)
+
+        content = iter_export(tasks, options['file_format'], options['comments'])
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+                for part in content:
+                    output.write(part)
+        else:
+            for part in content:
+                self.stdout.write(part, ending='')
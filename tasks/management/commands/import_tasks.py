@@ -0,0 +1,89 @@
+import csv
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from projects.models import Project
+from tasks.export import CONTENT_TYPES
+from tasks.importer import TaskImporter, detect_format, iter_records, open_text
+
+
+class Command(BaseCommand):
+    """
+    Пакетный импорт задач и комментариев из CSV / NDJSON
+    (тот же формат, что и у /api/tasks/import/)
+    """
+    help = 'Импортирует задачи (и комментарии) в проект из CSV или NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл для импорта')
+        parser.add_argument(
+            '--project',
+            type=int,
+            required=True,
+            help='ID проекта'
+        )
+        parser.add_argument(
+            '--user',
+            required=True,
+            help='Логин пользователя, от имени которого создаются задачи'
+        )
+        parser.add_argument(
+            '--format',
+            choices=sorted(CONTENT_TYPES),
+            dest='file_format',
+            help='Формат файла (по умолчанию по расширению)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help='Количество записей в порции'
+        )
+        parser.add_argument(
+            '--resume-after',
+            type=int,
+            default=None,
+            help='Продолжить прерванный импорт после этой строки файла'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только проверить файл, ничего не сохраняя'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            project = Project.objects.get(id=options['project'])
+        except Project.DoesNotExist:
+            raise CommandError(f"Проект {options['project']} не найден")
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"Пользователь {options['user']} не найден")
+
+        file_format = options['file_format'] or detect_format(options['path'])
+        importer_options = {'batch_size': options['batch_size']} if options['batch_size'] else {}
+        importer = TaskImporter(project, user, **importer_options)
+
+        with open(options['path'], 'rb') as file:
+            try:
+                report = importer.run(
+                    iter_records(open_text(file), file_format),
+                    dry_run=options['dry_run'], resume_after=options['resume_after']
+                )
+            except (UnicodeDecodeError, csv.Error) as e:
+                message = f'Не удалось прочитать файл: {e}'
+                if importer.last_line is not None and not options['dry_run']:
+                    message += f'. Продолжить: --resume-after {importer.last_line}'
+                raise CommandError(message)
+
+        for error in report['errors']:
+            self.stdout.write(f"Строка {error['line']}: {error['error']}")
+
+        prefix = 'Проверено (без сохранения)' if report['dry_run'] else 'Импортировано'
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}: задач {report['created_tasks']}, комментариев {report['created_comments']}"
+        ))
+        if report['last_line'] is not None and not report['dry_run']:
+            self.stdout.write(f"Последняя обработанная строка: {report['last_line']}")
+        if report['failed']:
+            self.stderr.write(self.style.ERROR(f"Строк с ошибками: {report['failed']}"))
@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Max, Q
+from django.db.models.functions import Length
+from tasks.models import Task
+
+
+class Command(BaseCommand):
+    """
+    Периодическая перебалансировка рангов карточек канбан-доски.
+    Запускается по расписанию (cron): перестраивает только те колонки,
+    где ранги стали слишком длинными или совпали после одновременных перемещений
+    """
+    help = 'Перебалансирует ранги карточек в колонках канбан-досок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--max-length',
+            type=int,
+            default=16,
+            help='Перебалансировать колонки, где длина ранга превышает это значение'
+        )
+        parser.add_argument(
+            '--project',
+            type=int,
+            action='append',
+            dest='project_ids',
+            help='ID проекта (можно указать несколько раз)'
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Перебалансировать все колонки независимо от длины рангов'
+        )
+
+    def handle(self, *args, **options):
+        columns = Task.objects.values('project_id', 'status').annotate(
+            max_rank_length=Max(Length('rank')),
+            duplicates=Count('id') - Count('rank', distinct=True)
+        )
+        if options['project_ids']:
+            columns = columns.filter(project_id__in=options['project_ids'])
+        if not options['all']:
+            columns = columns.filter(
+                Q(max_rank_length__gt=options['max_length']) | Q(duplicates__gt=0)
+            )
+
+        rebalanced = 0
+        for column in columns.order_by('project_id', 'status'):
+            count = Task.rebalance_ranks(column['project_id'], column['status'])
+            rebalanced += 1
+            self.stdout.write(
+                f"Проект {column['project_id']}, колонка «{column['status']}»: карточек {count}"
+            )
+
+        self.stdout.write(self.style.SUCCESS(f'Перебалансировано колонок: {rebalanced}'))
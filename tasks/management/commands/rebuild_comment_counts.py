@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from tasks.models import Task
+
+
+class Command(BaseCommand):
+    """
+    Пересчитывает или проверяет счетчики комментариев задач,
+    например после удаления комментариев напрямую через SQL
+    """
+    help = 'Пересчитывает денормализованные счетчики комментариев задач'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--task',
+            type=int,
+            action='append',
+            dest='task_ids',
+            help='ID задачи (можно указать несколько раз)'
+        )
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только проверить расхождения, не исправляя их'
+        )
+
+    def handle(self, *args, **options):
+        check_only = options['check']
+        drift = Task.rebuild_comment_counts(
+            task_ids=options['task_ids'],
+            dry_run=check_only
+        )
+
+        for task_id, current, expected in drift:
+            self.stdout.write(f'Задача {task_id}: {current} -> {expected}')
+
+        if not drift:
+            self.stdout.write(self.style.SUCCESS('Расхождений не найдено'))
+        elif check_only:
+            # Ненулевой код возврата позволяет использовать проверку в мониторинге
+            self.stderr.write(self.style.ERROR(f'Найдено расхождений: {len(drift)}'))
+            raise SystemExit(1)
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Исправлено расхождений: {len(drift)}'))
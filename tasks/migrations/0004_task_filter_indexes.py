@@ -0,0 +1,46 @@
+# Generated by Django 5.0.4 on 2026-10-18 19:22
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Индексы создаются без блокировки записи в таблицу задач
+    atomic = False
+
+    dependencies = [
+        ("projects", "0002_projectstats"),
+        ("tasks", "0003_task_search_vector"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="task",
+            index=models.Index(
+                fields=["project", "-created_at"], name="task_project_created"
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="task",
+            index=models.Index(
+                fields=["project", "status", "-created_at"],
+                name="task_project_status_created",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="task",
+            index=models.Index(
+                fields=["assignee", "status"], name="task_assignee_status"
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="task",
+            index=models.Index(
+                condition=models.Q(("status", "Завершена"), _negated=True),
+                fields=["due_date"],
+                name="task_open_due_date",
+            ),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.0.4 on 2026-10-18 19:27
+
+from django.conf import settings
+from django.db import migrations, models
+
+from tasks.ranking import evenly_spaced_ranks
+
+
+def populate_task_ranks(apps, schema_editor):
+    """
+    Проставляет ранги существующим задачам в прежнем порядке
+    канбан-доски (новые задачи выше)
+    """
+    Task = apps.get_model("tasks", "Task")
+
+    columns = Task.objects.values_list("project_id", "status").distinct()
+    for project_id, status in columns:
+        tasks = list(
+            Task.objects.filter(project_id=project_id, status=status)
+            .order_by("-created_at", "-id")
+            .only("id")
+        )
+        for task, rank in zip(tasks, evenly_spaced_ranks(len(tasks))):
+            task.rank = rank
+        Task.objects.bulk_update(tasks, ["rank"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("projects", "0002_projectstats"),
+        ("tasks", "0004_task_filter_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="task",
+            name="rank",
+            field=models.TextField(
+                blank=True,
+                db_collation="C",
+                default="",
+                verbose_name="Позиция в колонке",
+            ),
+        ),
+        migrations.RunPython(populate_task_ranks, migrations.RunPython.noop),
+    ]
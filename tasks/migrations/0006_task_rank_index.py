@@ -0,0 +1,22 @@
+# Generated by Django 5.0.4 on 2026-10-18 19:40
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Индекс создается без блокировки записи в таблицу задач
+    atomic = False
+
+    dependencies = [
+        ("tasks", "0005_task_rank"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="task",
+            index=models.Index(
+                fields=["project", "status", "rank"], name="task_project_status_rank"
+            ),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.0.4 on 2026-10-18 19:45
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_comments_count(apps, schema_editor):
+    """Заполняет счетчик комментариев существующих задач одним UPDATE"""
+    Task = apps.get_model("tasks", "Task")
+    Comment = apps.get_model("tasks", "Comment")
+
+    Task.objects.update(
+        comments_count=Coalesce(
+            Subquery(
+                Comment.objects.filter(task=OuterRef("pk"))
+                .order_by()
+                .values("task")
+                .annotate(count=Count("id"))
+                .values("count")
+            ),
+            0,
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tasks", "0006_task_rank_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="task",
+            name="comments_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="Количество комментариев"
+            ),
+        ),
+        migrations.RunPython(populate_comments_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,111 @@
+# Generated by Django 5.0.4 on 2026-10-18 19:42
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def populate_transitions(apps, schema_editor):
+    """
+    Восстанавливает историю существующих задач приближенно: создание
+    задачи в статусе "Новая" и, для остальных задач, переход
+    в текущий статус в момент последнего изменения
+    """
+    Task = apps.get_model("tasks", "Task")
+    TaskStatusTransition = apps.get_model("tasks", "TaskStatusTransition")
+    quote = schema_editor.quote_name
+    transitions = quote(TaskStatusTransition._meta.db_table)
+    tasks = quote(Task._meta.db_table)
+
+    schema_editor.execute(
+        f"INSERT INTO {transitions} (task_id, project_id, from_status, to_status, changed_at) "
+        f"SELECT id, project_id, NULL, %s, created_at FROM {tasks}",
+        ["Новая"],
+    )
+    schema_editor.execute(
+        f"INSERT INTO {transitions} (task_id, project_id, from_status, to_status, changed_at) "
+        f"SELECT id, project_id, %s, status, updated_at FROM {tasks} WHERE status <> %s",
+        ["Новая", "Новая"],
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("projects", "0003_projectchange"),
+        ("tasks", "0007_task_comments_count"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TaskStatusTransition",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "from_status",
+                    models.CharField(
+                        blank=True,
+                        max_length=20,
+                        null=True,
+                        verbose_name="Предыдущий статус",
+                    ),
+                ),
+                (
+                    "to_status",
+                    models.CharField(
+                        blank=True,
+                        max_length=20,
+                        null=True,
+                        verbose_name="Новый статус",
+                    ),
+                ),
+                (
+                    "changed_at",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now, verbose_name="Дата перехода"
+                    ),
+                ),
+                (
+                    "project",
+                    models.ForeignKey(
+                        db_constraint=False,
+                        db_index=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="+",
+                        to="projects.project",
+                        verbose_name="Проект",
+                    ),
+                ),
+                (
+                    "task",
+                    models.ForeignKey(
+                        db_constraint=False,
+                        db_index=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="+",
+                        to="tasks.task",
+                        verbose_name="Задача",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Смена статуса задачи",
+                "verbose_name_plural": "Смены статусов задач",
+                "indexes": [
+                    models.Index(
+                        fields=["project", "changed_at"],
+                        name="task_transition_project_time",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(populate_transitions, migrations.RunPython.noop),
+    ]
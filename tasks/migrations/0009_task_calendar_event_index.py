@@ -0,0 +1,27 @@
+# Generated by Django 5.0.4 on 2026-10-18 20:05
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Индекс создается без блокировки записи в таблицу задач
+    atomic = False
+
+    dependencies = [
+        ("projects", "0003_projectchange"),
+        ("tasks", "0008_taskstatustransition"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="task",
+            index=models.Index(
+                condition=models.Q(("google_calendar_event_id__isnull", False)),
+                fields=["google_calendar_event_id"],
+                name="task_calendar_event",
+            ),
+        ),
+    ]
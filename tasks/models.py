@@ -1,6 +1,28 @@
-from django.db import models
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from django.db import models, transaction
+from django.db.models import Count, F, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from django.contrib.auth.models import User
-from projects.models import Project
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+from projects.models import Project, ProjectStats, ProjectChange
+from realtime import events
+from .ranking import rank_between, ranks_between, evenly_spaced_ranks
+
+
+class TaskQuerySet(models.QuerySet):
+
+    def bulk_create(self, objs, *args, **kwargs):
+        # bulk_create не вызывает save(): карточки без ранга получают
+        # ранги здесь же, до вставки
+        objs = list(objs)
+        self.model.assign_column_ranks([obj for obj in objs if not obj.rank])
+        return super().bulk_create(objs, *args, **kwargs)
 
 
 class Task(models.Model):
@@ -74,15 +96,191 @@ class Task(models.Model):
         blank=True,
         verbose_name="ID события в Google Calendar"
     )
+    # Пользователь, в чьем календаре находится событие
+    google_calendar_user = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name="Владелец события в Google Calendar"
+    )
+
+    # Денормализованное количество комментариев. Меняется только
+    # атомарными UPDATE с F-выражениями (см. сигналы комментариев)
+    comments_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Количество комментариев"
+    )
+
+    # Лексикографический ранг карточки внутри колонки канбан-доски
+    # (см. tasks/ranking.py). Сравнение побайтовое, поэтому collation "C"
+    rank = models.TextField(
+        blank=True,
+        default='',
+        db_collation='C',
+        verbose_name="Позиция в колонке"
+    )
+
+    # Поисковый вектор для полнотекстового поиска (русская конфигурация).
+    # Вычисляется самой базой данных при каждой записи задачи
+    search_vector = models.GeneratedField(
+        expression=(
+            SearchVector('title', weight='A', config='russian')
+            + SearchVector('description', weight='B', config='russian')
+        ),
+        output_field=SearchVectorField(),
+        db_persist=True,
+        verbose_name="Поисковый вектор"
+    )
+
+    objects = TaskQuerySet.as_manager()
 
     class Meta:
         verbose_name = "Задача"
         verbose_name_plural = "Задачи"
         ordering = ['-created_at']
+        indexes = [
+            GinIndex(fields=['search_vector'], name='task_search_vector_gin'),
+            # Порядок карточек в колонках канбан-доски
+            models.Index(fields=['project', 'status', 'rank'], name='task_project_status_rank'),
+            # Список задач проекта (TaskViewSet, ?project=) с сортировкой по дате
+            models.Index(fields=['project', '-created_at'], name='task_project_created'),
+            # Канбан-колонки и фильтр ?project=&status=
+            models.Index(fields=['project', 'status', '-created_at'], name='task_project_status_created'),
+            # "Мои задачи" (?assigned_to_me=) и статистика пользователя
+            models.Index(fields=['assignee', 'status'], name='task_assignee_status'),
+            # Просроченные задачи: в индекс попадают только незавершенные
+            models.Index(
+                fields=['due_date'],
+                condition=~models.Q(status='Завершена'),
+                name='task_open_due_date'
+            ),
+            # Поиск задач по событиям календаря при загрузке изменений из Google Calendar
+            models.Index(
+                fields=['google_calendar_event_id'],
+                condition=models.Q(google_calendar_event_id__isnull=False),
+                name='task_calendar_event'
+            ),
+        ]
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        """
+        Сохраняет задачу и обновляет счетчики проекта в одной транзакции.
+        Существующая задача без update_fields записывает только загруженные
+        поля, кроме comments_count: счетчик, прочитанный до новых
+        комментариев, не перезаписывается. Как и у объекта с отложенными
+        полями в Django, сохранение задачи, строка которой уже удалена,
+        не вставляет ее заново, а вызывает DatabaseError; вставить ее
+        снова можно через save(force_insert=True)
+        """
+        with transaction.atomic():
+            if self._needs_column_rank():
+                # Новая карточка или карточка, перенесенная в другую колонку
+                # без явной позиции, встает в начало колонки
+                self.rank = Task.get_top_rank(self.project_id, self.status, exclude_id=self.pk)
+                update_fields = kwargs.get('update_fields')
+                if update_fields is not None and 'rank' not in update_fields:
+                    kwargs['update_fields'] = [*update_fields, 'rank']
+
+            full_save = kwargs.get('update_fields') is None and not kwargs.get('force_insert')
+            if not self._state.adding and full_save:
+                # Полное сохранение не должно перезаписывать счетчик
+                # комментариев значением, прочитанным до новых комментариев
+                kwargs['update_fields'] = self.get_saved_field_names()
+
+            super().save(*args, **kwargs)
+
+        # Сигналы post_save уже отработали: сохраненное состояние становится исходным
+        self._original_project_id = self.project_id
+        self._original_status = self.status
+        self._original_rank = self.__dict__.get('rank')
+
+    def _needs_column_rank(self):
+        if self._state.adding:
+            return not self.rank
+        if self._original_status is None:
+            return False
+        column_changed = (
+            (self._original_project_id, self._original_status) != (self.project_id, self.status)
+        )
+        return column_changed and self.rank == self._original_rank
+
+    def get_saved_field_names(self):
+        """Загруженные поля, которые записывает обычный save()"""
+        deferred = self.get_deferred_fields()
+        return [
+            field.name for field in self._meta.concrete_fields
+            if not field.primary_key
+            and not field.generated
+            and field.name != 'comments_count'
+            and field.attname not in deferred
+        ]
+
+    @classmethod
+    def get_top_rank(cls, project_id, status, exclude_id=None):
+        """Ранг для карточки, которая встает в начало колонки"""
+        column = cls.objects.filter(project_id=project_id, status=status)
+        if exclude_id is not None:
+            column = column.exclude(id=exclude_id)
+        first_rank = column.order_by('rank').values_list('rank', flat=True).first()
+        return rank_between(None, first_rank or None)
+
+    @classmethod
+    def get_last_rank(cls, project_id, status):
+        """Ранг последней карточки колонки (None - колонка пуста)"""
+        return cls.objects.filter(
+            project_id=project_id, status=status
+        ).order_by('-rank').values_list('rank', flat=True).first()
+
+    @classmethod
+    def assign_column_ranks(cls, tasks):
+        """
+        Выдает ранги новым карточкам, создаваемым пакетом (bulk_create):
+        они встают после последней карточки своей колонки в порядке
+        списка. Последние ранги всех колонок загружаются одним запросом
+        """
+        columns = {}
+        for task in tasks:
+            columns.setdefault((task.project_id, task.status), []).append(task)
+        if not columns:
+            return
+
+        condition = models.Q()
+        for project_id, status in columns:
+            condition |= models.Q(project_id=project_id, status=status)
+        last_ranks = {
+            (row['project_id'], row['status']): row['last_rank']
+            for row in cls.objects.filter(condition).values('project_id', 'status').annotate(last_rank=Max('rank'))
+        }
+
+        for key, column_tasks in columns.items():
+            ranks = ranks_between(last_ranks.get(key) or None, None, len(column_tasks))
+            for task, rank in zip(column_tasks, ranks):
+                task.rank = rank
+
+    @classmethod
+    def rebalance_ranks(cls, project_id, status):
+        """
+        Равномерно перераспределяет ранги колонки, сохраняя порядок карточек.
+        Возвращает количество карточек в колонке
+        """
+        with transaction.atomic():
+            tasks = list(
+                cls.objects.select_for_update().filter(
+                    project_id=project_id,
+                    status=status
+                ).order_by('rank', 'id').only('id', 'rank')
+            )
+            for task, rank in zip(tasks, evenly_spaced_ranks(len(tasks))):
+                task.rank = rank
+            cls.objects.bulk_update(tasks, ['rank'], batch_size=1000)
+        return len(tasks)
+
     def is_overdue(self):
         """Проверка, просрочена ли задача"""
         from django.utils import timezone
@@ -90,10 +288,43 @@ class Task(models.Model):
             return self.due_date < timezone.now()
         return False
 
-    @property
-    def comments_count(self):
-        """Возвращает количество комментариев к задаче"""
-        return self.comments.count()
+    @classmethod
+    def rebuild_comment_counts(cls, task_ids=None, dry_run=False):
+        """
+        Пересчитывает счетчики комментариев по таблице комментариев.
+        Возвращает список расхождений (task_id, было, стало)
+        """
+        tasks = cls.objects.all()
+        if task_ids:
+            tasks = tasks.filter(id__in=task_ids)
+
+        actual_count = Coalesce(
+            Subquery(
+                Comment.objects.filter(
+                    task=OuterRef('pk')
+                ).order_by().values('task').annotate(count=Count('id')).values('count')
+            ),
+            0
+        )
+
+        with transaction.atomic():
+            drift = list(
+                tasks.select_for_update().annotate(
+                    actual_count=actual_count
+                ).exclude(
+                    comments_count=F('actual_count')
+                ).order_by('id').values_list('id', 'comments_count', 'actual_count')
+            )
+
+            if dry_run or not drift:
+                return drift
+
+            # Один UPDATE для всех расходящихся задач
+            cls.objects.filter(
+                id__in=[task_id for task_id, _, _ in drift]
+            ).update(comments_count=actual_count)
+
+        return drift
 
 
 class Comment(models.Model):
@@ -122,4 +353,258 @@ class Comment(models.Model):
         ordering = ['created_at']
 
     def __str__(self):
-        return f"Комментарий от {self.author.username} к задаче {self.task.id}"
\ No newline at end of file
+        return f"Комментарий от {self.author.username} к задаче {self.task.id}"
+
+
+# Переходы, накапливаемые внутри TaskStatusTransition.collect()
+_pending_transitions = ContextVar('pending_task_transitions', default=None)
+
+
+class TaskStatusTransition(models.Model):
+    """
+    Журнал смен статусов задач (только добавление записей).
+    Пишется в одной транзакции со сменой статуса. from_status пустой -
+    задача появилась в проекте, to_status пустой - задача удалена
+    или перенесена в другой проект
+    """
+    # Без ограничений внешних ключей: история переживает удаление задач
+    task = models.ForeignKey(
+        Task,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        db_index=False,
+        related_name='+',
+        verbose_name="Задача"
+    )
+    project = models.ForeignKey(
+        Project,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        db_index=False,
+        related_name='+',
+        verbose_name="Проект"
+    )
+    from_status = models.CharField(max_length=20, null=True, blank=True, verbose_name="Предыдущий статус")
+    to_status = models.CharField(max_length=20, null=True, blank=True, verbose_name="Новый статус")
+    changed_at = models.DateTimeField(default=timezone.now, verbose_name="Дата перехода")
+
+    class Meta:
+        verbose_name = "Смена статуса задачи"
+        verbose_name_plural = "Смены статусов задач"
+        indexes = [
+            models.Index(fields=['project', 'changed_at'], name='task_transition_project_time'),
+        ]
+
+    def __str__(self):
+        return f"{self.task_id}: {self.from_status} -> {self.to_status}"
+
+    @classmethod
+    def record(cls, transitions):
+        """
+        Добавляет переходы вида (task_id, project_id, from_status, to_status)
+        """
+        now = timezone.now()
+        rows = [
+            cls(task_id=task_id, project_id=project_id,
+                from_status=from_status, to_status=to_status, changed_at=now)
+            for task_id, project_id, from_status, to_status in transitions
+        ]
+
+        # Внутри collect() записи только накапливаются
+        pending = _pending_transitions.get()
+        if pending is not None:
+            pending.extend(rows)
+            return
+
+        cls.objects.bulk_create(rows)
+
+    @classmethod
+    @contextmanager
+    def collect(cls):
+        """Накапливает переходы внутри блока и добавляет их одним INSERT"""
+        if _pending_transitions.get() is not None:
+            yield
+            return
+
+        pending = []
+        token = _pending_transitions.set(pending)
+        try:
+            yield
+        finally:
+            _pending_transitions.reset(token)
+        cls.objects.bulk_create(pending, batch_size=1000)
+
+
+# Сигналы для поддержки счетчиков задач проекта (ProjectStats)
+@receiver(post_init, sender=Task)
+def remember_task_status(sender, instance, **kwargs):
+    # Запоминаем исходные проект и статус, не трогая отложенные поля
+    instance._original_project_id = instance.__dict__.get('project_id')
+    instance._original_status = instance.__dict__.get('status')
+    instance._original_rank = instance.__dict__.get('rank')
+
+
+@receiver(post_save, sender=Task)
+def update_project_stats_on_save(sender, instance, created, **kwargs):
+    deltas = Counter()
+    new_key = (instance.project_id, instance.status)
+
+    if created:
+        deltas[new_key] += 1
+    elif instance._original_status is not None:
+        old_key = (instance._original_project_id, instance._original_status)
+        if old_key != new_key:
+            deltas[old_key] -= 1
+            deltas[new_key] += 1
+
+    ProjectStats.apply_deltas(deltas)
+
+
+@receiver(post_delete, sender=Task)
+def update_project_stats_on_delete(sender, instance, **kwargs):
+    ProjectStats.apply_deltas({(instance.project_id, instance.status): -1})
+
+
+# Сигналы журнала изменений проекта (ProjectChange) для инкрементальной синхронизации
+@receiver(post_save, sender=Task)
+def record_task_change_on_save(sender, instance, created, **kwargs):
+    # Задача, перенесенная в другой проект, для старого проекта удалена
+    old_project_id = instance._original_project_id
+    if not created and old_project_id is not None and old_project_id != instance.project_id:
+        ProjectChange.record(
+            old_project_id, ProjectChange.KIND_TASK, [instance.id], ProjectChange.ACTION_DELETE
+        )
+    ProjectChange.record(instance.project_id, ProjectChange.KIND_TASK, [instance.id])
+
+
+@receiver(post_delete, sender=Task)
+def record_task_change_on_delete(sender, instance, **kwargs):
+    ProjectChange.record(
+        instance.project_id, ProjectChange.KIND_TASK, [instance.id], ProjectChange.ACTION_DELETE
+    )
+
+
+# Сигналы журнала смен статусов (TaskStatusTransition)
+@receiver(post_save, sender=Task)
+def record_status_transition_on_save(sender, instance, created, **kwargs):
+    old_project_id = instance._original_project_id
+    old_status = instance._original_status
+
+    if created:
+        TaskStatusTransition.record([(instance.id, instance.project_id, None, instance.status)])
+    elif old_status is None:
+        # Исходный статус неизвестен (задача загружена без поля status)
+        return
+    elif old_project_id != instance.project_id:
+        TaskStatusTransition.record([
+            (instance.id, old_project_id, old_status, None),
+            (instance.id, instance.project_id, None, instance.status),
+        ])
+    elif old_status != instance.status:
+        TaskStatusTransition.record([(instance.id, instance.project_id, old_status, instance.status)])
+
+
+@receiver(post_delete, sender=Task)
+def record_status_transition_on_delete(sender, instance, **kwargs):
+    TaskStatusTransition.record([(instance.id, instance.project_id, instance.status, None)])
+
+
+# Сигналы денормализованного счетчика комментариев задачи
+@receiver(post_save, sender=Comment)
+def increment_comments_count(sender, instance, created, **kwargs):
+    if created:
+        Task.objects.filter(pk=instance.task_id).update(comments_count=F('comments_count') + 1)
+
+
+@receiver(post_delete, sender=Comment)
+def decrement_comments_count(sender, instance, origin=None, **kwargs):
+    # Комментарии, удаляемые каскадно вместе с задачей, не пересчитываем
+    if isinstance(origin, Task) or getattr(origin, 'model', None) is Task:
+        return
+    Task.objects.filter(
+        pk=instance.task_id, comments_count__gt=0
+    ).update(comments_count=F('comments_count') - 1)
+
+
+def get_comment_project_id(comment):
+    """
+    ID проекта комментария. Если задача комментария не загружена,
+    читается только ее project_id (один раз на объект комментария)
+    """
+    if Comment.task.is_cached(comment):
+        return comment.task.project_id
+    if getattr(comment, '_project_id', None) is None:
+        comment._project_id = Task.objects.filter(
+            pk=comment.task_id
+        ).values_list('project_id', flat=True).first()
+    return comment._project_id
+
+
+@receiver(post_save, sender=Comment)
+def record_comment_change_on_save(sender, instance, **kwargs):
+    ProjectChange.record(get_comment_project_id(instance), ProjectChange.KIND_COMMENT, [instance.id])
+
+
+@receiver(post_delete, sender=Comment)
+def record_comment_change_on_delete(sender, instance, origin=None, **kwargs):
+    # При удалении задачи ее комментарии удаляются каскадно:
+    # клиенту достаточно записи об удалении самой задачи
+    if isinstance(origin, Task) or getattr(origin, 'model', None) is Task:
+        return
+    ProjectChange.record(
+        get_comment_project_id(instance), ProjectChange.KIND_COMMENT, [instance.id], ProjectChange.ACTION_DELETE
+    )
+
+
+# Сигналы push-канала проекта (realtime): события публикуются после фиксации транзакции
+@receiver(post_save, sender=Task)
+def publish_task_event_on_save(sender, instance, created, **kwargs):
+    old_project_id = instance._original_project_id
+    if created:
+        events.publish_project_event(
+            instance.project_id, events.TASK_CREATED,
+            task_id=instance.id, status=instance.status, rank=instance.rank
+        )
+    elif old_project_id is not None and old_project_id != instance.project_id:
+        # Перенос в другой проект: удаление в старом, создание в новом
+        events.publish_project_event(old_project_id, events.TASK_DELETED, task_id=instance.id)
+        events.publish_project_event(
+            instance.project_id, events.TASK_CREATED,
+            task_id=instance.id, status=instance.status, rank=instance.rank
+        )
+    elif (instance._original_status is not None
+          and (instance._original_status, instance._original_rank) != (instance.status, instance.rank)):
+        events.publish_project_event(
+            instance.project_id, events.TASK_MOVED,
+            task_id=instance.id, status=instance.status,
+            previous_status=instance._original_status, rank=instance.rank
+        )
+    else:
+        events.publish_project_event(
+            instance.project_id, events.TASK_UPDATED, task_id=instance.id, status=instance.status
+        )
+
+
+@receiver(post_delete, sender=Task)
+def publish_task_event_on_delete(sender, instance, **kwargs):
+    events.publish_project_event(instance.project_id, events.TASK_DELETED, task_id=instance.id)
+
+
+@receiver(post_save, sender=Comment)
+def publish_comment_event_on_save(sender, instance, created, **kwargs):
+    events.publish_project_event(
+        get_comment_project_id(instance),
+        events.COMMENT_CREATED if created else events.COMMENT_UPDATED,
+        task_id=instance.task_id, comment_id=instance.id
+    )
+
+
+@receiver(post_delete, sender=Comment)
+def publish_comment_event_on_delete(sender, instance, origin=None, **kwargs):
+    # Каскадное удаление вместе с задачей покрывается событием task.deleted
+    if isinstance(origin, Task) or getattr(origin, 'model', None) is Task:
+        return
+    events.publish_project_event(
+        get_comment_project_id(instance), events.COMMENT_DELETED,
+        task_id=instance.task_id, comment_id=instance.id
+    )
@@ -0,0 +1,110 @@
+"""
+Лексикографические ранги для упорядочивания карточек в колонках канбан-доски.
+
+Ранг - строка из цифр base36, которая читается как дробь 0.xxxx.
+Между любыми двумя рангами всегда можно вставить новый, поэтому
+перемещение карточки меняет только одну строку в таблице задач.
+Ранги никогда не заканчиваются на '0', иначе у одной дроби было бы
+несколько записей и середину между ними найти было бы нельзя.
+"""
+ALPHABET = '0123456789abcdefghijklmnopqrstuvwxyz'
+BASE = len(ALPHABET)
+
+
+def rank_between(before=None, after=None):
+    """
+    Возвращает ранг строго между before и after.
+    None означает начало или конец колонки
+    """
+    if before and after is None:
+        return _increment(before)
+    if not before and after is not None:
+        return _decrement(after)
+
+    before = before or ''
+    if after is not None and before >= after:
+        raise ValueError(f'Ранг {before!r} должен быть меньше {after!r}')
+    return _midpoint(before, after)
+
+
+def ranks_between(before, after, count):
+    """
+    Возвращает count возрастающих рангов строго между before и after
+    (None - край колонки). Середина делит промежуток пополам, поэтому
+    длина рангов растет логарифмически от count, а не линейно
+    """
+    if count <= 0:
+        return []
+    middle = rank_between(before, after)
+    left = (count - 1) // 2
+    return [
+        *ranks_between(before, middle, left),
+        middle,
+        *ranks_between(middle, after, count - 1 - left),
+    ]
+
+
+def _increment(rank):
+    """
+    Ранг для карточки в конце колонки: минимальный шаг вперед.
+    Длина растет на один символ примерно раз в 35 вставок, а не в 5,
+    как при делении пополам
+    """
+    for index in range(len(rank) - 1, -1, -1):
+        if rank[index] != ALPHABET[-1]:
+            return rank[:index] + ALPHABET[ALPHABET.index(rank[index]) + 1]
+    return rank + ALPHABET[1]
+
+
+def _decrement(rank):
+    """Ранг для карточки в начале колонки: минимальный шаг назад"""
+    digit = ALPHABET.index(rank[-1])
+    if digit > 1:
+        return rank[:-1] + ALPHABET[digit - 1]
+    return rank[:-1] + ALPHABET[0] + ALPHABET[-1]
+
+
+def _midpoint(low, high):
+    # Общий префикс (с дополнением low нулями) переносим в результат как есть
+    if high is not None:
+        prefix_length = 0
+        while (prefix_length < len(high)
+               and (low[prefix_length] if prefix_length < len(low) else '0') == high[prefix_length]):
+            prefix_length += 1
+        if prefix_length:
+            return high[:prefix_length] + _midpoint(low[prefix_length:], high[prefix_length:])
+
+    low_digit = ALPHABET.index(low[0]) if low else 0
+    high_digit = ALPHABET.index(high[0]) if high is not None else BASE
+
+    if high_digit - low_digit > 1:
+        return ALPHABET[(low_digit + high_digit) // 2]
+
+    # Соседние цифры: если у high есть продолжение, его первая цифра уже подходит
+    if high is not None and len(high) > 1:
+        return high[0]
+
+    return ALPHABET[low_digit] + _midpoint(low[1:], None)
+
+
+def evenly_spaced_ranks(count):
+    """
+    Возвращает count возрастающих рангов, равномерно распределенных
+    по всему диапазону. Используется при перебалансировке колонки
+    """
+    width = 1
+    while BASE ** width <= count:
+        width += 1
+    # Дополнительный разряд оставляет место для будущих вставок
+    width += 1
+
+    span = BASE ** width
+    ranks = []
+    for index in range(1, count + 1):
+        value = index * span // (count + 1)
+        digits = []
+        for _ in range(width):
+            value, digit = divmod(value, BASE)
+            digits.append(ALPHABET[digit])
+        ranks.append(''.join(reversed(digits)).rstrip('0'))
+    return ranks
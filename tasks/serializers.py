@@ -1,7 +1,7 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from .models import Task, Comment
-from projects.models import Project
+from projects.membership import is_project_member
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -18,16 +18,15 @@ class TaskSerializer(serializers.ModelSerializer):
     assignee = UserSerializer(read_only=True)
     created_by = UserSerializer(read_only=True)
     is_overdue = serializers.SerializerMethodField()
-    comments_count = serializers.SerializerMethodField()
 
     class Meta:
         model = Task
         fields = [
             'id', 'title', 'description', 'status', 'priority', 'project', 'project_name',
             'assignee', 'assignee_id', 'created_by', 'due_date', 'created_at',
-            'updated_at', 'google_calendar_event_id', 'is_overdue', 'comments_count'
+            'updated_at', 'google_calendar_event_id', 'is_overdue', 'comments_count', 'rank'
         ]
-        read_only_fields = ['id', 'created_at', 'updated_at', 'created_by', 'is_overdue', 'comments_count']
+        read_only_fields = ['id', 'created_at', 'updated_at', 'created_by', 'is_overdue', 'comments_count', 'rank']
         extra_kwargs = {
             'assignee_id': {'write_only': True, 'source': 'assignee', 'required': False},
             'google_calendar_event_id': {'read_only': True}
@@ -41,14 +40,23 @@ class TaskSerializer(serializers.ModelSerializer):
         """Проверяет, просрочена ли задача"""
         return obj.is_overdue()
 
-    def get_comments_count(self, obj):
-        """Возвращает количество комментариев к задаче"""
-        return obj.comments.count()
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+
+        # Результаты полнотекстового поиска дополняем рангом и фрагментами
+        if hasattr(instance, 'search_rank'):
+            data['search_rank'] = instance.search_rank
+            data['search_headline'] = {
+                'title': instance.title_headline,
+                'description': instance.description_headline,
+            }
+
+        return data
 
     def validate_project(self, value):
         """Проверяет, имеет ли пользователь доступ к проекту"""
-        user = self.context['request'].user
-        if not value.members.filter(id=user.id).exists():
+        request = self.context['request']
+        if not is_project_member(request.user, value.id, request):
             raise serializers.ValidationError("У вас нет доступа к этому проекту")
         return value
 
@@ -56,15 +64,10 @@ class TaskSerializer(serializers.ModelSerializer):
         """Проверяет, является ли назначаемый пользователь участником проекта"""
         if value:
             project_id = self.initial_data.get('project')
-            if project_id:
-                try:
-                    project = Project.objects.get(id=project_id)
-                    if not project.members.filter(id=value.id).exists():
-                        raise serializers.ValidationError(
-                            "Исполнитель должен быть участником проекта"
-                        )
-                except Project.DoesNotExist:
-                    pass
+            if project_id and not is_project_member(value, project_id, self.context.get('request')):
+                raise serializers.ValidationError(
+                    "Исполнитель должен быть участником проекта"
+                )
         return value
 
     def create(self, validated_data):
@@ -107,4 +110,48 @@ class TaskPriorityUpdateSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Task
-        fields = ['priority']
\ No newline at end of file
+        fields = ['priority']
+
+class TaskMoveSerializer(serializers.Serializer):
+    """
+    Сериализатор для перемещения карточки на канбан-доске.
+    previous_id - карточка, которая окажется непосредственно выше,
+    next_id - карточка непосредственно ниже
+    """
+    status = serializers.ChoiceField(choices=Task.STATUS_CHOICES, required=False)
+    previous_id = serializers.IntegerField(required=False, allow_null=True)
+    next_id = serializers.IntegerField(required=False, allow_null=True)
+
+
+class TaskBulkActionSerializer(serializers.Serializer):
+    """Сериализатор для массового изменения или удаления задач"""
+    ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
+        max_length=1000
+    )
+    status = serializers.ChoiceField(choices=Task.STATUS_CHOICES, required=False)
+    priority = serializers.ChoiceField(choices=Task.PRIORITY_CHOICES, required=False)
+    assignee_id = serializers.IntegerField(required=False, allow_null=True)
+    due_date = serializers.DateTimeField(required=False, allow_null=True)
+    delete = serializers.BooleanField(required=False, default=False)
+
+    # Поля, которые можно изменить массово
+    CHANGE_FIELDS = ['status', 'priority', 'assignee_id', 'due_date']
+
+    def validate(self, attrs):
+        changes = {field: attrs[field] for field in self.CHANGE_FIELDS if field in attrs}
+
+        if attrs['delete'] and changes:
+            raise serializers.ValidationError(
+                {"error": "Нельзя одновременно изменять и удалять задачи"}
+            )
+        if not attrs['delete'] and not changes:
+            raise serializers.ValidationError(
+                {"error": "Необходимо указать изменения или delete"}
+            )
+
+        # Убираем повторяющиеся ID, сохраняя порядок
+        attrs['ids'] = list(dict.fromkeys(attrs['ids']))
+        attrs['changes'] = changes
+        return attrs
@@ -0,0 +1,25 @@
+from django.contrib.auth.models import User
+from django.test import TestCase
+from rest_framework.test import APIClient
+from projects.models import Project
+from .models import Task
+
+
+class TaskAPITestCase(TestCase):
+    """
+    Общая подготовка тестов API задач и аналитики:
+    проект с участником и клиент API от его имени
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='owner', password='password')
+        self.project = Project.objects.create(name='Проект', created_by=self.user)
+        self.project.members.add(self.user)
+
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def create_task(self, title='Задача', **kwargs):
+        kwargs.setdefault('project', self.project)
+        kwargs.setdefault('created_by', self.user)
+        return Task.objects.create(title=title, **kwargs)
@@ -1,3 +1,830 @@
-from django.test import TestCase
+import csv
+import json
+import os
+import tempfile
+from datetime import timedelta
+from importlib import import_module
+from io import StringIO
+from unittest.mock import patch
+from django.apps import apps as django_apps
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection, transaction
+from django.test import SimpleTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from projects.models import Project, ProjectStats
+from .models import Task, Comment, TaskStatusTransition
+from .export import iter_csv, iter_records
+from .importer import IMPORT_BATCH_SIZE, TaskImporter, iter_records as import_records
+from .ranking import evenly_spaced_ranks, rank_between, ranks_between
+from .testing import TaskAPITestCase
+from .views import TaskViewSet
 
-# Create your tests here.
+
+class KeysetPaginationTest(TaskAPITestCase):
+    """Курсорная пагинация списков задач и комментариев"""
+
+    def collect_pages(self, url):
+        """Проходит все страницы по ссылкам next. Возвращает ID записей и число страниц"""
+        ids = []
+        pages = 0
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            ids.extend(item['id'] for item in data['results'])
+            url = data['next']
+            pages += 1
+        return ids, pages
+
+    def test_cursor_round_trip(self):
+        tasks = [self.create_task(f'Задача {index}') for index in range(7)]
+        ids, pages = self.collect_pages(f'/api/tasks/?project={self.project.id}&cursor=&page_size=3')
+        self.assertEqual(ids, [task.id for task in reversed(tasks)])
+        self.assertEqual(pages, 3)
+
+    def test_ties_on_sort_key(self):
+        tasks = [self.create_task(f'Задача {index}') for index in range(5)]
+        # Одинаковое время создания: порядок и границы страниц задает id
+        Task.objects.filter(project=self.project).update(created_at=timezone.now())
+
+        ids, _ = self.collect_pages(f'/api/tasks/?project={self.project.id}&cursor=&page_size=2')
+        self.assertEqual(ids, sorted(task.id for task in tasks)[::-1])
+
+    def test_new_rows_do_not_shift_pages(self):
+        for index in range(4):
+            self.create_task(f'Задача {index}')
+        first = self.client.get(f'/api/tasks/?project={self.project.id}&cursor=&page_size=2').json()
+        self.create_task('Новая задача')
+        second = self.client.get(first['next']).json()
+        seen = [item['id'] for item in first['results'] + second['results']]
+        self.assertEqual(len(set(seen)), 4)
+
+    def test_page_number_fallback(self):
+        for index in range(12):
+            self.create_task(f'Задача {index}')
+        data = self.client.get(f'/api/tasks/?project={self.project.id}&page=2').json()
+        self.assertEqual(data['count'], 12)
+        self.assertEqual(len(data['results']), 2)
+        self.assertIsNotNone(data['previous'])
+
+    def test_cursor_rejects_other_ordering(self):
+        self.create_task('Отчет')
+        response = self.client.get('/api/tasks/?cursor=&ordering=due_date')
+        self.assertEqual(response.status_code, 400)
+        # Сортировка по релевантности поиска тоже несовместима с курсором
+        response = self.client.get('/api/tasks/?cursor=&search=отчет')
+        self.assertEqual(response.status_code, 400)
+
+        # Порядок курсора, заданный явно, допустим
+        response = self.client.get('/api/tasks/?cursor=&ordering=-created_at')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get('/api/tasks/?cursor=&search=отчет&ordering=-created_at')
+        self.assertEqual(len(response.json()['results']), 1)
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/tasks/?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, 404)
+
+    def test_comments_cursor(self):
+        task = self.create_task()
+        comments = [Comment.objects.create(task=task, author=self.user, text=f'{index}') for index in range(5)]
+        ids, _ = self.collect_pages(f'/api/tasks/{task.id}/comments/?cursor=&page_size=2')
+        self.assertEqual(ids, [comment.id for comment in comments])
+
+
+class TaskFullTextSearchTest(TaskAPITestCase):
+    """Полнотекстовый поиск задач: морфология, ранжирование, фрагменты"""
+
+    def search(self, query, **params):
+        params = '&'.join(f'{key}={value}' for key, value in params.items())
+        response = self.client.get(f'/api/tasks/?search={query}&{params}')
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results']
+
+    def test_russian_word_forms(self):
+        task = self.create_task('Настроить отчеты', description='Ежемесячный отчет для бухгалтерии')
+        self.create_task('Исправить вход')
+        results = self.search('отчетом')
+        self.assertEqual([item['id'] for item in results], [task.id])
+
+    def test_title_match_ranks_higher(self):
+        in_description = self.create_task('Созвон', description='Обсудить релиз')
+        in_title = self.create_task('Релиз версии 2.0')
+        results = self.search('релиз')
+        self.assertEqual([item['id'] for item in results], [in_title.id, in_description.id])
+        self.assertGreater(results[0]['search_rank'], results[1]['search_rank'])
+
+    def test_explicit_ordering_overrides_rank(self):
+        first = self.create_task('Созвон', description='Обсудить релиз')
+        second = self.create_task('Релиз версии 2.0')
+        results = self.search('релиз', ordering='created_at')
+        self.assertEqual([item['id'] for item in results], [first.id, second.id])
+
+    def test_highlighted_snippet(self):
+        self.create_task('Подготовить релиз', description='Собрать сборку и выпустить релиз в магазин')
+        headline = self.search('релиз')[0]['search_headline']
+        self.assertEqual(headline['title'], 'Подготовить <mark>релиз</mark>')
+        self.assertIn('<mark>релиз</mark>', headline['description'])
+
+    def test_websearch_syntax(self):
+        bug = self.create_task('Ошибка входа')
+        self.create_task('Ошибка выгрузки')
+        results = self.search('ошибка -выгрузки')
+        self.assertEqual([item['id'] for item in results], [bug.id])
+
+    def test_without_search_no_rank(self):
+        self.create_task('Релиз')
+        item = self.client.get('/api/tasks/').json()['results'][0]
+        self.assertNotIn('search_rank', item)
+
+
+class TaskBulkActionTest(TaskAPITestCase):
+    """Массовое изменение и удаление задач"""
+
+    def setUp(self):
+        super().setUp()
+        self.member = User.objects.create_user(username='member', password='password')
+        self.project.members.add(self.member)
+        self.tasks = [self.create_task(f'Задача {index}') for index in range(3)]
+
+    def bulk(self, ids, **changes):
+        response = self.client.post('/api/tasks/bulk/', {'ids': ids, **changes}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def get_ids(self, tasks=None):
+        return [task.id for task in tasks or self.tasks]
+
+    def test_status_change_in_one_update(self):
+        with CaptureQueriesContext(connection) as context:
+            data = self.bulk(self.get_ids(), status='В работе')
+        self.assertEqual(data['processed'], 3)
+        updates = [query for query in context.captured_queries if query['sql'].startswith('UPDATE "tasks_task"')]
+        self.assertEqual(len(updates), 1)
+
+        self.assertEqual(
+            dict(ProjectStats.objects.filter(project=self.project, task_count__gt=0).values_list('status', 'task_count')),
+            {'В работе': 3}
+        )
+        transitions = TaskStatusTransition.objects.filter(from_status='Новая', to_status='В работе')
+        self.assertEqual(sorted(transitions.values_list('task_id', flat=True)), self.get_ids())
+
+    def test_moved_cards_go_after_last_card_of_column(self):
+        existing = [self.create_task(f'В работе {index}', status='В работе') for index in range(2)]
+        self.bulk([self.tasks[2].id, self.tasks[0].id], status='В работе')
+
+        column = Task.objects.filter(project=self.project, status='В работе').order_by('rank', 'id')
+        self.assertEqual(
+            list(column.values_list('id', flat=True)),
+            [*self.get_ids(existing[::-1]), self.tasks[2].id, self.tasks[0].id]
+        )
+        ranks = list(column.values_list('rank', flat=True))
+        self.assertEqual(len(set(ranks)), len(ranks))
+
+    def test_other_changes_keep_rank(self):
+        ranks = dict(Task.objects.values_list('id', 'rank'))
+        due_date = timezone.now().replace(microsecond=0)
+        self.bulk(self.get_ids(), priority='Высокий', due_date=due_date.isoformat())
+        for task in Task.objects.all():
+            self.assertEqual(task.rank, ranks[task.id])
+            self.assertEqual(task.priority, 'Высокий')
+            self.assertEqual(task.due_date, due_date)
+
+    def test_inaccessible_tasks_are_reported(self):
+        stranger = User.objects.create_user(username='stranger', password='password')
+        other_project = Project.objects.create(name='Чужой', created_by=stranger)
+        foreign = self.create_task('Чужая', project=other_project, created_by=stranger)
+
+        data = self.bulk([self.tasks[0].id, foreign.id, 999999], priority='Низкий')
+        self.assertEqual(data['processed'], 1)
+        self.assertEqual(data['failed'], 2)
+        self.assertEqual(
+            [result['success'] for result in data['results']], [True, False, False]
+        )
+        foreign.refresh_from_db()
+        self.assertEqual(foreign.priority, 'Без приоритета')
+
+    def test_assignee_must_be_project_member(self):
+        outsider = User.objects.create_user(username='outsider', password='password')
+        data = self.bulk(self.get_ids(), assignee_id=outsider.id)
+        self.assertEqual(data['processed'], 0)
+        self.assertEqual(data['results'][0]['error'], 'Исполнитель должен быть участником проекта')
+        self.assertFalse(Task.objects.filter(assignee=outsider).exists())
+
+        data = self.bulk(self.get_ids(), assignee_id=self.member.id)
+        self.assertEqual(data['processed'], 3)
+        self.assertEqual(Task.objects.filter(assignee=self.member).count(), 3)
+
+    def test_delete(self):
+        data = self.bulk(self.get_ids(self.tasks[:2]), delete=True)
+        self.assertEqual(data['processed'], 2)
+        self.assertEqual(list(Task.objects.values_list('id', flat=True)), [self.tasks[2].id])
+        self.assertEqual(ProjectStats.objects.get(project=self.project, status='Новая').task_count, 1)
+
+    def test_validation(self):
+        response = self.client.post('/api/tasks/bulk/', {'ids': self.get_ids()}, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(
+            '/api/tasks/bulk/', {'ids': self.get_ids(), 'delete': True, 'status': 'Новая'}, format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class RankingTest(SimpleTestCase):
+    """Лексикографические ранги карточек"""
+
+    def assertBetween(self, rank, before, after):
+        if before is not None:
+            self.assertGreater(rank, before)
+        if after is not None:
+            self.assertLess(rank, after)
+        self.assertFalse(rank.endswith('0'))
+
+    def test_between(self):
+        for before, after in [('a', 'c'), ('a', 'b'), ('az', 'b'), ('1', '2'), ('a', 'a1'), ('a0z', 'a1')]:
+            self.assertBetween(rank_between(before, after), before, after)
+
+    def test_before_first_and_after_last(self):
+        self.assertBetween(rank_between(None, 'i'), None, 'i')
+        self.assertBetween(rank_between(None, '1'), None, '1')
+        self.assertBetween(rank_between('i', None), 'i', None)
+        self.assertBetween(rank_between('zz', None), 'zz', None)
+        self.assertBetween(rank_between(None, None), None, None)
+
+    def test_adjacent_keys(self):
+        # Между соседними цифрами ранг удлиняется на один символ
+        rank = rank_between('a', 'b')
+        self.assertBetween(rank, 'a', 'b')
+        self.assertEqual(len(rank), 2)
+
+    def test_no_exhaustion(self):
+        # Многократная вставка в одно и то же место не исчерпывает ранги
+        before, after = 'a', 'b'
+        for _ in range(200):
+            rank = rank_between(before, after)
+            self.assertBetween(rank, before, after)
+            after = rank
+        before, after = 'a', 'b'
+        for _ in range(200):
+            rank = rank_between(before, after)
+            self.assertBetween(rank, before, after)
+            before = rank
+
+    def test_append_grows_slowly(self):
+        rank = None
+        for _ in range(1000):
+            rank = rank_between(rank, None)
+        self.assertLessEqual(len(rank), 30)
+
+    def test_invalid_order(self):
+        with self.assertRaises(ValueError):
+            rank_between('b', 'a')
+        with self.assertRaises(ValueError):
+            rank_between('a', 'a')
+
+    def test_ranks_between(self):
+        ranks = ranks_between('a', 'b', 500)
+        self.assertEqual(ranks, sorted(set(ranks)))
+        self.assertEqual(len(ranks), 500)
+        for rank in ranks:
+            self.assertBetween(rank, 'a', 'b')
+        self.assertLessEqual(max(map(len, ranks)), 5)
+        self.assertEqual(ranks_between(None, None, 0), [])
+
+    def test_evenly_spaced_ranks(self):
+        ranks = evenly_spaced_ranks(100)
+        self.assertEqual(ranks, sorted(set(ranks)))
+        self.assertTrue(all(not rank.endswith('0') for rank in ranks))
+
+
+class TaskMoveTest(TaskAPITestCase):
+    """Перемещение карточек канбан-доски"""
+
+    def setUp(self):
+        super().setUp()
+        # Новые карточки встают в начало колонки: порядок a, b, c
+        self.c, self.b, self.a = (self.create_task(title) for title in 'cba')
+
+    def move(self, task, **data):
+        return self.client.patch(f'/api/tasks/{task.id}/move/', data, format='json')
+
+    def column(self, status='Новая'):
+        return list(
+            Task.objects.filter(project=self.project, status=status).order_by('rank', 'id').values_list('title', flat=True)
+        )
+
+    def test_new_cards_on_top(self):
+        self.assertEqual(self.column(), ['a', 'b', 'c'])
+
+    def test_move_after_previous(self):
+        self.assertEqual(self.move(self.a, previous_id=self.b.id).status_code, 200)
+        self.assertEqual(self.column(), ['b', 'a', 'c'])
+        self.move(self.a, previous_id=self.c.id)
+        self.assertEqual(self.column(), ['b', 'c', 'a'])
+
+    def test_move_before_next(self):
+        self.move(self.c, next_id=self.a.id)
+        self.assertEqual(self.column(), ['c', 'a', 'b'])
+        self.move(self.b, next_id=self.a.id)
+        self.assertEqual(self.column(), ['c', 'b', 'a'])
+
+    def test_move_between(self):
+        self.move(self.c, previous_id=self.a.id, next_id=self.b.id)
+        self.assertEqual(self.column(), ['a', 'c', 'b'])
+
+    def test_move_changes_only_one_row(self):
+        ranks = dict(Task.objects.values_list('id', 'rank'))
+        self.move(self.a, previous_id=self.c.id)
+        changed = [task_id for task_id, rank in Task.objects.values_list('id', 'rank') if ranks[task_id] != rank]
+        self.assertEqual(changed, [self.a.id])
+
+    def test_cross_column_move(self):
+        done = self.create_task('d', status='Завершена')
+        response = self.move(self.b, status='Завершена', previous_id=done.id)
+        self.assertEqual(response.json()['status'], 'Завершена')
+        self.assertEqual(self.column(), ['a', 'c'])
+        self.assertEqual(self.column('Завершена'), ['d', 'b'])
+        self.assertEqual(ProjectStats.objects.get(project=self.project, status='Завершена').task_count, 2)
+
+        # В пустую колонку без соседей
+        self.move(self.c, status='В работе')
+        self.assertEqual(self.column('В работе'), ['c'])
+
+    def test_neighbour_from_other_column(self):
+        other = self.create_task('x', status='Завершена')
+        response = self.move(self.a, previous_id=other.id)
+        self.assertEqual(response.status_code, 400)
+
+    def test_duplicate_ranks_are_rebalanced(self):
+        Task.objects.filter(project=self.project).update(rank='i')
+        response = self.move(self.c, previous_id=self.a.id, next_id=self.b.id)
+        self.assertEqual(response.status_code, 200)
+        ranks = list(Task.objects.filter(project=self.project).values_list('rank', flat=True))
+        self.assertEqual(len(set(ranks)), 3)
+        # После перебалансировки b оказалась выше a: карточка встает сразу после a
+        self.assertEqual(self.column(), ['b', 'a', 'c'])
+
+    def test_bulk_create_assigns_ranks(self):
+        tasks = Task.objects.bulk_create([
+            Task(title=title, project=self.project, created_by=self.user) for title in 'xyz'
+        ])
+        self.assertTrue(all(task.rank for task in tasks))
+        self.assertEqual(self.column(), ['a', 'b', 'c', 'x', 'y', 'z'])
+
+    def test_rebalance_command(self):
+        # Длинные ранги после множества вставок в одно место
+        Task.objects.filter(pk=self.a.pk).update(rank='g' + 'z' * 20)
+        Task.objects.filter(pk=self.b.pk).update(rank='h' + 'z' * 20)
+        call_command('rebalance_task_ranks', stdout=StringIO())
+        self.assertEqual(self.column(), ['a', 'b', 'c'])
+        self.assertTrue(all(len(rank) <= 3 for rank in Task.objects.values_list('rank', flat=True)))
+
+        # Колонки с короткими и различными рангами не трогаются
+        ranks = dict(Task.objects.values_list('id', 'rank'))
+        call_command('rebalance_task_ranks', stdout=StringIO())
+        self.assertEqual(dict(Task.objects.values_list('id', 'rank')), ranks)
+
+
+class CommentCountTest(TaskAPITestCase):
+    """Счетчик комментариев задачи и ветки комментариев нескольких задач"""
+
+    def add_comments(self, task, count):
+        return [Comment.objects.create(task=task, author=self.user, text=f'Комментарий {index}')
+                for index in range(count)]
+
+    def test_counter_follows_comment_writes(self):
+        task = self.create_task()
+        comments = self.add_comments(task, 3)
+        task.refresh_from_db()
+        self.assertEqual(task.comments_count, 3)
+
+        # Изменение комментария счетчик не трогает
+        comments[0].text = 'Исправлено'
+        comments[0].save()
+        comments[1].delete()
+        task.refresh_from_db()
+        self.assertEqual(task.comments_count, 2)
+
+        response = self.client.post(f'/api/tasks/{task.id}/add_comment/', {'text': 'Через API'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.client.get(f'/api/tasks/{task.id}/').json()['comments_count'], 3)
+
+    def test_task_save_does_not_overwrite_counter(self):
+        task = self.create_task()
+        self.add_comments(task, 2)
+        # Экземпляр загружен до комментариев: save() не возвращает старое значение
+        task.title = 'Новое название'
+        task.save()
+        task.refresh_from_db()
+        self.assertEqual(task.comments_count, 2)
+
+    def test_saving_deleted_task_does_not_reinsert_it(self):
+        task = self.create_task()
+        Task.objects.filter(pk=task.pk).delete()
+
+        task.title = 'Новое название'
+        with self.assertRaises(DatabaseError), transaction.atomic():
+            task.save()
+        self.assertFalse(Task.objects.filter(pk=task.pk).exists())
+
+        # Явная повторная вставка
+        task.save(force_insert=True)
+        self.assertEqual(Task.objects.get(pk=task.pk).title, 'Новое название')
+
+    def test_rebuild_command(self):
+        task = self.create_task()
+        other = self.create_task()
+        self.add_comments(task, 2)
+        Task.objects.filter(pk=task.pk).update(comments_count=5)
+
+        with self.assertRaises(SystemExit) as context:
+            call_command('rebuild_comment_counts', '--check', stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(context.exception.code, 1)
+
+        out = StringIO()
+        call_command('rebuild_comment_counts', stdout=out)
+        self.assertIn(f'Задача {task.id}: 5 -> 2', out.getvalue())
+        task.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((task.comments_count, other.comments_count), (2, 0))
+
+        out = StringIO()
+        call_command('rebuild_comment_counts', '--check', stdout=out)
+        self.assertIn('Расхождений не найдено', out.getvalue())
+
+    def test_comment_threads(self):
+        first = self.create_task()
+        second = self.create_task()
+        empty = self.create_task()
+        first_comments = self.add_comments(first, 5)
+        second_comments = self.add_comments(second, 2)
+
+        other_project = Project.objects.create(name='Чужой', created_by=self.user)
+        foreign = self.create_task(project=other_project)
+        self.add_comments(foreign, 1)
+
+        ids = ','.join(str(task.id) for task in (second, first, empty, foreign))
+        self.client.get('/api/tasks/comment_threads/', {'ids': ids})
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/tasks/comment_threads/', {'ids': ids, 'page_size': 3})
+        self.assertEqual(response.status_code, 200)
+        small_queries = len(context.captured_queries)
+
+        threads = {thread['task']: thread for thread in response.json()}
+        self.assertEqual(set(threads), {first.id, second.id, empty.id})
+        self.assertEqual(threads[first.id]['comments_count'], 5)
+        self.assertEqual([comment['id'] for comment in threads[first.id]['results']],
+                         [comment.id for comment in first_comments[:3]])
+        self.assertEqual([comment['id'] for comment in threads[second.id]['results']],
+                         [comment.id for comment in second_comments])
+        self.assertIsNone(threads[second.id]['next'])
+        self.assertEqual(threads[empty.id]['results'], [])
+
+        # Продолжение ветки - по ссылке next эндпоинта comments
+        next_page = self.client.get(threads[first.id]['next']).json()
+        self.assertEqual([comment['id'] for comment in next_page['results']],
+                         [comment.id for comment in first_comments[3:]])
+
+        # Число запросов не зависит от количества комментариев
+        self.add_comments(second, 10)
+        with CaptureQueriesContext(connection) as context:
+            self.client.get('/api/tasks/comment_threads/', {'ids': ids, 'page_size': 3})
+        self.assertEqual(len(context.captured_queries), small_queries)
+
+    def test_comment_threads_limits(self):
+        response = self.client.get('/api/tasks/comment_threads/', {'ids': '1,x'})
+        self.assertEqual(response.status_code, 400)
+
+        ids = ','.join(str(index) for index in range(1, TaskViewSet.MAX_COMMENT_THREADS + 2))
+        response = self.client.get('/api/tasks/comment_threads/', {'ids': ids})
+        self.assertEqual(response.status_code, 400)
+
+
+class TransitionBackfillTest(TaskAPITestCase):
+    """Восстановление журнала переходов существующих задач (миграция 0008)"""
+
+    def test_populate_transitions(self):
+        created = timezone.now() - timedelta(days=3)
+        updated = timezone.now() - timedelta(days=1)
+        new = self.create_task(status='Новая')
+        done = self.create_task(status='Завершена')
+        Task.objects.update(created_at=created, updated_at=updated)
+        TaskStatusTransition.objects.all().delete()
+
+        migration = import_module('tasks.migrations.0008_taskstatustransition')
+        with connection.schema_editor() as schema_editor:
+            migration.populate_transitions(django_apps, schema_editor)
+
+        self.assertEqual(
+            set(TaskStatusTransition.objects.values_list(
+                'task_id', 'project_id', 'from_status', 'to_status', 'changed_at'
+            )),
+            {
+                (new.id, self.project.id, None, 'Новая', created),
+                (done.id, self.project.id, None, 'Новая', created),
+                (done.id, self.project.id, 'Новая', 'Завершена', updated),
+            }
+        )
+
+
+class TaskExportTest(TaskAPITestCase):
+    """Потоковая выгрузка задач в CSV и NDJSON"""
+
+    def setUp(self):
+        super().setUp()
+        self.assignee = User.objects.create_user(username='assignee', password='password')
+        self.project.members.add(self.assignee)
+        self.task = self.create_task(
+            title='Задача, с "кавычками"', description='Первая строка\nвторая строка',
+            status='В работе', assignee=self.assignee, due_date=timezone.now() + timedelta(days=1)
+        )
+        self.other_task = self.create_task(title='Вторая')
+        self.comment = Comment.objects.create(task=self.task, author=self.assignee, text='Комментарий; с, запятыми')
+
+        foreign_project = Project.objects.create(name='Чужой', created_by=self.assignee)
+        self.create_task(project=foreign_project, created_by=self.assignee)
+
+    def export(self, **params):
+        response = self.client.get('/api/tasks/export/', params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertFalse(response.has_header('Content-Length'))
+        return response, b''.join(response.streaming_content).decode('utf-8')
+
+    def expected_task_record(self, task):
+        task.refresh_from_db()
+        return {
+            'type': 'task',
+            'id': task.id,
+            'project_id': task.project_id,
+            'title': task.title,
+            'description': task.description,
+            'status': task.status,
+            'priority': task.priority,
+            'assignee': task.assignee.username if task.assignee else None,
+            'created_by': task.created_by.username,
+            'due_date': task.due_date.isoformat() if task.due_date else None,
+            'created_at': task.created_at.isoformat(),
+            'updated_at': task.updated_at.isoformat(),
+            'comments_count': task.comments_count,
+        }
+
+    def test_ndjson_parses_back(self):
+        response, content = self.export(file_format='ndjson', comments='true')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        records = [json.loads(line) for line in content.splitlines()]
+
+        self.assertEqual(records, [
+            self.expected_task_record(self.task),
+            {
+                'type': 'comment',
+                'id': self.comment.id,
+                'task_id': self.task.id,
+                'author': 'assignee',
+                'text': self.comment.text,
+                'created_at': self.comment.created_at.isoformat(),
+            },
+            self.expected_task_record(self.other_task),
+        ])
+
+    def test_csv_parses_back(self):
+        response, content = self.export(comments='true')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('attachment; filename="tasks-', response['Content-Disposition'])
+        rows = list(csv.DictReader(StringIO(content)))
+
+        self.assertEqual([(row['type'], int(row['id'])) for row in rows], [
+            ('task', self.task.id), ('comment', self.comment.id), ('task', self.other_task.id),
+        ])
+        expected = self.expected_task_record(self.task)
+        for field, value in expected.items():
+            self.assertEqual(rows[0][field], '' if value is None else str(value), field)
+        self.assertEqual(rows[1]['text'], self.comment.text)
+        self.assertEqual(rows[2]['assignee'], '')
+
+    def test_filters_and_validation(self):
+        _, content = self.export(file_format='ndjson', status='В работе')
+        self.assertEqual([json.loads(line)['id'] for line in content.splitlines()], [self.task.id])
+
+        response = self.client.get('/api/tasks/export/', {'file_format': 'xml'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_output_is_streamed_in_blocks(self):
+        for index in range(30):
+            self.create_task(title=f'Задача {index}', description='x' * 200)
+
+        records = iter_records(Task.objects.all())
+        with patch('tasks.export.EXPORT_BUFFER_SIZE', 1024):
+            blocks = list(iter_csv(records))
+
+        # Заголовок с первой записью уходит сразу, дальше - блоки около EXPORT_BUFFER_SIZE
+        self.assertGreater(len(blocks), 3)
+        self.assertTrue(blocks[0].startswith('type,id,project_id'))
+        self.assertLess(len(blocks[0]), 1024)
+        for block in blocks[1:-1]:
+            self.assertGreaterEqual(len(block), 1024)
+            self.assertLess(len(block), 2048)
+        self.assertEqual(len(list(csv.DictReader(StringIO(''.join(blocks))))), Task.objects.count())
+
+    def test_response_is_not_buffered(self):
+        response = self.client.get('/api/tasks/export/', {'file_format': 'ndjson'})
+        # Ответ потоковый: задачи читаются только при чтении тела
+        with CaptureQueriesContext(connection) as context:
+            first_block = next(iter(response.streaming_content))
+        self.assertTrue(context.captured_queries)
+        self.assertEqual(json.loads(first_block.decode('utf-8').splitlines()[0])['id'], self.task.id)
+        response.close()
+
+
+class TaskImportTest(TaskAPITestCase):
+    """Импорт выгрузки: round-trip, порции и продолжение прерванного импорта"""
+
+    def setUp(self):
+        super().setUp()
+        self.assignee = User.objects.create_user(username='assignee', password='password')
+        self.project.members.add(self.assignee)
+        self.task = self.create_task(
+            title='Задача, с "кавычками"', description='Первая строка\nвторая строка',
+            status='В работе', assignee=self.assignee, due_date=timezone.now() + timedelta(days=1)
+        )
+        self.other_task = self.create_task(title='Вторая')
+        self.comment = Comment.objects.create(task=self.task, author=self.assignee, text='Комментарий; с, запятыми')
+
+        self.target = Project.objects.create(name='Новый', created_by=self.user)
+        self.target.members.add(self.user, self.assignee)
+        self.existing = self.create_task(project=self.target, title='Уже была')
+
+    def export(self, **params):
+        response = self.client.get('/api/tasks/export/', {'project': self.project.id, 'comments': 'true', **params})
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode('utf-8')
+
+    def import_file(self, content, name, **data):
+        upload = SimpleUploadedFile(name, content.encode('utf-8'))
+        return self.client.post('/api/tasks/import/', {'file': upload, 'project': self.target.id, **data})
+
+    def assert_round_trip(self, content, name):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.import_file(content, name)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['created_tasks'], 2)
+        self.assertEqual(response.json()['created_comments'], 1)
+        self.assertEqual(response.json()['errors'], [])
+
+        imported = list(Task.objects.filter(project=self.target).exclude(id=self.existing.id).order_by('id'))
+        fields = ('title', 'description', 'status', 'priority', 'assignee_id', 'created_by_id', 'due_date')
+        for source, task in zip((self.task, self.other_task), imported):
+            source.refresh_from_db()
+            self.assertEqual([getattr(task, field) for field in fields],
+                             [getattr(source, field) for field in fields])
+            self.assertEqual(task.comments_count, source.comments_count)
+
+        comment = Comment.objects.get(task=imported[0])
+        self.assertEqual((comment.author_id, comment.text), (self.assignee.id, self.comment.text))
+
+        # Ранги назначены при вставке: новые карточки в конце колонки
+        new_column = [self.existing.id, imported[1].id]
+        self.assertEqual(list(Task.objects.filter(project=self.target, status='Новая')
+                              .order_by('rank').values_list('id', flat=True)), new_column)
+        self.assertFalse(Task.objects.filter(project=self.target, rank='').exists())
+
+        stats = dict(ProjectStats.objects.filter(project=self.target).values_list('status', 'task_count'))
+        self.assertEqual(stats, {'Новая': 2, 'В работе': 1})
+
+    def test_ndjson_round_trip(self):
+        content = self.export(file_format='ndjson')
+        self.assert_round_trip(content, 'tasks.ndjson')
+
+    def test_csv_round_trip(self):
+        content = self.export()
+        self.assert_round_trip(content, 'tasks.csv')
+
+    def test_dry_run_creates_nothing(self):
+        content = self.export(file_format='ndjson')
+        response = self.import_file(content, 'tasks.ndjson', dry_run='true')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['created_tasks'], 2)
+        self.assertEqual(Task.objects.filter(project=self.target).count(), 1)
+        self.assertFalse(ProjectStats.objects.filter(project=self.target, status='В работе').exists())
+
+    def test_batches_commit_and_resume(self):
+        content = self.export(file_format='ndjson')
+        records = list(import_records(StringIO(content), 'ndjson'))
+
+        def interrupted():
+            yield from records
+            raise csv.Error('обрыв')
+
+        # Порция не разрывает задачу и ее комментарий
+        importer = TaskImporter(self.target, self.user, batch_size=1)
+        with self.assertRaises(csv.Error):
+            importer.run(interrupted())
+        self.assertEqual(importer.last_line, 2)
+        self.assertEqual(Task.objects.filter(project=self.target).count(), 2)
+        self.assertEqual(Comment.objects.filter(task__project=self.target).count(), 1)
+
+        report = TaskImporter(self.target, self.user, batch_size=1).run(records, resume_after=importer.last_line)
+        self.assertEqual((report['created_tasks'], report['last_line']), (1, 3))
+        self.assertEqual(Task.objects.filter(project=self.target).count(), 3)
+        stats = dict(ProjectStats.objects.filter(project=self.target).values_list('status', 'task_count'))
+        self.assertEqual(stats, {'Новая': 2, 'В работе': 1})
+
+    def assert_errors(self, report, expected):
+        self.assertEqual([(error['line'], error['error']) for error in report['errors']], expected)
+        self.assertEqual(report['failed'], len(expected))
+
+    def test_mixed_ndjson_reports_bad_rows(self):
+        User.objects.create_user(username='stranger', password='password')
+        lines = [
+            {'type': 'task', 'id': 1, 'title': 'Первая'},
+            {'type': 'task', 'id': 2, 'title': 'Статус', 'status': 'Отложена'},
+            {'type': 'task', 'id': 3, 'title': 'Приоритет', 'priority': 'Срочный'},
+            {'type': 'task', 'id': 4, 'title': 'Чужой исполнитель', 'assignee': 'stranger'},
+            {'type': 'comment', 'task_id': 99, 'text': 'Без задачи'},
+            [1, 2],
+            '{не json',
+            {'type': 'comment', 'task_id': 1, 'text': 'К первой'},
+            {'type': 'task', 'id': 5, 'title': 'Последняя', 'assignee': 'assignee'},
+        ]
+        content = '\n'.join(line if isinstance(line, str) else json.dumps(line) for line in lines)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.import_file(content, 'tasks.ndjson')
+        self.assertEqual(response.status_code, 200)
+        report = response.json()
+        self.assertEqual((report['created_tasks'], report['created_comments'], report['last_line']), (2, 1, 9))
+        self.assert_errors(report, [
+            (2, 'Неизвестный статус: Отложена'),
+            (3, 'Неизвестный приоритет: Срочный'),
+            (4, 'Исполнитель должен быть участником проекта'),
+            (5, 'Задача комментария не найдена среди импортированных выше'),
+            (6, 'Строка не является JSON-объектом'),
+            (7, 'Строка не является JSON-объектом'),
+        ])
+
+        # Верные строки сохранены, ошибочные - нет
+        imported = Task.objects.filter(project=self.target).exclude(id=self.existing.id).order_by('id')
+        self.assertEqual([task.title for task in imported], ['Первая', 'Последняя'])
+        self.assertEqual(imported[0].comments_count, 1)
+        self.assertEqual(imported[1].assignee, self.assignee)
+
+    def test_malformed_csv_rows_are_reported(self):
+        content = (
+            'type,id,title,status\n'
+            'task,1,Первая,Новая\n'
+            'task,2,Лишнее,Новая,поле\n'
+            'task,3\n'
+            'task,4,"Две\nстроки",В работе\n'
+            'task,5,,Новая\n'
+        )
+        report = self.import_file(content, 'tasks.csv').json()
+        self.assertEqual(report['created_tasks'], 2)
+        # Номер строки - последняя физическая строка записи
+        self.assert_errors(report, [
+            (3, 'Лишние поля в строке CSV'),
+            (4, 'Не хватает полей в строке CSV'),
+            (7, 'Не указан заголовок задачи'),
+        ])
+        self.assertTrue(Task.objects.filter(project=self.target, title='Две\nстроки').exists())
+
+    def test_unreadable_file_reports_last_committed_line(self):
+        # Порция из IMPORT_BATCH_SIZE строк фиксируется до ошибки декодирования
+        lines = ''.join(json.dumps({'type': 'task', 'title': f'Задача {i}'}) + '\n'
+                        for i in range(IMPORT_BATCH_SIZE + 1))
+        # Пустые строки отделяют ошибку от записей больше, чем на блок декодирования
+        content = (lines + '\n' * 20000).encode('utf-8') + b'\xff\xfe\n'
+        response = self.client.post('/api/tasks/import/', {
+            'file': SimpleUploadedFile('tasks.ndjson', content), 'project': self.target.id
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['last_line'], IMPORT_BATCH_SIZE)
+        self.assertEqual(Task.objects.filter(project=self.target).count(), IMPORT_BATCH_SIZE + 1)
+
+    def test_commands_round_trip_and_resume(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'tasks.ndjson')
+            call_command('export_tasks', '--project', str(self.project.id), '--format', 'ndjson',
+                         '--comments', '--output', path)
+            with open(path, encoding='utf-8') as file:
+                self.assertEqual(len(file.read().splitlines()), 3)
+
+            # Первая задача с комментарием уже импортирована: продолжаем со строки 3
+            out = StringIO()
+            call_command('import_tasks', path, '--project', str(self.target.id), '--user', 'owner',
+                         '--resume-after', '2', stdout=out)
+            self.assertIn('Импортировано: задач 1, комментариев 0', out.getvalue())
+            self.assertIn('Последняя обработанная строка: 3', out.getvalue())
+            self.assertEqual(list(Task.objects.filter(project=self.target).exclude(id=self.existing.id)
+                                  .values_list('title', flat=True)), ['Вторая'])
+
+            out = StringIO()
+            call_command('import_tasks', path, '--project', str(self.target.id), '--user', 'owner',
+                         '--dry-run', stdout=out)
+            self.assertIn('Проверено (без сохранения): задач 2, комментариев 1', out.getvalue())
+            self.assertEqual(Task.objects.filter(project=self.target).count(), 2)
+
+        with self.assertRaises(CommandError):
+            call_command('import_tasks', path, '--project', str(self.target.id), '--user', 'nobody')
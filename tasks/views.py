@@ -1,14 +1,35 @@
-from rest_framework import viewsets, permissions, status, filters
+import csv
+from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from django.db.models import Q
-from .models import Task, Comment
+from django.db import transaction
+from django.db.models import Case, F, Q, TextField, Value, When, Window
+from django.db.models.functions import RowNumber
+from django.urls import reverse
+from django.utils import timezone
+from .models import Task, Comment, TaskStatusTransition
+from .export import CONTENT_TYPES, FORMAT_CSV, iter_export, get_streaming_content
+from .importer import TaskImporter, detect_format, iter_records, open_text
+from .filters import TaskFullTextSearchFilter
+from .ranking import rank_between
 from .serializers import (
     TaskSerializer, TaskStatusUpdateSerializer, TaskPriorityUpdateSerializer,
-    CommentSerializer
+    CommentSerializer, TaskBulkActionSerializer, TaskMoveSerializer
+)
+from projects.models import Project, ProjectStats, ProjectChange
+from projects.membership import filter_by_membership, get_member_project_ids, is_project_member
+from projects.permissions import IsProjectMember
+from realtime import events
+from analytics.cache import bump_project_versions
+from calendar_integration.models import (
+    CalendarSyncJob, collect_auto_sync, schedule_auto_sync_on_commit
+)
+from newprojectflowapp.pagination import (
+    KeysetOrPageNumberPagination, CommentKeysetPagination
 )
-from projects.models import Project
 
 
 class TaskViewSet(viewsets.ModelViewSet):
@@ -16,8 +37,11 @@ class TaskViewSet(viewsets.ModelViewSet):
     ViewSet для управления задачами
     """
     serializer_class = TaskSerializer
-    permission_classes = [permissions.IsAuthenticated]
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    permission_classes = [IsProjectMember]
+    pagination_class = KeysetOrPageNumberPagination
+    # Поиск выполняется после сортировки, чтобы без явного ?ordering=
+    # результаты поиска сортировались по релевантности
+    filter_backends = [filters.OrderingFilter, TaskFullTextSearchFilter]
     search_fields = ['title', 'description']
     ordering_fields = ['created_at', 'due_date', 'priority', 'status']
     ordering = ['-created_at']
@@ -28,11 +52,12 @@ class TaskViewSet(viewsets.ModelViewSet):
         """
         user = self.request.user
 
-        # Получаем проекты, в которых пользователь является участником
-        projects = Project.objects.filter(members=user)
-
-        # Формируем базовый запрос
-        queryset = Task.objects.filter(project__in=projects)
+        # Только задачи проектов, в которых пользователь является участником
+        queryset = filter_by_membership(
+            Task.objects.all(), user, self.request
+        ).select_related(
+            'project', 'assignee', 'created_by'
+        ).defer('search_vector')
 
         # Фильтрация по проекту, если указан в запросе
         project_id = self.request.query_params.get('project')
@@ -49,6 +74,11 @@ class TaskViewSet(viewsets.ModelViewSet):
         if priority_param:
             queryset = queryset.filter(priority=priority_param)
 
+        # Фильтрация просроченных задач (частичный индекс по due_date)
+        overdue = self.request.query_params.get('overdue')
+        if overdue and overdue.lower() == 'true':
+            queryset = queryset.filter(due_date__lt=timezone.now()).exclude(status='Завершена')
+
         # Фильтрация по исполнителю (мои задачи)
         assigned_to_me = self.request.query_params.get('assigned_to_me')
         if assigned_to_me and assigned_to_me.lower() == 'true':
@@ -95,16 +125,381 @@ class TaskViewSet(viewsets.ModelViewSet):
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=True, methods=['patch'])
+    def move(self, request, pk=None):
+        """
+        Перемещение карточки внутри колонки или в другую колонку канбан-доски.
+        Меняется только ранг (и статус) самой карточки - одна строка
+        """
+        task = self.get_object()
+        serializer = TaskMoveSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        target_status = serializer.validated_data.get('status', task.status)
+        previous_id = serializer.validated_data.get('previous_id')
+        next_id = serializer.validated_data.get('next_id')
+
+        with transaction.atomic():
+            column = Task.objects.filter(
+                project_id=task.project_id,
+                status=target_status
+            ).exclude(id=task.id)
+
+            previous_rank, next_rank = self.get_neighbour_ranks(column, previous_id, next_id)
+            if previous_rank is False or next_rank is False:
+                return Response(
+                    {'error': 'Соседняя карточка не найдена в колонке'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            # Одинаковые ранги возможны после одновременных перемещений:
+            # перебалансируем колонку и вычисляем соседей заново
+            if previous_rank is not None and next_rank is not None and previous_rank >= next_rank:
+                Task.rebalance_ranks(task.project_id, target_status)
+                previous_rank, next_rank = self.get_neighbour_ranks(column, previous_id, next_id)
+                if previous_rank is not None and next_rank is not None and previous_rank >= next_rank:
+                    # Соседи уже стоят в другом порядке: карточка встает сразу после previous
+                    previous_rank, next_rank = self.get_neighbour_ranks(column, previous_id, None)
+
+            task.status = target_status
+            task.rank = rank_between(previous_rank, next_rank)
+            task.save(update_fields=['status', 'rank', 'updated_at'])
+
+        return Response(TaskSerializer(task).data)
+
+    @staticmethod
+    def get_neighbour_ranks(column, previous_id, next_id):
+        """
+        Возвращает ранги карточек выше и ниже места вставки
+        (None - край колонки, False - карточка не найдена)
+        """
+        ranks = dict(
+            column.filter(id__in=[i for i in (previous_id, next_id) if i]).values_list('id', 'rank')
+        )
+        previous_rank = ranks.get(previous_id, False) if previous_id else None
+        next_rank = ranks.get(next_id, False) if next_id else None
+
+        if previous_id and not next_id and previous_rank is not False:
+            # Следующая карточка после previous
+            next_rank = column.filter(
+                rank__gt=previous_rank
+            ).order_by('rank').values_list('rank', flat=True).first()
+        elif next_id and not previous_id and next_rank is not False:
+            # Предыдущая карточка перед next
+            previous_rank = column.filter(
+                rank__lt=next_rank
+            ).order_by('-rank').values_list('rank', flat=True).first()
+        elif not previous_id and not next_id:
+            # Без соседей карточка встает в начало колонки
+            next_rank = column.order_by('rank').values_list('rank', flat=True).first()
+
+        return previous_rank, next_rank
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        Массовое изменение (статус, приоритет, исполнитель, срок) или удаление задач.
+        Доступ проверяется одним запросом для всего набора, изменения
+        применяются несколькими UPDATE в одной транзакции
+        """
+        serializer = TaskBulkActionSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        ids = serializer.validated_data['ids']
+        changes = serializer.validated_data['changes']
+        delete = serializer.validated_data['delete']
+
+        with transaction.atomic():
+            # Одна проверка доступа на весь набор задач. Строки блокируются,
+            # чтобы статусы не изменились до пересчета счетчиков
+            tasks = {
+                row['id']: row
+                for row in filter_by_membership(
+                    Task.objects.select_for_update().filter(id__in=ids), request.user, request
+                ).values('id', 'project_id', 'status', 'assignee_id', 'google_calendar_user_id')
+            }
+
+            errors = {
+                task_id: 'Задача не найдена'
+                for task_id in ids if task_id not in tasks
+            }
+
+            # Исполнитель должен быть участником проекта каждой задачи
+            assignee_id = changes.get('assignee_id')
+            if assignee_id is not None:
+                assignee_projects = get_member_project_ids(assignee_id, request)
+                for task_id, task in tasks.items():
+                    if task['project_id'] not in assignee_projects:
+                        errors[task_id] = 'Исполнитель должен быть участником проекта'
+
+            target_ids = [task_id for task_id in ids if task_id not in errors]
+
+            if target_ids and delete:
+                # Счетчики проекта, журнал изменений и события обновляются одним пакетом,
+                # флаги автосинхронизации с календарем читаются один раз
+                with ProjectStats.collect_deltas(), ProjectChange.collect(), \
+                        TaskStatusTransition.collect(), events.collect(), collect_auto_sync():
+                    Task.objects.filter(id__in=target_ids).delete()
+            elif target_ids:
+                self.perform_bulk_update(
+                    [tasks[task_id] for task_id in target_ids],
+                    changes
+                )
+
+        result_status = 'deleted' if delete else 'updated'
+        results = []
+        for task_id in ids:
+            if task_id in errors:
+                results.append({'id': task_id, 'success': False, 'error': errors[task_id]})
+            else:
+                results.append({'id': task_id, 'success': True, 'status': result_status})
+
+        return Response({
+            'processed': len(target_ids),
+            'failed': len(errors),
+            'results': results
+        })
+
+    def perform_bulk_update(self, tasks, changes):
+        """
+        Применяет изменения к задачам одним UPDATE и обновляет
+        денормализованные данные, которые обычно поддерживают сигналы
+        """
+        task_ids = [task['id'] for task in tasks]
+        updates = dict(changes)
+
+        new_status = changes.get('status')
+        moved = [task for task in tasks if new_status and task['status'] != new_status]
+        if moved:
+            updates['rank'] = self.get_column_end_ranks(moved, new_status)
+
+        Task.objects.filter(id__in=task_ids).update(updated_at=timezone.now(), **updates)
+
+        if new_status:
+            deltas = {}
+            transitions = []
+            for task in tasks:
+                if task['status'] == new_status:
+                    continue
+                old_key = (task['project_id'], task['status'])
+                new_key = (task['project_id'], new_status)
+                deltas[old_key] = deltas.get(old_key, 0) - 1
+                deltas[new_key] = deltas.get(new_key, 0) + 1
+                transitions.append((task['id'], task['project_id'], task['status'], new_status))
+            ProjectStats.apply_deltas(deltas)
+            TaskStatusTransition.record(transitions)
+
+        with ProjectChange.collect():
+            for task in tasks:
+                ProjectChange.record(task['project_id'], ProjectChange.KIND_TASK, [task['id']])
+
+        # UPDATE без сигналов: версии проектов для кэша аналитики меняем явно
+        bump_project_versions({task['project_id'] for task in tasks})
+
+        # Автосинхронизация с календарем: событие выгружается владельцу,
+        # а если события еще нет - исполнителю после изменения
+        if 'due_date' in changes or 'assignee_id' in changes:
+            schedule_auto_sync_on_commit(
+                (task['id'], task['google_calendar_user_id'] or changes.get('assignee_id', task['assignee_id']))
+                for task in tasks
+            )
+
+        # Одно событие на проект вместо события на каждую задачу
+        task_ids_by_project = {}
+        for task in tasks:
+            task_ids_by_project.setdefault(task['project_id'], []).append(task['id'])
+        for project_id, project_task_ids in task_ids_by_project.items():
+            events.publish_project_event(
+                project_id, events.TASKS_UPDATED,
+                task_ids=project_task_ids, changes=sorted(updates)
+            )
+
+    @staticmethod
+    def get_column_end_ranks(tasks, status):
+        """
+        Ранги карточек, перенесенных в колонку status: они встают после
+        последней карточки колонки в порядке запроса. Возвращает
+        выражение для того же UPDATE (у остальных задач ранг не меняется)
+        """
+        whens = []
+        last_ranks = {}
+        for task in tasks:
+            project_id = task['project_id']
+            if project_id not in last_ranks:
+                last_ranks[project_id] = Task.get_last_rank(project_id, status) or None
+            last_ranks[project_id] = rank_between(last_ranks[project_id], None)
+            whens.append(When(id=task['id'], then=Value(last_ranks[project_id])))
+        return Case(*whens, default=F('rank'), output_field=TextField())
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Потоковая выгрузка задач (с теми же фильтрами, что и список:
+        ?project=, ?assigned_to_me=true, ?status= ...) в CSV или NDJSON.
+        ?file_format=csv|ndjson, ?comments=true - вместе с комментариями
+        """
+        file_format = request.query_params.get('file_format', FORMAT_CSV)
+        if file_format not in CONTENT_TYPES:
+            return Response(
+                {'error': 'Поддерживаемые форматы: csv, ndjson'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        with_comments = request.query_params.get('comments', '').lower() == 'true'
+
+        content = iter_export(self.get_queryset(), file_format, with_comments)
+        response = StreamingHttpResponse(
+            get_streaming_content(content, request),
+            content_type=CONTENT_TYPES[file_format]
+        )
+        filename = f"tasks-{timezone.localdate().isoformat()}.{file_format}"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        # Отключаем буферизацию ответа в nginx
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    @action(detail=False, methods=['post'], url_path='import')
+    def import_tasks(self, request):
+        """
+        Пакетный импорт задач и комментариев в проект (формат выгрузки).
+        multipart: file, project, file_format (по умолчанию по расширению
+        файла), dry_run=true - только проверить, resume_after - продолжить
+        прерванный импорт после строки last_line. Порции фиксируются
+        по отдельности. Возвращает отчет с ошибками по строкам
+        """
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'error': 'Не передан файл'}, status=status.HTTP_400_BAD_REQUEST)
+
+        project_id = request.data.get('project')
+        if not is_project_member(request.user, project_id, request):
+            return Response({'error': 'Проект не найден'}, status=status.HTTP_404_NOT_FOUND)
+        project = get_object_or_404(Project, id=project_id)
+
+        file_format = request.data.get('file_format') or detect_format(upload.name)
+        if file_format not in CONTENT_TYPES:
+            return Response(
+                {'error': 'Поддерживаемые форматы: csv, ndjson'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        dry_run = str(request.data.get('dry_run', '')).lower() == 'true'
+        resume_after = request.data.get('resume_after') or None
+        if resume_after is not None:
+            try:
+                resume_after = int(resume_after)
+            except (TypeError, ValueError):
+                return Response(
+                    {'error': 'resume_after должен быть номером строки'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+        importer = TaskImporter(project, request.user)
+        try:
+            report = importer.run(
+                iter_records(open_text(upload), file_format),
+                dry_run=dry_run, resume_after=resume_after
+            )
+        except (UnicodeDecodeError, csv.Error) as e:
+            # Уже зафиксированные порции остаются: импорт продолжается с last_line
+            return Response(
+                {'error': f'Не удалось прочитать файл: {e}',
+                 'last_line': None if dry_run else importer.last_line},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(report)
+
     @action(detail=True, methods=['get'])
     def comments(self, request, pk=None):
         """
         Получение комментариев к задаче
         """
         task = self.get_object()
-        comments = Comment.objects.filter(task=task)
+        comments = Comment.objects.filter(task=task).select_related('author')
+
+        # Курсорная пагинация включается параметром ?cursor=
+        if CommentKeysetPagination.is_requested(request):
+            paginator = CommentKeysetPagination()
+            page = paginator.paginate_queryset(comments, request, view=self)
+            serializer = CommentSerializer(page, many=True)
+            return paginator.get_paginated_response(serializer.data)
+
         serializer = CommentSerializer(comments, many=True)
         return Response(serializer.data)
 
+    # Максимальное количество веток в одном запросе comment_threads
+    MAX_COMMENT_THREADS = 100
+
+    @action(detail=False, methods=['get'])
+    def comment_threads(self, request):
+        """
+        Ветки комментариев сразу для нескольких задач (?ids=1,2,3).
+        Первые страницы всех веток загружаются одним запросом с оконной
+        функцией; следующая страница ветки - по ссылке next
+        (курсорная пагинация эндпоинта comments)
+        """
+        try:
+            task_ids = sorted({int(value) for value in request.query_params.get('ids', '').split(',') if value})
+        except ValueError:
+            return Response(
+                {'error': 'Параметр ids должен содержать ID задач через запятую'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(task_ids) > self.MAX_COMMENT_THREADS:
+            return Response(
+                {'error': f'Не более {self.MAX_COMMENT_THREADS} задач за один запрос'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Только задачи из проектов пользователя
+        counts = dict(
+            filter_by_membership(
+                Task.objects.filter(id__in=task_ids), request.user, request
+            ).values_list('id', 'comments_count')
+        )
+
+        paginator = CommentKeysetPagination()
+        page_size = paginator.get_page_size(request)
+
+        # Нумеруем комментарии внутри каждой ветки и берем на один больше
+        # размера страницы, чтобы узнать, есть ли продолжение
+        comments = Comment.objects.filter(
+            task_id__in=counts
+        ).select_related('author').annotate(
+            position=Window(
+                RowNumber(),
+                partition_by=[F('task_id')],
+                order_by=[F('created_at').asc(), F('id').asc()]
+            )
+        ).filter(position__lte=page_size + 1).order_by('task_id', 'created_at', 'id')
+
+        pages = {task_id: [] for task_id in counts}
+        for comment in comments:
+            pages[comment.task_id].append(comment)
+
+        threads = []
+        for task_id in task_ids:
+            if task_id not in pages:
+                continue
+            page = pages[task_id][:page_size]
+            next_link = None
+            if len(pages[task_id]) > page_size:
+                last = page[-1]
+                next_link = replace_query_param(
+                    request.build_absolute_uri(reverse('task-comments', args=[task_id])),
+                    paginator.cursor_query_param,
+                    paginator.encode_cursor((last.created_at, last.pk))
+                )
+                next_link = replace_query_param(next_link, paginator.page_size_query_param, page_size)
+            threads.append({
+                'task': task_id,
+                'comments_count': counts[task_id],
+                'next': next_link,
+                'results': CommentSerializer(page, many=True).data,
+            })
+
+        return Response(threads)
+
     @action(detail=True, methods=['post'])
     def add_comment(self, request, pk=None):
         """
@@ -125,7 +520,8 @@ class TaskViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'])
     def sync_calendar(self, request, pk=None):
         """
-        Синхронизация задачи с Google Calendar
+        Постановка задачи в очередь синхронизации с Google Calendar.
+        Возвращает 202 и ID задания для опроса (/api/calendar/jobs/<id>/)
         """
         task = self.get_object()
 
@@ -139,88 +535,12 @@ class TaskViewSet(viewsets.ModelViewSet):
                 'url': '/api/calendar/auth-url/'
             })
 
-        try:
-            # Импортируем необходимые библиотеки
-            from google.oauth2.credentials import Credentials
-            from googleapiclient.discovery import build
-            from datetime import datetime, timedelta
-            from django.conf import settings
-
-            # Создаем объект credentials из сохраненных токенов
-            credentials = Credentials(
-                token=user_profile.google_calendar_token,
-                refresh_token=user_profile.google_calendar_refresh_token,
-                token_uri='https://oauth2.googleapis.com/token',
-                client_id=settings.GOOGLE_CLIENT_ID,
-                client_secret=settings.GOOGLE_CLIENT_SECRET,
-                scopes=['https://www.googleapis.com/auth/calendar']
-            )
-
-            # Создаем сервис Google Calendar
-            service = build('calendar', 'v3', credentials=credentials)
-
-            # Формируем данные для события
-            event_summary = f"[ProjectFlow] {task.title}"
-            event_description = task.description or "Без описания"
-
-            # Определяем время начала и окончания события
-            start_time = task.due_date if task.due_date else datetime.now() + timedelta(days=1)
-            end_time = start_time + timedelta(hours=1)
-
-            # Форматируем время для Google Calendar API
-            start_time_str = start_time.isoformat()
-            end_time_str = end_time.isoformat()
-
-            # Создаем событие
-            event = {
-                'summary': event_summary,
-                'description': event_description,
-                'start': {
-                    'dateTime': start_time_str,
-                    'timeZone': 'Asia/Bishkek',  # Используйте ваш часовой пояс
-                },
-                'end': {
-                    'dateTime': end_time_str,
-                    'timeZone': 'Asia/Bishkek',  # Используйте ваш часовой пояс
-                },
-                'reminders': {
-                    'useDefault': True
-                },
-            }
-
-            # Если уже есть ID события, обновляем его, иначе создаем новое
-            if task.google_calendar_event_id:
-                updated_event = service.events().update(
-                    calendarId='primary',
-                    eventId=task.google_calendar_event_id,
-                    body=event
-                ).execute()
-                event_id = updated_event['id']
-                action = 'обновлено'
-            else:
-                created_event = service.events().insert(
-                    calendarId='primary',
-                    body=event
-                ).execute()
-                event_id = created_event['id']
-                action = 'создано'
-
-            # Сохраняем ID события в задаче
-            task.google_calendar_event_id = event_id
-            task.save()
-
-            return Response({
-                'status': 'success',
-                'message': f'Событие успешно {action} в Google Calendar',
-                'event_id': event_id,
-                'event_link': created_event.get('htmlLink')
-            })
-
-        except Exception as e:
-            import traceback
-            print(f"Ошибка при синхронизации с Google Calendar: {str(e)}")
-            print(traceback.format_exc())
-            return Response({
-                'status': 'error',
-                'message': f'Ошибка при синхронизации с Google Calendar: {str(e)}'
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+        # Запрос к Google выполняет воркер (manage.py calendar_sync_worker);
+        # повторные вызовы до его выполнения возвращают то же задание
+        job = CalendarSyncJob.enqueue(task, request.user)
+        return Response({
+            'status': 'queued',
+            'job_id': job.id,
+            'job_status': job.status,
+            'status_url': job.get_absolute_url(),
+        }, status=status.HTTP_202_ACCEPTED)
\ No newline at end of file